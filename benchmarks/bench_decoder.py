@@ -0,0 +1,122 @@
+"""Round-trip check of the decoder on embedded texts
+
+Texts are embedded into a signal (the given input file or generated noise) and decoded back. The cases cover
+the default placement of the command line (0.5 s, 8000 Hz, 8 s x 1000 Hz on 22.05 kHz noise, as --verify
+runs it) with the whole alphabet and random texts (glyphs sharing most of their strokes, e.g. P and F, M and Y,
+used to be confused), a single line with thin letters (an I narrower than a cell of the decoder, which used to
+be read as a space) and a flowed text stacked in several bands (where a neighbouring band used to fill the
+spaces). The check fails when any of the texts is decoded wrong.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_decoder
+    python -m benchmarks.bench_decoder --input test_audio/grilledcheesesandwich.wav --random_texts 100
+"""
+import sys
+import random
+import argparse
+from typing import List
+
+import numpy as np
+
+from utils import audioread
+from visualization.single_signal import Signal
+from letters.short_text import Text
+from letters.flow import FlowedText
+from letters.decoder import Decoder
+
+# Placement of the command line defaults: start time [in seconds], start frequency [in Hz], width [in seconds],
+# height [in Hz], and the sampling rate of the noise [in Hz]
+DEFAULT_PLACEMENT = (0.5, 8000, 8, 1000)
+DEFAULT_SAMPLING_RATE = 22050
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+DEFAULT_TEXTS = ('PASSWORD', 'JUMPS', ALPHABET, 'THE QUICK BROWN FOX', 'JUMPS OVER THE LAZY DOG')
+
+# Single lines: text, start time [in seconds], start frequency [in Hz], width [in seconds], height [in Hz]
+LINES = (
+    ('ALPHA BRAVO CHARLIE', 0.5, 7500, 3.8, 1500),
+    ('ALPHA BRAVO CHARLIE', 10, 7500, 3.8, 1500),
+    ('LIMIT IS MINI', 5, 2000, 3, 1000),
+)
+
+# Words of the flowed text, with many thin letters and short words
+WORDS = ('ALPHA', 'BRAVO', 'CHARLIE', 'DELTA', 'ECHO', 'FOXTROT', 'GOLF', 'HOTEL', 'INDIA', 'JULIET', 'KILO',
+         'LIMA', 'MIKE', 'OSCAR', 'PAPA', 'QUEBEC', 'ROMEO', 'SIERRA', 'TANGO', 'WHISKEY', 'XRAY', 'ZULU', 'LIMIT',
+         'MINI', 'IT', 'IS', 'IF')
+
+
+def decoded(sound: Signal, text: str, start_t, start_f, width, height) -> str:
+    """Function decoding the text of the given placement"""
+
+    return ''.join(character for character, _ in Decoder(sound, start_t, start_f, width, height).decode(len(text)))
+
+
+def round_trip(samples: np.ndarray, sampling_rate, text: str, start_t, start_f, width, height) -> str:
+    """Function embedding the text into a copy of the samples and returning the decoded text"""
+
+    sound = Signal(samples.copy(), sampling_rate)
+    shape = Text(sound, start_t, start_f, width, height, text)
+    shape.create_shape()
+    sound.apply_shape(shape)
+    return decoded(sound, text, start_t, start_f, width, height)
+
+
+def main(arguments: argparse.Namespace) -> List[str]:
+    """Function running the round trips and returning the list of the failures"""
+
+    failures = []
+    random.seed(0)
+    texts = list(DEFAULT_TEXTS) + [''.join(random.choice(ALPHABET) for _ in range(random.randint(3, 20)))
+                                   for _ in range(arguments.random_texts)]
+    noise = (0.1 * np.random.default_rng(1).standard_normal(DEFAULT_SAMPLING_RATE * 10)).astype(np.float32)
+    bad = 0
+    for text in texts:
+        result = round_trip(noise, DEFAULT_SAMPLING_RATE, text, *DEFAULT_PLACEMENT)
+        if result != text:
+            bad += 1
+            failures.append(f'{text!r} at the default placement was decoded as {result!r}')
+    print(f'default placement at {DEFAULT_SAMPLING_RATE} Hz: {bad} of {len(texts)} texts decoded wrong')
+
+    if arguments.input:
+        samples, sampling_rate = audioread.read_file(arguments.input, -1)
+    else:
+        sampling_rate = 44100
+        samples = (0.1 * np.random.default_rng(0).standard_normal(sampling_rate * 60)).astype(np.float32)
+
+    duration = len(samples) / sampling_rate
+
+    for text, start_t, start_f, width, height in LINES:
+        result = round_trip(samples, sampling_rate, text, start_t, start_f, width, height)
+        print(f'{text!r} at {start_t} s, {start_f} Hz, {width} s x {height} Hz: {result!r}')
+        if result != text:
+            failures.append(f'{text!r} at {start_t} s, {start_f} Hz was decoded as {result!r}')
+
+    random.seed(1)
+    message = ' '.join(random.choice(WORDS) for _ in range(4 * arguments.lines))
+    for start_f, height in ((2000, 1500), (7500, 1000)):
+        sound = Signal(samples.copy(), sampling_rate)
+        flowed = FlowedText(sound, 0.5, start_f, 4, height, message, bands=3, letters_per_second=5)
+        flowed.lines = [line for line in flowed.lines if line.start_t + line.width <= duration][:arguments.lines]
+        flowed.apply(sound)
+        bad = 0
+        for line in flowed.lines:
+            result = decoded(sound, line.text, line.start_t, line.start_f, line.width, height)
+            if result != line.text:
+                bad += 1
+                failures.append(f'flowed line {line.text!r} at {line.start_t:.2f} s, {line.start_f} Hz was decoded '
+                                f'as {result!r}')
+        print(f'flowed at {start_f} Hz, {height} Hz high: {bad} of {len(flowed.lines)} lines decoded wrong')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the round trip of the embedded texts through the decoder')
+    parser.add_argument('--input', help='Path to the audio file (by default generated noise)', type=str)
+    parser.add_argument('--lines', help='Number of the flowed lines of each geometry', type=int, default=30)
+    parser.add_argument('--random_texts', help='Number of the random texts at the default placement', type=int,
+                        default=40)
+
+    errors = main(parser.parse_args())
+    for error in errors:
+        print(f'FAILED: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
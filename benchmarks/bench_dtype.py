@@ -0,0 +1,85 @@
+"""Accuracy of the float32 rendering against the float64 one
+
+Tones, chirps and band noise of the given duration are synthesized in both precisions, and a whole text is
+rendered on a float32 and a float64 signal. The errors are relative to the peak of the float64 result. The
+check fails when a kernel exceeds its bound (the phase is reduced in double precision, so only the rounding of
+the float32 samples is left) or when the rendered text exceeds the bound of the text.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_dtype
+    python -m benchmarks.bench_dtype --duration 600 --kernel_bound 2.5e-7 --text_bound 1e-4
+"""
+import sys
+import argparse
+from typing import List
+
+import numpy as np
+
+from letters import oscillator
+from letters.synthesis import band_noise, chirp, tone
+from letters.short_text import Text
+from visualization.single_signal import Signal
+
+
+def relative_error(expected: np.ndarray, result: np.ndarray) -> float:
+    """Function returning the maximum error relative to the peak of the expected signal"""
+
+    return float(np.max(np.abs(expected - result.astype(np.float64))) / np.max(np.abs(expected)))
+
+
+def render_text(samples: np.ndarray, sampling_rate, dtype, text: str) -> np.ndarray:
+    """Function returning the figure of the text rendered on the signal of the given dtype"""
+
+    shape = Text(Signal(samples.copy(), sampling_rate, dtype), 1, 3000, 10, 2000, text)
+    shape.create_shape()
+    return shape.figure
+
+
+def main(arguments: argparse.Namespace) -> List[str]:
+    """Function comparing the precisions and returning the list of the failures"""
+
+    sampling_rate = arguments.sampling_rate
+    t = oscillator.time_axis(int(arguments.duration * sampling_rate), sampling_rate)
+    f, f1 = 0.35 * sampling_rate, 0.02 * sampling_rate
+    band_t = t[:min(t.size, 10 * sampling_rate)]
+
+    kernels = {
+        'tone': lambda dtype: tone(t, f, dtype),
+        'chirp': lambda dtype: chirp(t, f1, t[-1], f, 'logarithmic', dtype),
+        'band_noise': lambda dtype: band_noise(band_t, f1, 1000, 50, dtype),
+    }
+
+    failures = []
+    print(f'{"signal":<12}{"error":>12}{"bound":>12}')
+    for name, kernel in kernels.items():
+        error = relative_error(kernel(np.float64), kernel(np.float32))
+        print(f'{name:<12}{error:>12.2e}{arguments.kernel_bound:>12.2e}')
+        if error > arguments.kernel_bound:
+            failures.append(f'{name} in float32 has relative error {error:.2e} > {arguments.kernel_bound:.2e}')
+
+    samples = 0.1 * np.random.default_rng(0).standard_normal(20 * sampling_rate)
+    figure = render_text(samples, sampling_rate, np.float32, arguments.text)
+    error = relative_error(render_text(samples, sampling_rate, np.float64, arguments.text), figure)
+    print(f'{"text":<12}{error:>12.2e}{arguments.text_bound:>12.2e}')
+    if figure.dtype != np.float32:
+        failures.append(f'text was rendered in {figure.dtype} on a float32 signal')
+    if error > arguments.text_bound:
+        failures.append(f'text in float32 has relative error {error:.2e} > {arguments.text_bound:.2e}')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the accuracy of the float32 rendering')
+    parser.add_argument('--duration', help='Duration of the tones and chirps [in seconds]', type=float, default=600)
+    parser.add_argument('--sampling_rate', type=int, default=48000)
+    parser.add_argument('--text', type=str, default='HELLO WORLD')
+    parser.add_argument('--kernel_bound', help='Bound of the relative error of the kernels', type=float,
+                        default=2.5e-7)
+    parser.add_argument('--text_bound', help='Bound of the relative error of the rendered text', type=float,
+                        default=1e-4)
+
+    errors = main(parser.parse_args())
+    for error in errors:
+        print(f'FAILED: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,88 @@
+"""Accuracy and speed of the wavetable oscillator against the np.sin reference
+
+For each accuracy the wavetable is compared with np.sin on tones, chirps and band noise of the given duration
+(long strokes have large phases, which is where np.sin gets slow and float32 phase loses precision). The check
+fails when the error of any kernel exceeds its accuracy.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_oscillator
+    python -m benchmarks.bench_oscillator --max_errors 1e-5 1e-7 --duration 600
+"""
+import sys
+import time
+import argparse
+from typing import List
+
+import numpy as np
+
+from letters import oscillator
+from letters.synthesis import band_noise, chirp, chirp_phase, tone
+
+# Rounding of the phase of the reference in double precision, it comes on top of the error of the table
+PHASE_TOLERANCE = 1.e-8
+
+
+def best_time(function, repeats: int) -> float:
+    """Function returning the best wall time of the function [in seconds]"""
+
+    times = []
+    for _ in range(repeats):
+        beginning = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - beginning)
+    return min(times)
+
+
+def main(arguments: argparse.Namespace) -> List[str]:
+    """Function measuring the kernels and returning the list of the failures"""
+
+    sampling_rate = arguments.sampling_rate
+    t = oscillator.time_axis(int(arguments.duration * sampling_rate), sampling_rate)
+    f, f1 = 0.35 * sampling_rate, 0.02 * sampling_rate
+    band_t = t[:min(t.size, 10 * sampling_rate)]
+    band_frequencies = np.arange(f1, f1 + 1000, 20)
+
+    references = {
+        'tone': (lambda dtype: tone(t, f, dtype), lambda: np.sin(2 * np.pi * f * t)),
+        'chirp': (lambda dtype: chirp(t, f1, t[-1], f, 'logarithmic', dtype),
+                  lambda: np.cos(chirp_phase(t, f1, t[-1], f, 'logarithmic'))),
+        'band_noise': (lambda dtype: band_noise(band_t, f1, 1000, 50, dtype),
+                       lambda: np.sum([np.sin(2 * np.pi * frequency * band_t) for frequency in band_frequencies],
+                                      axis=0)),
+    }
+
+    failures = []
+    print(f'{"kernel":<12}{"max_error":>10}{"table":>8}{"dtype":>9}{"error":>12}{"time":>10}{"np.sin":>10}')
+    for name, (kernel, reference) in references.items():
+        expected = reference()
+        reference_time = best_time(reference, arguments.repeats)
+        # The band is the carrier times the envelope of the amplitude up to the number of the oscillators, and
+        # the errors of both of them are scaled by it
+        scale = 2 * band_frequencies.size if name == 'band_noise' else 1
+        for max_error in arguments.max_errors:
+            oscillator.set_default_max_error(max_error)
+            table = oscillator.wavetable()
+            for dtype in (np.float64, np.float32):
+                tolerance = scale * (table.max_error + PHASE_TOLERANCE + np.finfo(dtype).eps)
+                error = float(np.max(np.abs(kernel(dtype) - expected)))
+                kernel_time = best_time(lambda: kernel(dtype), arguments.repeats)
+                print(f'{name:<12}{max_error:>10.0e}{table.size:>8}{np.dtype(dtype).name:>9}{error:>12.2e}'
+                      f'{kernel_time:>9.3f}s{reference_time:>9.3f}s')
+                if error > tolerance:
+                    failures.append(f'{name} in {np.dtype(dtype).name} with max_error={max_error:.0e} has error '
+                                    f'{error:.2e} > {tolerance:.2e}')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the accuracy and the speed of the wavetable oscillator')
+    parser.add_argument('--max_errors', nargs='+', type=float, default=[1e-5, 1e-6, 1e-7])
+    parser.add_argument('--duration', help='Duration of the tones and chirps [in seconds]', type=float, default=60)
+    parser.add_argument('--sampling_rate', type=int, default=48000)
+    parser.add_argument('--repeats', type=int, default=3)
+
+    errors = main(parser.parse_args())
+    for error in errors:
+        print(f'FAILED: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
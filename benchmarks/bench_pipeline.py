@@ -0,0 +1,215 @@
+"""Benchmarks of the stages of hiding the text in the audio file
+
+Every stage is measured separately on synthetic audio, so the benchmarks run offline. Wall time is the best of
+the repeated runs, peak memory is measured in a separate run with tracemalloc (so it does not distort the time).
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_pipeline -o results.json
+    python -m benchmarks.bench_pipeline -o new.json --compare results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+import tempfile
+import tracemalloc
+from typing import Callable, List, NoReturn
+
+import numpy as np
+import soundfile as sf
+
+from utils import audioread
+from visualization.single_signal import Signal
+from visualization.spectrogram import Spectrogram
+from letters.shape import Shape, Curve, HorizontalLine, VerticalLine
+from letters.short_text import Text
+from letters.glyph_cache import glyph_cache
+
+ALPHABET = 'PASSWORDQXZ'
+
+
+def measure(function: Callable, setup: Callable, repeats: int) -> dict:
+    """Function measuring wall time and peak memory of the function
+
+    Parameters
+    ----------
+    function : Callable
+        measured function, it gets the value returned by the setup
+    setup : Callable
+        function preparing the arguments of the measured function, it is not measured
+    repeats : int
+        number of the timed runs
+
+    Returns
+    -------
+    result : dict
+        best wall time [in seconds] and peak of the traced allocations [in bytes]
+    """
+
+    times = []
+    for _ in range(repeats):
+        argument = setup()
+        beginning = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - beginning)
+
+    argument = setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function(argument)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'wall_s': min(times), 'peak_bytes': peak}
+
+
+def stage_benchmarks(sampling_rate: int, duration: float, text: str, width: float, directory: str,
+                     repeats: int) -> List[dict]:
+    """Function measuring all of the stages for a single set of parameters
+
+    Parameters
+    ----------
+    sampling_rate : int
+        sampling rate of the synthetic audio
+    duration : float
+        duration of the synthetic audio [in seconds]
+    text : str
+        hidden text
+    width : float
+        width of the text [in seconds]
+    directory : str
+        directory for the audio files
+    repeats : int
+        number of the timed runs of each stage
+
+    Returns
+    -------
+    results : List[dict]
+        measurements of the stages
+    """
+
+    params = {'sampling_rate': sampling_rate, 'duration': duration, 'text_length': len(text), 'width': width}
+    rng = np.random.default_rng(0)
+    samples = (0.1 * rng.standard_normal(int(sampling_rate * duration))).astype(np.float32)
+    path = os.path.join(directory, f'input_{sampling_rate}_{duration}.wav')
+    sf.write(path, samples, sampling_rate, subtype='PCM_16')
+
+    start_t, start_f, height = 0.5, min(8000, sampling_rate / 4), min(1000, sampling_rate / 8)
+    letter_width = width * 0.8 / len(text)
+    sig = Signal(samples, sampling_rate)
+
+    def rendered_text(_=None):
+        glyph_cache.clear()
+        shape = Text(sig, start_t, start_f, width, height, text)
+        shape.create_shape()
+        return shape
+
+    text_shape = rendered_text()
+    stroke_figure = np.ones(int(np.ceil(letter_width * sampling_rate)))
+
+    stages = {
+        'load': (lambda _: audioread.read_file(path, -1), lambda: None),
+        'glyph_construction': (lambda _: Text(sig, start_t, start_f, width, height, text), lambda: None),
+        'Curve.create_shape': (lambda shape: shape.create_shape(),
+                               lambda: Curve(sig, start_t, start_f, letter_width, height, True, 't')),
+        'HorizontalLine.create_shape': (lambda shape: shape.create_shape(),
+                                        lambda: HorizontalLine(sig, start_t, start_f, letter_width, 0)),
+        'VerticalLine.create_shape': (lambda shape: shape.create_shape(),
+                                      lambda: VerticalLine(sig, start_t, start_f, letter_width * 0.05, height)),
+        '_combine_figures': (lambda shape: shape._combine_figures(stroke_figure, start_t + width / 2),
+                             lambda: Shape(sig, start_t, start_f, width, height)),
+        'render': (rendered_text, lambda: None),
+        'apply_shape': (lambda signal: signal.apply_shape(text_shape), lambda: Signal(samples.copy(), sampling_rate)),
+        'spectrogram': (lambda spec: spec.calculate_spectrogram(), lambda: Spectrogram(sig)),
+        'save': (lambda signal: signal.save_signal(os.path.join(directory, 'output.wav')), lambda: sig),
+        'save_float': (lambda signal: signal.save_signal(os.path.join(directory, 'output.wav'), 'FLOAT'), lambda: sig),
+        'save_flac': (lambda signal: signal.save_signal(os.path.join(directory, 'output.flac')), lambda: sig),
+    }
+
+    results = []
+    for stage, (function, setup) in stages.items():
+        result = measure(function, setup, repeats)
+        results.append({'stage': stage, 'params': params, **result})
+    return results
+
+
+def git_revision() -> str:
+    """Function returning the revision of the repository or 'unknown'"""
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: dict, baseline: dict) -> NoReturn:
+    """Function printing the ratios of the measurements to the baseline
+
+    Parameters
+    ----------
+    results : dict
+        current results
+    baseline : dict
+        results loaded from the JSON file of the previous run
+    """
+
+    def key(result):
+        return result['stage'], json.dumps(result['params'], sort_keys=True)
+
+    old = {key(result): result for result in baseline['results']}
+    print(f'{"stage":<30}{"params":<70}{"time":>10}{"memory":>10}')
+    for result in results['results']:
+        if key(result) in old:
+            previous = old[key(result)]
+            time_ratio = result['wall_s'] / previous['wall_s'] if previous['wall_s'] else float('nan')
+            memory_ratio = result['peak_bytes'] / previous['peak_bytes'] if previous['peak_bytes'] else float('nan')
+            print(f'{result["stage"]:<30}{key(result)[1]:<70}{time_ratio:>9.2f}x{memory_ratio:>9.2f}x')
+
+
+def main(arguments: argparse.Namespace) -> NoReturn:
+    results = {'revision': git_revision(),
+               'python': platform.python_version(),
+               'numpy': np.__version__,
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'results': []}
+
+    with tempfile.TemporaryDirectory() as directory:
+        sweep = itertools.product(arguments.sampling_rates, arguments.durations, arguments.text_lengths,
+                                  arguments.widths)
+        for sampling_rate, duration, text_length, width in sweep:
+            text = (ALPHABET * (text_length // len(ALPHABET) + 1))[:text_length]
+            if text_length / width > 6 or duration < width + 1:
+                # Too dense text or too short audio for the text
+                continue
+            print(f'sr={sampling_rate} duration={duration} text_length={text_length} width={width} ...',
+                  file=sys.stderr)
+            results['results'] += stage_benchmarks(sampling_rate, duration, text, width, directory,
+                                                   arguments.repeats)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, 'r') as stream:
+            compare(results, json.load(stream))
+    if not arguments.output and not arguments.compare:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the stages of hiding the text in the audio file')
+    parser.add_argument('--sampling_rates', nargs='+', type=int, default=[22050, 44100, 96000])
+    parser.add_argument('--durations', nargs='+', type=float, default=[10, 60])
+    parser.add_argument('--text_lengths', nargs='+', type=int, default=[4, 16])
+    parser.add_argument('--widths', nargs='+', type=float, default=[4, 8])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('-o', '--output', help='JSON file the results are saved to', type=str)
+    parser.add_argument('--compare', help='JSON file of the previous results to compare with', type=str)
+
+    main(parser.parse_args())
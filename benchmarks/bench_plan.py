@@ -0,0 +1,104 @@
+"""Check of the render plans against the rendered shapes
+
+Each text is laid out with Text.plan, rendered with letters.plan.render_plan and compared sample by sample with the
+figure rendered by Text.create_shape, for a sweep of sampling rates, widths, scaling modes and dtypes. The plan is also
+saved, loaded and rendered again, and rendered on several threads. The check fails when any of the figures differs, or
+when the threads are given more strokes than the window of letters.parallel ahead of the strokes added into the figure,
+and prints the time of both of the renders.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_plan
+    python -m benchmarks.bench_plan --texts "HELLO WORLD" "LIMIT IS MINI" --widths 2 9.7 --workers 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import itertools
+from typing import List
+
+import numpy as np
+
+from visualization.single_signal import Signal
+from letters.short_text import Text
+from letters.glyph_cache import glyph_cache
+from letters.parallel import WINDOW_PER_WORKER, map_in_order
+from letters.plan import RenderPlan, render_plan
+
+
+def max_ahead(workers: int, items: int) -> int:
+    """Function returning the maximum number of the items taken by map_in_order ahead of the consumed results"""
+
+    taken = 0
+
+    def source():
+        nonlocal taken
+        for item in range(items):
+            taken += 1
+            yield item
+
+    ahead = 0
+    for consumed, _ in enumerate(map_in_order(lambda item: item, source(), workers), start=1):
+        ahead = max(ahead, taken - consumed)
+    return ahead
+
+
+def main(arguments: argparse.Namespace) -> List[str]:
+    """Function comparing the renders and returning the list of the failures"""
+
+    failures = []
+    ahead = max_ahead(arguments.workers, 1000)
+    print(f'map_in_order on {arguments.workers} threads took at most {ahead} items ahead of the consumer')
+    if ahead > WINDOW_PER_WORKER * arguments.workers:
+        failures.append(f'map_in_order took {ahead} items ahead of the consumer, more than the window of '
+                        f'{WINDOW_PER_WORKER * arguments.workers}')
+
+    rng = np.random.default_rng(0)
+    print(f'{"text":<16}{"sampling_rate":>14}{"width":>8}{"scaling":>9}{"dtype":>9}{"shape":>10}{"plan":>10}'
+          f'{"equal":>7}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'plan.npz')
+        for text, sampling_rate, width, scaling, dtype in itertools.product(
+                arguments.texts, arguments.sampling_rates, arguments.widths, ('global', 'local'), arguments.dtypes):
+            samples = 0.1 * rng.standard_normal(int(sampling_rate * (width + 1)))
+            samples *= np.linspace(0.2, 1, samples.size)  # Changing level, so the local scaling matters
+            sound = Signal(samples, sampling_rate, dtype)
+            start_f = min(3000, sampling_rate / 8)
+
+            shape = Text(sound, 0.37, start_f, width, start_f, text, scaling=scaling)
+            plan = shape.plan()
+            glyph_cache.clear()
+            beginning = time.perf_counter()
+            shape.create_shape()
+            shape_time = time.perf_counter() - beginning
+            beginning = time.perf_counter()
+            figure = render_plan(plan)
+            plan_time = time.perf_counter() - beginning
+            plan.save(path)
+            loaded = render_plan(RenderPlan.load(path))
+            threaded = render_plan(plan, workers=arguments.workers)
+
+            equal = all(np.array_equal(result, shape.figure) for result in (figure, loaded, threaded))
+            print(f'{text:<16}{sampling_rate:>14}{width:>8}{scaling:>9}{np.dtype(dtype).name:>9}{shape_time:>9.3f}s'
+                  f'{plan_time:>9.3f}s{str(equal):>7}')
+            if not equal:
+                error = max(np.max(np.abs(result - shape.figure)) for result in (figure, loaded, threaded))
+                failures.append(f'{text!r} at {sampling_rate} Hz, {width} s wide, {scaling} scaling in '
+                                f'{np.dtype(dtype).name}: the plan differs from create_shape by {error:.2e}')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that the render plans render the same figures as the shapes')
+    parser.add_argument('--texts', nargs='+', default=['HELLO WORLD', 'PASSWORD'])
+    parser.add_argument('--sampling_rates', nargs='+', type=int, default=[22050, 44100, 48000])
+    parser.add_argument('--widths', nargs='+', type=float, default=[2, 9.7])
+    parser.add_argument('--dtypes', nargs='+', choices=['float64', 'float32'], default=['float64', 'float32'])
+    parser.add_argument('--workers', help='Number of the threads of the threaded render', type=int, default=4)
+
+    errors = main(parser.parse_args())
+    for error in errors:
+        print(f'FAILED: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,140 @@
+"""Latency of the embed jobs run by the server against separate runs of the command line interface
+
+The server is started on a Unix domain socket in a temporary directory, so the benchmark runs entirely on the
+local machine. The same jobs are run once by separate CLI processes and once submitted to the warm server.
+Then a worker process of the server is killed (Linux only, the workers are found in /proc) and the jobs are
+submitted again, so the server has to replace its broken pool. The check fails when any job of the server fails.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_server
+    python -m benchmarks.bench_server --jobs 64 --workers 4 --queue_size 8
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import List
+
+import numpy as np
+import soundfile as sf
+
+from utils import server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cli_time(job: dict) -> float:
+    """Function running the job in a fresh CLI process and returning its wall time [in seconds]"""
+
+    beginning = time.perf_counter()
+    subprocess.run([sys.executable, 'hide_in_audio.py', '-i', job['input'], '-s', job['output'], '-t', job['text'],
+                    '-w', str(job['width']), '--force'], cwd=ROOT, capture_output=True, check=True)
+    return time.perf_counter() - beginning
+
+
+async def wait_for_socket(path: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    """Function waiting until the server listens on the socket"""
+
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Server has exited before listening')
+        try:
+            _, writer = await asyncio.open_unix_connection(path)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise TimeoutError('Server does not listen on the socket')
+
+
+async def run_server_jobs(path: str, jobs: List[dict], process: subprocess.Popen) -> List[dict]:
+    await wait_for_socket(path, process)
+    return await server.submit_jobs(path, jobs)
+
+
+def pool_workers(pid: int) -> List[int]:
+    """Function returning the worker processes of the pool of the server, the descendants of its process"""
+
+    children = {}
+    for entry in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{entry}/cmdline', 'rb') as cmdline:
+                command = cmdline.read()
+        except (OSError, ValueError, IndexError):
+            continue  # The process has exited meanwhile
+        children.setdefault(parent, []).append((int(entry), command))
+
+    workers, parents = [], [pid]
+    while parents:
+        for child, command in children.get(parents.pop(), []):
+            parents.append(child)
+            # The resource tracker and the fork server of multiprocessing are not the workers
+            if b'multiprocessing' not in command:
+                workers.append(child)
+    return workers
+
+
+def main(arguments: argparse.Namespace) -> List[str]:
+    """Function measuring the jobs and returning the list of the failures"""
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'input.wav')
+        rng = np.random.default_rng(0)
+        sf.write(input_path, (0.1 * rng.standard_normal(44100 * 6)).astype(np.float32), 44100, subtype='PCM_16')
+        jobs = [{'id': str(number), 'input': input_path, 'output': os.path.join(directory, f'output{number}.wav'),
+                 'text': 'PASSWORD', 'width': 4, 'force': True} for number in range(arguments.jobs)]
+
+        cli_times = [cli_time(job) for job in jobs[:arguments.cli_jobs]]
+
+        socket_path = os.path.join(directory, 'server.sock')
+        process = subprocess.Popen([sys.executable, 'hide_in_audio.py', '--serve', socket_path, '--workers',
+                                    str(arguments.workers), '--queue_size', str(arguments.queue_size)], cwd=ROOT,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            beginning = time.perf_counter()
+            records = asyncio.run(run_server_jobs(socket_path, jobs, process))
+            server_wall = time.perf_counter() - beginning
+
+            workers = pool_workers(process.pid) if arguments.workers > 1 and os.path.isdir('/proc') else []
+            if workers:
+                os.kill(workers[0], signal.SIGKILL)
+                after_kill = asyncio.run(server.submit_jobs(socket_path, jobs[:2 * arguments.workers]))
+                print(f'killed the worker {workers[0]}: {sum(message["status"] == "ok" for message in after_kill)} '
+                      f'of {len(after_kill)} following jobs succeeded')
+                records += after_kill
+            elif arguments.workers > 1:
+                failures.append('no worker process of the server was found to kill')
+        finally:
+            process.terminate()
+            process.wait()
+
+    totals = [message['record']['total'] for message in records if message['status'] == 'ok']
+    print(f'CLI:    {np.mean(cli_times):.3f} s per job ({len(cli_times)} jobs, fresh processes)')
+    print(f'server: {np.median(totals):.3f} s per job (median), {server_wall:.3f} s for {len(jobs)} jobs on '
+          f'{arguments.workers} workers including the startup')
+    for message in records:
+        if message['status'] != 'ok':
+            failures.append(f'job {message["id"]} {message["status"]}: {(message["record"] or {}).get("error")}')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the jobs run by the server with the runs of the CLI')
+    parser.add_argument('--jobs', help='Number of the jobs submitted to the server', type=int, default=16)
+    parser.add_argument('--cli_jobs', help='Number of the jobs run by the CLI', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue_size', type=int, default=4)
+
+    errors = main(parser.parse_args())
+    for error in errors:
+        print(f'FAILED: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,99 @@
+"""Startup-time check of a headless run of the command line interface
+
+The import of the CLI and a whole embed run saving the output (without plotting) are timed in fresh
+interpreters. The check fails when any of the runs exceeds its budget or when any of the heavy modules, which
+are needed only for plotting, resampling with librosa or the spectrogram, has been imported.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --import_budget 0.5 --run_budget 2
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from typing import List
+
+import numpy as np
+import soundfile as sf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('librosa', 'matplotlib', 'matplotlib.pyplot', 'scipy.signal')
+
+# Runs the code in the fresh interpreter and prints its wall time and the heavy modules it has imported
+PROBE = """
+import sys, json, time, runpy
+beginning = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - beginning
+print(json.dumps({{'wall_s': elapsed, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def probe(code: str) -> dict:
+    """Function running the code in a fresh interpreter
+
+    Parameters
+    ----------
+    code : str
+        code to be timed
+
+    Returns
+    -------
+    result : dict
+        wall time of the code [in seconds] and the heavy modules imported by it
+    """
+
+    completed = subprocess.run([sys.executable, '-c', PROBE.format(code=code, heavy=HEAVY_MODULES)], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def embed_code(input_path: str, output_path: str) -> str:
+    """Function returning the code running the CLI with the headless embed"""
+
+    argv = ['hide_in_audio.py', '-i', input_path, '-s', output_path, '-t', 'PASSWORD', '-b', '0.5', '-f', '8000',
+            '-w', '4', '-e', '1000', '--force']
+    return (f'sys.argv = {argv!r}\n'
+            f'import contextlib, io\n'
+            f'with contextlib.redirect_stdout(io.StringIO()):\n'
+            f'    runpy.run_path("hide_in_audio.py", run_name="__main__")')
+
+
+def main(arguments: argparse.Namespace) -> List[str]:
+    """Function measuring the startup and returning the list of the failures"""
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'input.wav')
+        rng = np.random.default_rng(0)
+        sf.write(input_path, (0.1 * rng.standard_normal(44100 * 10)).astype(np.float32), 44100, subtype='PCM_16')
+
+        runs = {'import': ('import hide_in_audio', arguments.import_budget),
+                'embed': (embed_code(input_path, os.path.join(directory, 'output.wav')), arguments.run_budget)}
+        for name, (code, budget) in runs.items():
+            # The best of the runs, so the cold caches of the file system do not count
+            results = [probe(code) for _ in range(arguments.repeats)]
+            wall = min(result['wall_s'] for result in results)
+            heavy = sorted(set().union(*(result['heavy'] for result in results)))
+            print(f'{name:<10}{wall:>8.3f} s (budget {budget:.3f} s)  heavy modules: {", ".join(heavy) or "none"}')
+            if wall > budget:
+                failures.append(f'{name} took {wall:.3f} s, the budget is {budget:.3f} s')
+            if heavy:
+                failures.append(f'{name} imported {", ".join(heavy)}')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the startup time of a headless run of the CLI')
+    parser.add_argument('--import_budget', help='Budget of importing the CLI [in seconds]', type=float, default=1)
+    parser.add_argument('--run_budget', help='Budget of the headless embed run [in seconds]', type=float, default=3)
+    parser.add_argument('--repeats', type=int, default=3)
+
+    errors = main(parser.parse_args())
+    for error in errors:
+        print(f'FAILED: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
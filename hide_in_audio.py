@@ -1,23 +1,96 @@
 import os
 import argparse
+from contextlib import nullcontext
 
-from utils import audioread
+from utils import audiocache, audioread, audiowrite, batch, instrumentation, server, streaming
 from visualization.single_signal import Signal
 from letters.short_text import Text
+from letters.flow import DEFAULT_LETTERS_PER_SECOND, FlowedText
+from letters import parallel
+from letters.shape import SCALINGS
 from visualization.spectrogram import Spectrogram
 
 
 def main(arguments: argparse.Namespace):
     args_dict = vars(arguments)
+    parallel.set_default_workers(args_dict['threads'])
+    audiocache.configure(None if args_dict['no_cache'] else args_dict['cache_dir'], args_dict['cache_size'] * 1024 ** 2)
+
+    if not args_dict['profile']:
+        hide_text(args_dict)
+        return
+
+    profiler = instrumentation.enable()
+    try:
+        with instrumentation.stage('main'):
+            hide_text(args_dict)
+    finally:
+        instrumentation.disable()
+        instrumentation.write_report(profiler, args_dict['profile'])
+
+
+def hide_text(args_dict: dict):
+    """Hiding the text according to the command line arguments"""
+
+    if args_dict['batch']:
+        run_batch(args_dict)
+        return
+
+    if args_dict['serve']:
+        server.serve(args_dict['serve'], args_dict, args_dict['workers'], args_dict['queue_size'])
+        return
 
     if not os.path.exists(args_dict['input']):
         raise ValueError('Given path does not exist. If default, make sure to clone the repository again.')
 
     input_path = args_dict['input']
     max_load_time = args_dict['max_time']
+    if args_dict['save']:
+        # Unsupported format fails before the text is rendered
+        audiowrite.output_format(args_dict['save'], args_dict['subtype'])
+
+    if args_dict['stream']:
+        stream_text(args_dict)
+        return
+
+    with instrumentation.stage('decode'):
+        read_samples, read_sr = audioread.read_file(input_path, max_load_time, args_dict['sr'],
+                                                    args_dict['resample_quality'], mono=not args_dict['multichannel'])
+        sig = Signal(read_samples, read_sr, args_dict['dtype'])
+        instrumentation.add_samples(len(sig))
+
+    with open_output(sig, args_dict) as writer:
+        written = 0
+        if writer is not None:
+            # Samples before the text are not changed by mixing, so they are encoded while the text is rendered
+            written = min(max(int(args_dict['start_time'] * sig.sampling_rate), 0), len(sig))
+            writer.write(sig.data[:written])
+
+        embed_text(sig, args_dict)
+
+        if writer is not None:
+            with instrumentation.stage('encode', samples=len(sig) - written):
+                writer.write(sig.data[written:])
+                writer.close()
+            print(f'Encoded {writer.frames} frames at {writer.throughput() / sig.sampling_rate:.1f}x real time')
+
+    if args_dict['output_sound']:
+        print('Displaying the graph of the audio after calculations ...')
+        with instrumentation.stage('plot', samples=len(sig)):
+            audioread.plot_sound(sig.data, sig.sampling_rate)
 
-    read_samples, read_sr = audioread.read_file(input_path, max_load_time)
-    sig = Signal(read_samples, read_sr)
+    if args_dict['display']:
+        print('Displaying the spectrogram of the audio after calculations ...')
+        with instrumentation.stage('spectrogram', samples=len(sig)):
+            spec = Spectrogram(sig)
+            spec.calculate_spectrogram()
+            spec.normalize_spectrogram()
+        with instrumentation.stage('plot_spectrogram'):
+            spec.plot_spectrogram()
+
+
+def embed_text(sig: Signal, args_dict: dict):
+    """Rendering the text and mixing it into the signal according to the command line arguments"""
 
     # Shape parameters
     start_time = args_dict['start_time']
@@ -26,30 +99,75 @@ def main(arguments: argparse.Namespace):
     text_height = args_dict['height']
     text_itself = args_dict['text']
 
+    if args_dict['flow']:
+        with instrumentation.stage('letters'):
+            flowed = FlowedText(sig, start_time, start_frequency, text_width, text_height, text_itself,
+                                args_dict['bands'], args_dict['letters_per_second'], scaling=args_dict['scaling'])
+        print(f'Flowing the text into {len(flowed.lines)} lines ...')
+        with instrumentation.stage('render_mix', samples=flowed.size):
+            flowed.apply(sig, channels=args_dict['channels'], gains=args_dict['gains'])
+        return
+
     # Creating and applying text
-    text = Text(sig, start_time, start_frequency, text_width, text_height, text_itself)
-    text.create_shape()
-    sig.apply_shape(text)
+    with instrumentation.stage('letters'):
+        text = Text(sig, start_time, start_frequency, text_width, text_height, text_itself, args_dict['scaling'])
+    with instrumentation.stage('render', samples=text.size):
+        text.create_shape()
+    with instrumentation.stage('mix', samples=text.size):
+        sig.apply_shape(text, channels=args_dict['channels'], gains=args_dict['gains'])
 
-    if args_dict['output_sound']:
-        print('Displaying the graph of the audio after calculations ...')
-        audioread.plot_sound(sig.data, sig.sampling_rate)
 
-    if args_dict['display']:
-        print('Displaying the spectrogram of the audio after calculations ...')
-        spec = Spectrogram(sig)
-        spec.calculate_spectrogram()
-        spec.normalize_spectrogram()
-        spec.plot_spectrogram()
+def open_output(sig: Signal, args_dict: dict):
+    """Opening the writer of the output file, an empty context if the file is not to be saved"""
+
+    path_to_save = args_dict['save']
+    if not path_to_save:
+        return nullcontext()
+    if os.path.exists(path_to_save) and not args_dict['force']:
+        print(f'Cannot save file to the given path. File of the path {path_to_save} already exists.')
+        print(f'Use --force to overwrite this file.')
+        return nullcontext()
+    print(f'Saving file to {path_to_save} ...')
+    return audiowrite.AudioWriter(path_to_save, sig.sampling_rate, sig.channels, args_dict['subtype'])
 
-    if args_dict['save']:
-        path_to_save = args_dict['save']
-        if os.path.exists(path_to_save) and not args_dict['force']:
-            print(f'Cannot save file to the given path. File of the path {path_to_save} already exists.')
-            print(f'Use --force to overwrite this file.')
-        else:
-            print(f'Saving file to {path_to_save} ...')
-            sig.save_signal(path_to_save)
+
+def run_batch(args_dict: dict):
+    """Running the jobs of the manifest on the pool of processes"""
+
+    manifest_path = args_dict['batch']
+    if not os.path.exists(manifest_path):
+        raise ValueError('Given manifest path does not exist.')
+
+    jobs = batch.read_manifest(manifest_path, args_dict)
+    summary_path = args_dict['summary'] or f'{manifest_path}.summary.jsonl'
+    print(f'Running {len(jobs)} jobs, summary is written to {summary_path} ...')
+    totals = batch.run_batch(jobs, summary_path, args_dict['workers'])
+    batch.print_totals(totals)
+
+
+def stream_text(args_dict: dict):
+    """Hiding the text in streaming mode, without loading the whole input file"""
+
+    if not args_dict['save']:
+        raise ValueError('Streaming mode requires the saving path (-s).')
+    if args_dict['output_sound'] or args_dict['display']:
+        raise ValueError('Streaming mode cannot display the audio nor the spectrogram.')
+
+    path_to_save = args_dict['save']
+    if os.path.exists(path_to_save) and not args_dict['force']:
+        print(f'Cannot save file to the given path. File of the path {path_to_save} already exists.')
+        print(f'Use --force to overwrite this file.')
+    else:
+        print(f'Streaming file to {path_to_save} ...')
+        writer = streaming.embed_stream(args_dict['input'], path_to_save, args_dict['start_time'],
+                                        args_dict['start_frq'], args_dict['width'], args_dict['height'],
+                                        args_dict['text'], args_dict['max_time'],
+                                        scaling=args_dict['scaling'], mono=not args_dict['multichannel'],
+                                        channels=args_dict['channels'], gains=args_dict['gains'],
+                                        flow=args_dict['flow'], bands=args_dict['bands'],
+                                        letters_per_second=args_dict['letters_per_second'],
+                                        subtype=args_dict['subtype'])
+        print(f'Encoded {writer.frames} frames at {writer.throughput() / writer.sampling_rate:.1f}x real time')
 
 
 if __name__ == '__main__':
@@ -104,6 +222,59 @@ if __name__ == '__main__':
                         action='store',
                         type=float,
                         default=-1)
+    parser.add_argument('--sr',
+                        help='Sampling rate the input file is resampled to (native sampling rate by default).',
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument('--resample_quality',
+                        help='Resampling method used with --sr.',
+                        choices=audioread.RESAMPLE_QUALITIES,
+                        default='polyphase')
+    parser.add_argument('--scaling',
+                        help='Amplitude scaling of the strokes: global matches them to the mean amplitude of the whole '
+                             'audio, local to the audio around each stroke.',
+                        choices=SCALINGS,
+                        default='global')
+    parser.add_argument('--flow',
+                        action='store_true',
+                        help='Wrapping a long text into lines of at most --width seconds and spreading them over the '
+                             'whole audio. Lines are rendered and mixed one by one.',
+                        default=False)
+    parser.add_argument('--bands',
+                        help='Number of the lines of a page of the flowed text, stacked in frequency above '
+                             'the starting frequency.',
+                        type=int,
+                        default=1)
+    parser.add_argument('--letters_per_second',
+                        help='Density of the letters of the flowed text.',
+                        type=float,
+                        default=DEFAULT_LETTERS_PER_SECOND)
+    parser.add_argument('--dtype',
+                        help='Precision the samples are converted to and the text is rendered in (float32 halves the '
+                             'memory of the rendering). By default the samples are kept as read and the text is '
+                             'rendered in float64.',
+                        choices=['float64', 'float32'],
+                        default=None)
+    parser.add_argument('--multichannel',
+                        action='store_true',
+                        help='Keeping the channels of the input file instead of downmixing it to mono.',
+                        default=False)
+    parser.add_argument('--channels',
+                        help='Indices of the channels the text is mixed into (all channels by default).',
+                        nargs='+',
+                        type=int,
+                        default=None)
+    parser.add_argument('--gains',
+                        help='Gains of the text in the channels given by --channels (1 by default).',
+                        nargs='+',
+                        type=float,
+                        default=None)
+    parser.add_argument('--subtype',
+                        help='Subtype of the samples of the saved file. The format is selected by the extension of the '
+                             'saving path (e.g. .wav, .flac, .aiff; FLAC supports only PCM_16 and PCM_24).',
+                        choices=audiowrite.SUBTYPES,
+                        default='PCM_24')
     parser.add_argument('-o',
                         '--output_sound',
                         action='store_true',
@@ -123,6 +294,61 @@ if __name__ == '__main__':
                         action='store',
                         help='Saving path to which an audio file with added text should be saved to',
                         type=str)
+    parser.add_argument('--stream',
+                        action='store_true',
+                        help='Copying the input file block by block and mixing the text only into the blocks it '
+                             'covers. Keeps the native sampling rate and requires --save.',
+                        default=False)
+    parser.add_argument('--cache_dir',
+                        help='Directory of the cache of the decoded and resampled audio (by default the '
+                             f'{audiocache.CACHE_ENV} environment variable or ~/.cache/hide_in_audio).',
+                        type=str,
+                        default=audiocache.cache_directory)
+    parser.add_argument('--cache_size',
+                        help='Maximum size of the cache of the decoded audio [in MiB], the least recently used '
+                             'entries are removed above it.',
+                        type=int,
+                        default=audiocache.DEFAULT_CACHE_SIZE // 1024 ** 2)
+    parser.add_argument('--no_cache',
+                        action='store_true',
+                        help='Decoding the input file without the cache of the decoded audio.',
+                        default=False)
+    parser.add_argument('--threads',
+                        help='Number of threads rendering the letters of the text.',
+                        type=int,
+                        default=1)
+    parser.add_argument('--profile',
+                        metavar='report_path',
+                        help='Measuring time, CPU time, peak allocations and sample counts of each stage and writing '
+                             'them as JSON to the given path (- prints the report).',
+                        type=str)
+    parser.add_argument('--batch',
+                        metavar='manifest_path',
+                        help='Manifest (CSV or JSON lines) of jobs with input, text, output and optional geometry. '
+                             'Missing parameters fall back to the values given in the command line.',
+                        type=str)
+    parser.add_argument('--serve',
+                        metavar='socket_path',
+                        help='Running as a server which keeps the caches warm and runs the jobs (JSON lines with the '
+                             'fields of the batch manifest) received over the Unix domain socket (- reads the '
+                             'standard input and writes the standard output).',
+                        type=str)
+    parser.add_argument('--queue_size',
+                        help='Maximum number of the jobs queued by the server, clients wait while it is full.',
+                        type=int,
+                        default=64)
+    parser.add_argument('--workers',
+                        help='Number of processes running the batch or server jobs (all processors by default).',
+                        type=int,
+                        default=None)
+    parser.add_argument('--verify',
+                        action='store_true',
+                        help='Decoding the text back after mixing every batch job and failing the job on mismatch.',
+                        default=False)
+    parser.add_argument('--summary',
+                        metavar='summary_path',
+                        help='Summary of the batch run (JSON lines), used to resume an interrupted run.',
+                        type=str)
 
     args = parser.parse_args()
     main(args)
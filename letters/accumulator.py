@@ -0,0 +1,121 @@
+from typing import NoReturn
+import numpy as np
+
+
+class RenderAccumulator:
+    """A class which represents a preallocated buffer that shapes are rendered into
+
+    Every shape is added into its own window of sample indices directly in the buffer, so merging figures
+    does not require padding arrays nor any per-sample work in Python.
+
+    Attributes
+    ----------
+    buffer : np.ndarray
+        one dimensional array which accumulates rendered figures
+    sampling_rate : float
+        sampling rate used to convert time offsets into sample indices
+    start_t
+        a floating point number representing the time of the first sample of the buffer [in seconds]
+
+    Methods
+    -------
+    sample_offset(start_t)
+        Calculates the index of the sample at which the figure starting at start_t begins
+    add(fig: np.ndarray, start_t)
+        Adds the figure into the buffer in place
+    window(start_t, size: int)
+        Creates an accumulator which writes into the sub-window of the buffer
+    """
+
+    def __init__(self, buffer: np.ndarray, sampling_rate: float, start_t=0.0):
+        """
+        Parameters
+        ----------
+        buffer : np.ndarray
+            one dimensional array to accumulate figures into, it is modified in place
+        sampling_rate : float
+            self-explanatory
+        start_t
+            a floating point number representing the time of the first sample of the buffer [in seconds]
+
+        Raises
+        ------
+        ValueError
+            If the buffer has more than one dimension
+        """
+
+        if buffer.ndim > 1:
+            raise ValueError('Accumulator buffer cannot have more than one dimension')
+
+        self.buffer: np.ndarray = buffer
+        self.sampling_rate: float = sampling_rate
+        self.start_t = start_t
+
+    def sample_offset(self, start_t) -> int:
+        """Calculates the index of the sample at which the figure starting at start_t begins
+
+        Parameters
+        ----------
+        start_t
+            starting time of the figure [in seconds]
+
+        Returns
+        -------
+        offset : int
+            index of the first sample of the figure in the buffer
+
+        Raises
+        ------
+        ValueError
+            When the beginning of the figure is before the beginning of the buffer
+        """
+
+        if start_t < self.start_t:
+            raise ValueError('Beginning time of the shape cannot be less than starting point of the base')
+        return int(np.floor((start_t - self.start_t) * self.sampling_rate))
+
+    def add(self, fig: np.ndarray, start_t) -> NoReturn:
+        """Adds the figure into the buffer in place
+
+        Samples of the figure that do not fit after the end of the buffer are dropped.
+
+        Parameters
+        ----------
+        fig : np.ndarray
+            an array of the figure that is to be added
+        start_t
+            starting time of the figure [in seconds]
+
+        Raises
+        ------
+        ValueError
+            When the size of the given figure is bigger than the buffer
+        """
+
+        if fig.size > self.buffer.size:
+            raise ValueError(f'Combined figure size cannot be bigger than the size of the base figure')
+
+        offset = self.sample_offset(start_t)
+        stop = min(offset + fig.size, self.buffer.size)
+        if stop > offset:
+            self.buffer[offset:stop] += fig[:stop - offset]
+
+    def window(self, start_t, size: int):
+        """Creates an accumulator which writes into the sub-window of the buffer
+
+        Parameters
+        ----------
+        start_t
+            starting time of the window [in seconds]
+        size : int
+            number of samples of the window, it is clipped to the end of the buffer
+
+        Returns
+        -------
+        accumulator : RenderAccumulator
+            accumulator backed by a view of this buffer
+        """
+
+        offset = self.sample_offset(start_t)
+        view = self.buffer[offset:offset + size]
+        return RenderAccumulator(view, self.sampling_rate, start_t)
@@ -0,0 +1,280 @@
+import os
+import hashlib
+from threading import Lock
+from typing import Dict, NoReturn, Optional, Tuple
+import numpy as np
+import yaml
+
+DICTIONARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dictionary.yaml')
+
+# Types of the strokes in the order of their codes
+STROKE_KINDS = ('Curve', 'Horizontal', 'Vertical')
+
+STROKE_DTYPE = np.dtype([('kind', 'u1'),
+                         ('t', 'f8'),
+                         ('f', 'f8'),
+                         ('width', 'f8'),
+                         ('height', 'f8'),
+                         ('descending', '?'),
+                         ('round', 'U1')])
+
+
+class GlyphAtlas:
+    """A class which represents compiled glyph definitions
+
+    All of the strokes of all of the symbols are kept in one structured array, the strokes of a single symbol
+    are its contiguous rows in the order of the YAML dictionary.
+
+    Attributes
+    ----------
+    strokes : np.ndarray
+        structured array of the stroke descriptors (STROKE_DTYPE), sizes and offsets are relative to the glyph
+    bounds : Dict[str, Tuple[int, int]]
+        range of the rows of each symbol in the strokes array
+    source_hash : str
+        SHA-256 hash of the YAML dictionary the atlas was compiled from
+
+    Methods
+    -------
+    glyph(symbol: str)
+        Returns the strokes of the symbol
+    save(path: str)
+        Saves the atlas as a binary sidecar
+    load(path: str)
+        Loads the atlas from a binary sidecar
+    """
+
+    def __init__(self, strokes: np.ndarray, bounds: Dict[str, Tuple[int, int]], source_hash: str):
+        """
+        Parameters
+        ----------
+        strokes : np.ndarray
+            structured array of the stroke descriptors (STROKE_DTYPE)
+        bounds : Dict[str, Tuple[int, int]]
+            range of the rows of each symbol in the strokes array
+        source_hash : str
+            SHA-256 hash of the YAML dictionary the atlas was compiled from
+        """
+
+        self.strokes: np.ndarray = strokes
+        self.bounds: Dict[str, Tuple[int, int]] = bounds
+        self.source_hash: str = source_hash
+
+    def __contains__(self, symbol: str):
+        return symbol in self.bounds
+
+    def glyph(self, symbol: str) -> np.ndarray:
+        """Returns the strokes of the symbol
+
+        Parameters
+        ----------
+        symbol : str
+            self-explanatory
+
+        Returns
+        -------
+        strokes : np.ndarray
+            view of the rows of the strokes array describing the symbol
+
+        Raises
+        ------
+        NotImplementedError
+            If the given character has not been implemented in the dictionary
+        """
+
+        if symbol not in self.bounds:
+            raise NotImplementedError(f"Cannot create '{symbol}' because it is not implemented yet.")
+        beg_idx, end_idx = self.bounds[symbol]
+        return self.strokes[beg_idx:end_idx]
+
+    def save(self, path: str) -> NoReturn:
+        """Saves the atlas as a binary sidecar
+
+        Parameters
+        ----------
+        path : str
+            path of the .npz file
+        """
+
+        symbols = list(self.bounds)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as stream:
+            np.savez(stream,
+                     strokes=self.strokes,
+                     symbols=np.array(symbols, dtype=str),
+                     bounds=np.array([self.bounds[sym] for sym in symbols], dtype=np.int64).reshape(-1, 2),
+                     source_hash=np.array(self.source_hash))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads the atlas from a binary sidecar
+
+        Parameters
+        ----------
+        path : str
+            path of the .npz file
+
+        Returns
+        -------
+        atlas : GlyphAtlas
+            loaded atlas
+        """
+
+        with np.load(path) as archive:
+            bounds = {str(sym): (int(beg), int(end)) for sym, (beg, end) in zip(archive['symbols'], archive['bounds'])}
+            return cls(archive['strokes'], bounds, str(archive['source_hash']))
+
+
+def compile_atlas(source: bytes) -> GlyphAtlas:
+    """Function parsing and validating the YAML dictionary
+
+    Parameters
+    ----------
+    source : bytes
+        content of the YAML dictionary
+
+    Returns
+    -------
+    atlas : GlyphAtlas
+        compiled atlas
+
+    Raises
+    ------
+    ValueError
+        If the dictionary cannot be parsed or the definition of any symbol is invalid
+    """
+
+    try:
+        dictionary = yaml.safe_load(source)
+    except yaml.YAMLError as exc:
+        raise ValueError(f'Cannot parse the dictionary of the letters: {exc}')
+
+    if not isinstance(dictionary, dict) or 'All_Letters' not in dictionary:
+        raise ValueError('Dictionary of the letters has to contain the All_Letters list')
+
+    rows = []
+    bounds = {}
+    for symbol in dictionary['All_Letters']:
+        symbol = str(symbol)
+        if not isinstance(dictionary.get(symbol), dict):
+            raise ValueError(f"Symbol '{symbol}' is listed in All_Letters but it is not defined")
+
+        beg_idx = len(rows)
+        for kind, strokes in dictionary[symbol].items():
+            if kind not in STROKE_KINDS:
+                raise ValueError(f"Unknown shape '{kind}' of the symbol '{symbol}'")
+            for parameters in strokes.values():
+                rows.append(_stroke_row(symbol, kind, parameters))
+        bounds[symbol] = (beg_idx, len(rows))
+
+    source_hash = hashlib.sha256(source).hexdigest()
+    return GlyphAtlas(np.array(rows, dtype=STROKE_DTYPE), bounds, source_hash)
+
+
+def _stroke_row(symbol: str, kind: str, parameters: list) -> tuple:
+    """Function validating parameters of a single stroke
+
+    Parameters
+    ----------
+    symbol : str
+        symbol the stroke belongs to
+    kind : str
+        type of the stroke
+    parameters : list
+        parameters of the stroke read from the dictionary
+
+    Returns
+    -------
+    row : tuple
+        stroke descriptor matching STROKE_DTYPE
+
+    Raises
+    ------
+    ValueError
+        If the parameters are invalid or the stroke does not fit in the glyph
+    """
+
+    precision = 1.e-9
+    size = 6 if kind == 'Curve' else 4
+    if not isinstance(parameters, list) or len(parameters) != size:
+        raise ValueError(f"Shape '{kind}' of the symbol '{symbol}' requires {size} parameters")
+
+    t, f, width, height = (float(value) for value in parameters[:4])
+    if min(t, f, width, height) < 0:
+        raise ValueError(f"Placement and size of the shapes of the symbol '{symbol}' cannot be negative")
+    if t + width > 1 + precision or f + height > 1 + precision:
+        raise ValueError(f"Shape '{kind}' of the symbol '{symbol}' exceeds the size of the letter")
+
+    descending, rnd = (bool(parameters[4]), parameters[5]) if kind == 'Curve' else (False, False)
+    # Roundness given as False means the straight line
+    rnd = rnd if rnd in ('t', 'b') else 'l'
+    return STROKE_KINDS.index(kind), t, f, width, height, descending, rnd
+
+
+_atlas: Optional[GlyphAtlas] = None
+_atlas_lock = Lock()
+
+
+def load_atlas(dictionary_path: str = DICTIONARY_PATH) -> GlyphAtlas:
+    """Function returning the atlas of the dictionary
+
+    The default atlas is loaded once per process. It is read from the binary sidecar placed next to the
+    dictionary, which is recompiled only when the content of the YAML dictionary changes.
+
+    Parameters
+    ----------
+    dictionary_path : str
+        path to the .YAML dictionary
+
+    Returns
+    -------
+    atlas : GlyphAtlas
+        compiled atlas
+    """
+
+    global _atlas
+
+    if dictionary_path != DICTIONARY_PATH:
+        return _load_sidecar(dictionary_path)
+
+    with _atlas_lock:
+        if _atlas is None:
+            _atlas = _load_sidecar(dictionary_path)
+        return _atlas
+
+
+def _load_sidecar(dictionary_path: str) -> GlyphAtlas:
+    """Function loading the atlas from the sidecar or compiling it when the sidecar is outdated
+
+    Parameters
+    ----------
+    dictionary_path : str
+        path to the .YAML dictionary
+
+    Returns
+    -------
+    atlas : GlyphAtlas
+        compiled atlas
+    """
+
+    with open(dictionary_path, 'rb') as stream:
+        source = stream.read()
+    source_hash = hashlib.sha256(source).hexdigest()
+    sidecar_path = os.path.splitext(dictionary_path)[0] + '.atlas.npz'
+
+    if os.path.exists(sidecar_path):
+        try:
+            atlas = GlyphAtlas.load(sidecar_path)
+            if atlas.source_hash == source_hash:
+                return atlas
+        except (OSError, ValueError, KeyError):
+            pass
+
+    atlas = compile_atlas(source)
+    try:
+        atlas.save(sidecar_path)
+    except OSError:
+        # Read-only installation, the atlas is compiled in every process
+        pass
+    return atlas
@@ -0,0 +1,279 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+
+from letters.atlas import load_atlas
+from letters.raster import rasterize_glyph
+from visualization.single_signal import Signal
+from visualization.spectrogram import Spectrogram
+
+# Shifts of the glyph masks along the time axis [in cells], thin letters (e.g. I) are narrower than a cell of
+# the blur, so rounding of their position in the slot would otherwise make them look like spaces
+TIME_SHIFTS = (-1, 0, 1)
+
+# Margin of the region of the spectrogram on both sides of the text [in seconds], one window of the Spectrogram
+# class, so the frames centered at the borders of the text (e.g. at the vertical stroke of a D in the first slot)
+# are calculated
+REGION_MARGIN = 0.01
+
+
+class Decoder:
+    """A class which reads the text hidden in the signal back
+
+    The spectrogram of the region of the text is calculated with the settings of the Spectrogram class and
+    averaged into a coarse grid of cells for every letter slot of the text. Each slot is compared with the
+    masks of all of the glyphs of the atlas, drawn on the same grid, by normalized correlation, which for all
+    of the slots and glyphs is a single matrix product. Each glyph is matched at TIME_SHIFTS offsets and its
+    best match counts, so a slot is read as a space only when no glyph matches it at any of them.
+
+    The power of the cells is averaged before the logarithm is taken. A vertical stroke is band noise of sines
+    starting in phase, a click which fills a single frame of the spectrogram, so the mean of the logarithmic
+    power of the frames of a cell would dilute it into the noise, and the glyphs which differ by a vertical
+    stroke only (e.g. P and F, M and Y, I and a space) would be confused.
+
+    Attributes
+    ----------
+    signal : Signal
+        a signal with the hidden text
+    start_t
+        a floating point number representing the beginning of the text - left border [in seconds]
+    start_f
+        a floating point number representing the beginning of the text - bottom border [in HZ]
+    width
+        a floating point number representing the width of the text [in seconds]
+    height
+        a floating point number representing the height of the text [in Hz]
+    space_usage
+        part of the slot of the letter taken by the letter, the same as in the Text class
+    max_number_of_letters : int
+        maximum number of letters per second, the same as in the Text class
+    min_score
+        correlation below which the slot may be decoded as a space
+    min_contrast
+        contrast of the best glyph below which the slot may be decoded as a space
+    symbols : List[str]
+        symbols of the glyph atlas
+    _templates : np.ndarray
+        (shifts * symbols, cells) array of the normalized glyph masks shifted by TIME_SHIFTS
+    _f_cells : np.ndarray
+        indices of the frequency cells of the bins of the spectrogram, -1 outside of the text
+
+    Methods
+    -------
+    decode(length: Optional[int])
+        Recovers the text and the confidence of each character
+    """
+
+    def __init__(self, sound: Signal, start_t, start_f, width, height, grid: Tuple[int, int] = (16, 16),
+                 min_score=0.5, min_contrast=0.4):
+        """
+        Parameters
+        ----------
+        sound : Signal
+            a signal with the hidden text
+        start_t
+            a floating point number representing the beginning of the text - left border [in seconds]
+        start_f
+            a floating point number representing the beginning of the text - bottom border [in HZ]
+        width
+            a floating point number representing the width of the text [in seconds]
+        height
+            a floating point number representing the height of the text [in Hz]
+        grid : Tuple[int, int]
+            maximum number of the cells of a letter along the frequency and the time axis
+        min_score
+            correlation below which the slot may be decoded as a space
+        min_contrast
+            difference of the mean logarithmic power of the cells covered and not covered by the best glyph
+            below which the slot may be decoded as a space [in decades of power]
+        """
+
+        self.signal: Signal = sound
+        self.start_t = start_t
+        self.start_f = start_f
+        self.width = width
+        self.height = height
+        self.space_usage = 80/100
+        self.max_number_of_letters: int = 6
+        self.min_score = min_score
+        self.min_contrast = min_contrast
+
+        self._power, self._taxis, frqaxis = self._region_spectrogram()
+
+        # There is no point in the frequency cells narrower than the bins of the spectrogram
+        bins_in_band = np.count_nonzero((frqaxis >= start_f) & (frqaxis <= start_f + height))
+        self._grid = (int(np.clip(bins_in_band, 4, grid[0])), grid[1])
+        self._f_cells = np.digitize(frqaxis, _frequency_edges(start_f, height, self._grid[0])) - 1
+        self._f_cells[self._f_cells >= self._grid[0]] = -1
+
+        symbols, self._templates = _glyph_templates(float(start_f), float(height), self._grid)
+        self.symbols: List[str] = list(symbols)
+
+    def decode(self, length: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Recovers the text and the confidence of each character
+
+        Parameters
+        ----------
+        length : Optional[int]
+            number of characters of the text (with spaces), if None the length giving the best matches is used
+
+        Returns
+        -------
+        characters : List[Tuple[str, float]]
+            decoded characters and their confidence in the range of [0, 1]
+        """
+
+        if length is not None:
+            return self._decode(length)[0]
+
+        max_length = max(1, int(self.width * self.max_number_of_letters))
+        results = [self._decode(n) for n in range(1, max_length + 1)]
+        return max(results, key=lambda result: result[1])[0]
+
+    def _decode(self, length: int):
+        """Decodes the text of the given length
+
+        Returns
+        -------
+        characters : List[Tuple[str, float]]
+            decoded characters and their confidence
+        score
+            mean correlation of the best matches
+        """
+
+        features = self._features(length)
+        normalized = _normalize(features)
+        scores = normalized @ self._templates.T
+        best = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(length), best]
+
+        # Contrast of the power under the best glyph, the correlation alone does not tell a faint glyph from noise
+        covered = self._templates[best] > 0
+        contrast = np.array([cells[mask].mean() - cells[~mask].mean() if np.any(~mask) else 0.
+                             for cells, mask in zip(features, covered)])
+
+        characters = []
+        for template_idx, score, slot_contrast in zip(best, best_scores, contrast):
+            symbol_idx = template_idx % len(self.symbols)
+            # A space has to look empty by both of the measures
+            if score < self.min_score and slot_contrast < self.min_contrast:
+                characters.append((' ', float(1 - max(score, 0) / self.min_score)))
+            else:
+                characters.append((self.symbols[symbol_idx], float(min(score, 1))))
+        return characters, float(np.mean(best_scores))
+
+    def _features(self, length: int) -> np.ndarray:
+        """Averages the spectrogram into the grid of cells of each letter slot
+
+        Returns
+        -------
+        features : np.ndarray
+            (slots, cells) array of the logarithm of the mean power of the cells
+        """
+
+        slot_width = self.width / length
+        letter_width = slot_width * self.space_usage
+        # A frame stands for the hop around its center, so the frames centered up to half of a hop before a letter
+        # belong to its first cell (the click of a vertical stroke at the beginning of the letter may peak there)
+        half_hop = (self._taxis[1] - self._taxis[0]) / 2 if len(self._taxis) > 1 else 0
+        slots = np.floor((self._taxis + half_hop) / slot_width).astype(int)
+        position = np.maximum(self._taxis - slots * slot_width, 0) / letter_width
+        t_cells = np.floor(position * self._grid[1]).astype(int)
+        t_cells[(position >= 1) | (slots >= length) | (slots < 0)] = -1
+
+        f_idx, t_idx = np.nonzero((self._f_cells[:, None] >= 0) & (t_cells[None, :] >= 0))
+        cells = (slots[t_idx] * self._grid[0] + self._f_cells[f_idx]) * self._grid[1] + t_cells[t_idx]
+
+        size = length * self._grid[0] * self._grid[1]
+        sums = np.bincount(cells, weights=self._power[f_idx, t_idx], minlength=size)
+        counts = np.bincount(cells, minlength=size)
+        features = np.log10(sums / np.maximum(counts, 1) + np.finfo(np.float32).tiny).reshape(length, -1)
+
+        # Cells without any bin of the spectrogram get the mean of the slot
+        empty = (counts == 0).reshape(length, -1)
+        slot_means = np.sum(np.where(empty, 0, features), axis=1) / np.maximum(np.sum(~empty, axis=1), 1)
+        features = np.where(empty, slot_means[:, None], features)
+        return features
+
+    def _region_spectrogram(self):
+        """Calculates power spectrogram of the region of the text and REGION_MARGIN around it
+
+        Returns
+        -------
+        power : np.ndarray
+            (frequencies, frames) array of the power
+        taxis : np.ndarray
+            times of the frames relative to the beginning of the text [in seconds]
+        frqaxis : np.ndarray
+            frequencies of the bins [in Hz]
+        """
+
+        sampling_rate = self.signal.sampling_rate
+        beg_idx = max(int(np.ceil((self.start_t - REGION_MARGIN) * sampling_rate)), 0)
+        end_idx = min(int(np.ceil((self.start_t + self.width + REGION_MARGIN) * sampling_rate)), len(self.signal))
+        samples = self.signal.data[beg_idx:end_idx]
+        if samples.ndim > 1:
+            # The text is decoded from the downmix of the channels
+            samples = samples.mean(axis=1, dtype=np.float32)
+        region = Signal(samples, sampling_rate, dtype=np.float32)
+
+        spec = Spectrogram(region, dtype=np.float32)
+        spec.calculate_spectrogram()
+        # The frames before and after the text fall out of the slots
+        return spec.spectrogram, spec.taxis + beg_idx / sampling_rate - self.start_t, spec.frqaxis
+
+
+def _frequency_edges(start_f, height, cells: int) -> np.ndarray:
+    """Edges of the frequency cells, centers of the outermost cells lie on the borders of the text"""
+
+    half_cell = height / (2 * (cells - 1))
+    return np.linspace(start_f - half_cell, start_f + height + half_cell, cells + 1)
+
+
+@lru_cache(maxsize=32)
+def _glyph_templates(start_f, height, grid: Tuple[int, int]):
+    """Draws the normalized masks of all of the glyphs of the atlas
+
+    Masks depend only on the frequency placement of the text (curves are not linear in frequency), so they
+    are cached for the repeated decoding at the same geometry.
+
+    Returns
+    -------
+    symbols : Tuple[str]
+        symbols of the atlas
+    templates : np.ndarray
+        (shifts * symbols, cells) read-only array of the normalized masks, all of the symbols for each shift
+    """
+
+    atlas = load_atlas()
+    symbols = tuple(atlas.bounds)
+    f_edges = _frequency_edges(start_f, height, grid[0])
+    t_edges = np.linspace(0, 1, grid[1] + 1)
+    masks = np.array([rasterize_glyph(atlas.glyph(symbol), 1, height, start_f, t_edges, f_edges)
+                      for symbol in symbols])
+    blurred = _blur(masks)
+    width = max(abs(shift) for shift in TIME_SHIFTS)
+    padded = np.pad(blurred, ((0, 0), (0, 0), (width, width)))
+    shifted = [padded[:, :, width - shift:width - shift + grid[1]] for shift in TIME_SHIFTS]
+    templates = _normalize(np.concatenate(shifted).reshape(len(TIME_SHIFTS) * len(symbols), -1))
+    templates.setflags(write=False)
+    return symbols, templates
+
+
+def _blur(masks: np.ndarray) -> np.ndarray:
+    """Spreads the masks by one cell, which tolerates leakage of the spectrogram and the rounding of the grid"""
+
+    padded = np.pad(masks, ((0, 0), (1, 1), (1, 1)))
+    blurred = np.zeros_like(masks)
+    for df in range(3):
+        for dt in range(3):
+            blurred += padded[:, df:df + masks.shape[1], dt:dt + masks.shape[2]]
+    return np.maximum(masks, blurred / 9)
+
+
+def _normalize(features: np.ndarray) -> np.ndarray:
+    """Centers the rows and scales them to the unit norm, so their dot product is the correlation"""
+
+    features = features - features.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.where(norms > 0, norms, 1)
@@ -0,0 +1,176 @@
+import textwrap
+from typing import Iterator, List, NamedTuple, NoReturn, Optional, Sequence
+import numpy as np
+
+from letters.short_text import MAX_LETTERS_PER_SECOND, Text
+
+# Letters per second of the lines when the caller does not specify it, Text accepts up to 6
+DEFAULT_LETTERS_PER_SECOND: float = 4.
+
+# Gap between the frequency bands of a page [in heights of the line]
+LINE_SPACING: float = 1.0
+
+
+class Line(NamedTuple):
+    """Placement of a single line of the flowed text"""
+
+    start_t: float
+    start_f: float
+    width: float
+    text: str
+
+
+class FlowedText:
+    """A class which represents a long text flowed over the whole signal
+
+    The text is wrapped into lines of at most the given width, the lines are grouped into pages of the given
+    number of frequency bands (the first line of a page in the highest band) and the pages are spread evenly
+    over the time from the beginning of the text to the end of the signal. All of the letters have the same
+    size, so each line is as wide as its number of characters requires.
+
+    Lines are separate Text shapes created only when they are rendered, so rendering and mixing the text
+    needs the memory of a single page regardless of the length of the text.
+
+    Attributes
+    ----------
+    template
+        a base sound as a Signal class object, used as a template for calculations
+    lines : List[Line]
+        placement of the lines in the order of the text
+    height
+        height of the lines [in Hz]
+    scaling : str
+        amplitude scaling mode of the lines, one of letters.shape.SCALINGS
+    size : int
+        total number of samples of the figures of the lines
+
+    Methods
+    -------
+    texts()
+        Yielding the shapes of the consecutive lines
+    apply(signal, copy: bool, channels: Sequence[int], gains: Sequence[float], workers: Optional[int])
+        Rendering the lines one by one and mixing them into the signal
+    """
+
+    def __init__(self, sound, start_t, start_f, width, height, text: str, bands: int = 1,
+                 letters_per_second: float = DEFAULT_LETTERS_PER_SECOND, end_t=None, scaling: str = 'global'):
+        """
+        Parameters
+        ----------
+        sound
+            a base sound as a Signal class object, used as a template for calculations
+        start_t
+            beginning of the first page [in seconds]
+        start_f
+            bottom border of the lowest band [in Hz]
+        width
+            maximum width of a line [in seconds]
+        height
+            height of the lines [in Hz]
+        text : str
+            a string to be flowed, the words are not split unless they do not fit in a line
+        bands : int
+            number of the lines of a page, stacked in frequency
+        letters_per_second : float
+            density of the letters of the lines
+        end_t
+            end of the last page [in seconds], the end of the signal by default
+        scaling : str
+            amplitude scaling mode of the lines
+
+        Raises
+        ------
+        ValueError
+            If the text is empty, the density or the number of the bands is invalid, the bands exceed the
+            Nyquist frequency or the pages do not fit in the signal
+        """
+
+        if not 0 < letters_per_second <= MAX_LETTERS_PER_SECOND:
+            raise ValueError(f'Density of the letters has to be in the range (0, {MAX_LETTERS_PER_SECOND}] per '
+                             f'second')
+        if bands < 1:
+            raise ValueError('Number of the bands has to be positive')
+        capacity = int(width * letters_per_second)
+        if capacity < 1:
+            raise ValueError('Line is too narrow to hold a single letter')
+
+        nyquist = sound.sampling_rate / 2
+        band_step = height * (1 + LINE_SPACING)
+        if start_f + (bands - 1) * band_step + height > nyquist:
+            raise ValueError(f'Cannot stack {bands} bands of {height} Hz above {start_f} Hz\n'
+                             f'Maximum frequency: {nyquist} [Hz]')
+
+        wrapped = textwrap.wrap(text, capacity, break_on_hyphens=False)
+        if not wrapped:
+            raise ValueError('Cannot show empty string')
+
+        # The last sample of the signal is excluded, so the rounding of the last line never exceeds it
+        end_t = (len(sound) - 1) / sound.sampling_rate if end_t is None else end_t
+        pages = -(-len(wrapped) // bands)
+        available = int((end_t - start_t) // width) if end_t > start_t else 0
+        if pages > available:
+            raise ValueError(f'The text needs {pages} pages of {width} s, only {available} fit in the signal. '
+                             f'Use more bands, denser letters or a longer signal')
+
+        # Pages are spread evenly over the available time
+        page_step = (end_t - start_t) / pages
+        self.template = sound
+        self.height = height
+        self.scaling: str = scaling
+        self.lines: List[Line] = []
+        for number, line in enumerate(wrapped):
+            page, band = divmod(number, bands)
+            line_width = len(line) / letters_per_second
+            if len(line) / line_width > letters_per_second:
+                # Rounding must not make the line denser than the limit of the Text class
+                line_width = np.nextafter(line_width, np.inf)
+            self.lines.append(Line(start_t + page * page_step, start_f + (bands - 1 - band) * band_step,
+                                   line_width, line))
+
+    def texts(self) -> Iterator[Text]:
+        """Yielding the shapes of the consecutive lines
+
+        The level of the strokes (or the loudness index in the local scaling mode) is taken from the template
+        once and pinned on every line, so mixing the previous lines does not change it.
+
+        Yields
+        ------
+        text : Text
+            not rendered shape of the line, in the order of the beginning in time
+        """
+
+        level = self.template.mean_amplitude() if self.scaling == 'global' else None
+        loudness = self.template.loudness()
+        for line in self.lines:
+            text = Text(self.template, line.start_t, line.start_f, line.width, self.height, line.text, self.scaling)
+            text.reference_level = level
+            text.reference_loudness = loudness
+            yield text
+
+    def apply(self, signal, copy: bool = False, channels: Optional[Sequence[int]] = None,
+              gains: Optional[Sequence[float]] = None, workers: Optional[int] = None) -> NoReturn:
+        """Rendering the lines one by one and mixing them into the signal
+
+        Parameters
+        ----------
+        signal : Signal
+            signal the text is mixed into, usually the template
+        copy : bool
+            if True, the original samples are not modified (copy-on-write mode)
+        channels : Sequence[int], optional
+            indices of the channels the text is mixed into, all of the channels by default
+        gains : Sequence[float], optional
+            gains of the text in the selected channels, 1 by default
+        workers : Optional[int]
+            number of threads rendering the letters, None means the default of the letters.parallel module
+        """
+
+        for text in self.texts():
+            text.create_shape(workers)
+            signal.apply_shape(text, copy=copy, channels=channels, gains=gains)
+
+    @property
+    def size(self) -> int:
+        """Total number of samples of the figures of the lines"""
+
+        return sum(int(np.ceil(line.width * self.template.sampling_rate)) for line in self.lines)
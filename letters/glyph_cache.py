@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, NoReturn, Optional
+import numpy as np
+
+
+class GlyphCache:
+    """A class which represents size-bounded LRU cache of rendered glyph waveforms
+
+    Rendered glyphs depend on their position in time only through the rounding of the beginnings of their
+    strokes to samples, so a waveform rendered once can be reused at any time offset which rounds the strokes
+    to the same samples (the offsets of the strokes are part of the key). Entries are evicted in least recently
+    used order when the total size exceeds the memory cap.
+
+    Attributes
+    ----------
+    hits : int
+        number of lookups which found the glyph
+    misses : int
+        number of lookups which did not find the glyph
+    evictions : int
+        number of glyphs removed to fit under the memory cap
+    _entries : OrderedDict
+        cached glyphs ordered from the least to the most recently used
+    _max_bytes : int
+        memory cap of the cache [in bytes]
+    _size_bytes : int
+        total size of the cached glyphs [in bytes]
+
+    Methods
+    -------
+    key(symbol, width, height, start_f, sampling_rate, scaling, dtype, offsets)
+        Creates the key identifying rendered glyph
+    get(key)
+        Returns cached glyph or None
+    put(key, glyph: np.ndarray)
+        Stores the glyph in the cache
+    clear()
+        Removes all of the glyphs and resets the counters
+    stats()
+        Returns the counters of the cache
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            memory cap of the cache [in bytes], 0 disables caching
+        """
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._max_bytes: int = max_bytes
+        self._size_bytes: int = 0
+        self._lock = Lock()
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes: int):
+        if max_bytes < 0:
+            raise ValueError('Memory cap of the cache cannot be negative')
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    @staticmethod
+    def key(symbol: str, width, height, start_f, sampling_rate, scaling: Hashable, dtype=np.float64,
+            offsets: tuple = ()) -> tuple:
+        """Creates the key identifying rendered glyph
+
+        Parameters
+        ----------
+        symbol : str
+            rendered character
+        width
+            width of the glyph [in seconds]
+        height
+            height of the glyph [in Hz]
+        start_f
+            bottom border of the glyph [in Hz]
+        sampling_rate
+            self-explanatory
+        scaling : Hashable
+            description of the amplitude scaling policy applied to the strokes of the glyph
+        dtype
+            type of the samples of the glyph
+        offsets : tuple
+            indices of the first samples of the strokes in the glyph
+
+        Returns
+        -------
+        key : tuple
+            key of the glyph
+        """
+
+        return (symbol, float(width), float(height), float(start_f), float(sampling_rate), scaling,
+                np.dtype(dtype).str, tuple(int(offset) for offset in offsets))
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        """Returns cached glyph or None
+
+        Parameters
+        ----------
+        key : tuple
+            key of the glyph
+
+        Returns
+        -------
+        glyph : Optional[np.ndarray]
+            read-only waveform of the glyph if it is cached
+        """
+
+        with self._lock:
+            glyph = self._entries.get(key)
+            if glyph is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return glyph
+
+    def put(self, key: tuple, glyph: np.ndarray) -> NoReturn:
+        """Stores the glyph in the cache
+
+        The glyph is made read-only, so it is safe to share it. Glyphs bigger than the memory cap are not stored.
+
+        Parameters
+        ----------
+        key : tuple
+            key of the glyph
+        glyph : np.ndarray
+            waveform of the glyph
+        """
+
+        with self._lock:
+            if glyph.nbytes > self._max_bytes:
+                return
+            glyph.setflags(write=False)
+            if key in self._entries:
+                self._size_bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = glyph
+            self._size_bytes += glyph.nbytes
+            self._evict()
+
+    def clear(self) -> NoReturn:
+        """Removes all of the glyphs and resets the counters"""
+
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns the counters of the cache
+
+        Returns
+        -------
+        stats : dict
+            hits, misses, evictions, number of entries, size and memory cap of the cache
+        """
+
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'size_bytes': self._size_bytes,
+                    'max_bytes': self._max_bytes}
+
+    def _evict(self) -> NoReturn:
+        """Removes the least recently used glyphs until the cache fits under the memory cap"""
+
+        while self._size_bytes > self._max_bytes and self._entries:
+            _, glyph = self._entries.popitem(last=False)
+            self._size_bytes -= glyph.nbytes
+            self.evictions += 1
+
+
+# Process-wide cache shared by all of the letters
+glyph_cache = GlyphCache()
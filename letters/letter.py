@@ -1,7 +1,13 @@
-from typing import List, NoReturn
-import yaml
-
+import copy
+from typing import List, NoReturn, Optional
+import numpy as np
+
+from letters.accumulator import RenderAccumulator
+from letters.atlas import GlyphAtlas, STROKE_KINDS, load_atlas
+from letters.glyph_cache import glyph_cache
+from letters.parallel import map_in_order
 from letters.shape import Shape, Curve, HorizontalLine, VerticalLine
+from utils import instrumentation
 
 
 class Letter(Shape):
@@ -11,17 +17,21 @@ class Letter(Shape):
     ----------
     all_figures : List[Shape]
         a list of objects of the Shape class, each representing single shape
-    dictionary_path : str
-        a path to the .YAML file which consists of the parameters for each shape of the letter
-    dictionary_data : dict
-        data returned by the yaml.safe_load() function
+    glyph_atlas : GlyphAtlas
+        compiled .YAML dictionary which consists of the parameters for each shape of the letter
     symbol : str
         a character to be created
 
     Methods
     -------
-    create_shape()
+    create_shape(accumulator: Optional[RenderAccumulator], workers: Optional[int])
         Recalculates the shape position and creates each shape of the letter
+    render_glyph(workers: Optional[int])
+        Renders the letter into its own buffer starting at the beginning of the letter
+    stroke_levels()
+        Returns the mean absolute amplitudes the strokes are scaled to
+    stroke_offsets()
+        Returns the offsets of the strokes from the beginning of the letter
     _recalculate_position(shape: Shape)
         Recalculates the position of the shape of the letter based on the relative position in the letter
     """
@@ -52,68 +62,139 @@ class Letter(Shape):
         super().__init__(sound, start_t, start_f, width, height)
 
         self.all_figures: List[Shape] = []
-        self.dictionary_path: str = './letters/dictionary.yaml'
-        self.dictionary_data: dict = {}
+        self.glyph_atlas: GlyphAtlas = load_atlas()
         self.symbol: str = symbol
+        self._local_starts: list = []
+
+        for stroke in self.glyph_atlas.glyph(symbol):
+            kind = STROKE_KINDS[stroke['kind']]
+            start_t = width * float(stroke['t'])
+            start_f = height * float(stroke['f'])
+            shape_width = width * float(stroke['width'])
+            shape_height = height * float(stroke['height'])
+            if kind == 'Curve':
+                self.all_figures.append(Curve(sound, start_t, start_f, shape_width, shape_height,
+                                              desc=bool(stroke['descending']),
+                                              rnd=str(stroke['round'])))
+            elif kind == 'Horizontal':
+                self.all_figures.append(HorizontalLine(sound, start_t, start_f, shape_width, shape_height))
+            else:
+                self.all_figures.append(VerticalLine(sound, start_t, start_f, shape_width, shape_height))
+            self._local_starts.append(start_t)
+
+    def create_shape(self, accumulator: Optional[RenderAccumulator] = None, workers: Optional[int] = None) -> NoReturn:
+        """Recalculates position, creates a shape, combines new shape with base figure
 
-        # Loading dictionary
-        with open(self.dictionary_path, "r") as stream:
-            try:
-                self.dictionary_data = yaml.safe_load(stream)
-            except yaml.YAMLError as exc:
-                print(exc)
+        Parameters
+        ----------
+        accumulator : Optional[RenderAccumulator]
+            accumulator of the parent figure starting at the beginning of the letter, if given the letter is
+            rendered directly into its buffer and the figure becomes a view of it
+        workers : Optional[int]
+            number of threads rendering the strokes, None means the default of the letters.parallel module
+        """
 
-        if symbol not in self.dictionary_data['All_Letters']:
-            raise NotImplementedError(f"Cannot create '{symbol}' because it is not implemented yet.")
+        if accumulator is None:
+            accumulator = RenderAccumulator(self.figure, self.template.sampling_rate, self.start_point_t)
         else:
-            for shape in self.dictionary_data[symbol]:
-                if shape == 'Curve':
-                    for iteration in self.dictionary_data[symbol][shape]:
-                        parameters = self.dictionary_data[symbol][shape][iteration]
-                        self.all_figures.append(Curve(sound,
-                                                      width * parameters[0],
-                                                      height * parameters[1],
-                                                      width * parameters[2],
-                                                      height * parameters[3],
-                                                      desc=parameters[4],
-                                                      rnd=parameters[5]))
-                if shape == 'Horizontal':
-                    for iteration in self.dictionary_data[symbol][shape]:
-                        parameters = self.dictionary_data[symbol][shape][iteration]
-                        self.all_figures.append(HorizontalLine(sound,
-                                                               width * parameters[0],
-                                                               height * parameters[1],
-                                                               width * parameters[2],
-                                                               height * parameters[3]))
-                if shape == 'Vertical':
-                    for iteration in self.dictionary_data[symbol][shape]:
-                        parameters = self.dictionary_data[symbol][shape][iteration]
-                        self.all_figures.append(VerticalLine(sound,
-                                                             width * parameters[0],
-                                                             height * parameters[1],
-                                                             width * parameters[2],
-                                                             height * parameters[3]))
-
-    def create_shape(self) -> NoReturn:
-        """Recalculates position, creates a shape, combines new shape with base figure"""
-
-        for shape in self.all_figures:
-            shape = self._recalculate_position(shape)
-            shape.create_shape()
-            self._combine_figures(shape.figure, shape.start_point_t)
+            self.figure = accumulator.buffer
+
+        accumulator.add(self.render_glyph(workers), self.start_point_t)
+
+    def render_glyph(self, workers: Optional[int] = None) -> np.ndarray:
+        """Renders the letter into its own buffer starting at the beginning of the letter
+
+        The beginnings of the strokes are rounded to samples in absolute time, the same as when the strokes are
+        added into the figure of the text one by one, so the glyph depends on the position of the letter only
+        through these offsets. It is taken from the process-wide glyph cache when the same symbol has already
+        been rendered at the same geometry and with the same offsets of the strokes.
+        Strokes are rendered in parallel and summed in their order, so the result does not depend on the
+        number of threads.
+
+        Parameters
+        ----------
+        workers : Optional[int]
+            number of threads rendering the strokes, None means the default of the letters.parallel module
+
+        Returns
+        -------
+        glyph : np.ndarray
+            read-only waveform of the letter
+        """
+
+        with instrumentation.stage('letter', samples=self.size):
+            return self._render_glyph(workers)
+
+    def _render_glyph(self, workers: Optional[int]) -> np.ndarray:
+        """Renders the glyph, see render_glyph"""
+
+        levels = self.stroke_levels()
+        # In the local scaling mode the glyph can be reused where the levels of the strokes are the same
+        scaling = ('local', tuple(levels)) if self.scaling == 'local' else ('mean', self._reference_level())
+        key = glyph_cache.key(self.symbol, self.width, self.height, self.start_point_f,
+                              self.template.sampling_rate, scaling, self.dtype, self.stroke_offsets())
+        glyph = glyph_cache.get(key)
+        if glyph is None:
+            # Strokes are positioned as copies, so the strokes of the letter keep their relative positions and
+            # the letter can be rendered again
+            strokes = [self._recalculate_position(shape) for shape in self.all_figures]
+            for stroke, level in zip(strokes, levels):
+                stroke.reference_level = level
+
+            glyph = np.zeros(int(np.ceil(self.width * self.template.sampling_rate)), dtype=self.dtype)
+            glyph_accumulator = RenderAccumulator(glyph, self.template.sampling_rate, self.start_point_t)
+            for stroke in map_in_order(_render, strokes, workers):
+                glyph_accumulator.add(stroke.figure, stroke.start_point_t)
+            glyph_cache.put(key, glyph)
+        return glyph
+
+    def stroke_levels(self) -> list:
+        """Returns the mean absolute amplitudes the strokes are scaled to
+
+        In the local scaling mode each stroke matches the audio around it, otherwise all of them have the
+        reference level of the letter.
+
+        Returns
+        -------
+        levels : list
+            levels of the strokes in the order of all_figures
+        """
+
+        if self.scaling == 'local':
+            return [self._local_level(self.start_point_t + local_t, shape.width)
+                    for local_t, shape in zip(self._local_starts, self.all_figures)]
+        return [self._reference_level()] * len(self.all_figures)
+
+    def stroke_offsets(self) -> List[int]:
+        """Returns the offsets of the strokes from the beginning of the letter
+
+        The offsets are the ones the strokes are added at while the glyph is rendered: the beginnings of the
+        strokes in absolute time are rounded to samples from the beginning of the letter.
+
+        Returns
+        -------
+        offsets : List[int]
+            indices of the first samples of the strokes in the glyph, in the order of all_figures
+        """
+
+        accumulator = RenderAccumulator(np.empty(0, dtype=self.dtype), self.template.sampling_rate,
+                                        self.start_point_t)
+        return [accumulator.sample_offset(self.start_point_t + local_t) for local_t in self._local_starts]
 
     def _recalculate_position(self, new_shape: Shape):
         """Recalculates position of the new shape in respect to the base figure
 
+        The shape is not modified, its copy is positioned instead, so the position is never added twice.
+
         Parameters
         ----------
         new_shape : Shape
-            new shape which starting points are being recalculated
+            new shape which starting points are being recalculated, relative to the letter
 
         Returns
         -------
         new_shape : Shape
-            new shape after recalculations
+            copy of the shape at its absolute position
 
         Raises
         ------
@@ -134,6 +215,7 @@ class Letter(Shape):
         if new_shape.start_point_f < 0:
             raise ValueError('Frequency placement cannot be negative')
 
+        new_shape = copy.copy(new_shape)
         new_shape.start_point_t = self.start_point_t + new_shape.start_point_t
         if (self.start_point_t + self.width) - (new_shape.start_point_t + new_shape.width) < precision:
             raise ValueError('Cannot create the shape: placement + width exceeds the maximum size')
@@ -143,3 +225,11 @@ class Letter(Shape):
             raise ValueError('Cannot create the shape: placement + width exceeds the maximum size')
 
         return new_shape
+
+
+def _render(shape: Shape) -> Shape:
+    """Creates the shape and returns it, used to render the shapes on the pool of threads"""
+
+    with instrumentation.stage(shape.id_name, samples=shape.size):
+        shape.create_shape()
+    return shape
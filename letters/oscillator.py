@@ -0,0 +1,238 @@
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import NoReturn
+import numpy as np
+
+from letters.glyph_cache import glyph_cache
+
+# Maximum absolute error of the synthesized sine waves when the caller does not specify it
+default_max_error: float = 1.e-7
+
+# Number of samples synthesized at once, the intermediate arrays of a block fit in the cache
+BLOCK_SIZE: int = 16384
+
+# Number of sampling rates whose time axes are kept, the least recently used one is dropped above it
+MAX_TIME_AXES: int = 4
+
+# Maximum number of samples of a kept time axis (32 MiB), longer axes are built for each stroke
+MAX_TIME_AXIS_SIZE: int = 2 ** 22
+
+_time_axes = OrderedDict()
+_time_axes_lock = Lock()
+
+
+class Wavetable:
+    """A class which represents a single cycle of the sine wave used for the table-lookup synthesis
+
+    The phase of the oscillator is kept in cycles, so it is reduced to a single cycle by dropping its integer
+    part, and the wave is linearly interpolated between the samples of the table. Unlike np.sin, the cost does
+    not grow with the magnitude of the phase, which for long strokes reaches millions of radians.
+
+    Attributes
+    ----------
+    size : int
+        number of samples of the cycle (a power of 2)
+    max_error : float
+        bound of the absolute error of the interpolation (the rounding of the phase comes on top of it)
+    _tables : dict
+        read-only samples of the cycle and the slopes between them for each type of the result
+
+    Methods
+    -------
+    sine(cycles: np.ndarray, dtype)
+        Calculates sin(2*pi*cycles)
+    cosine(cycles: np.ndarray, dtype)
+        Calculates cos(2*pi*cycles)
+    """
+
+    def __init__(self, size: int):
+        """
+        Parameters
+        ----------
+        size : int
+            number of samples of the cycle, has to be a power of 2
+
+        Raises
+        ------
+        ValueError
+            If the size is not a power of 2
+        """
+
+        if size < 4 or size & (size - 1):
+            raise ValueError('Size of the wavetable has to be a power of 2 not smaller than 4')
+
+        self.size: int = size
+        # Error of the linear interpolation is bounded by h^2 / 8 * max|sin''| for the step h of the table
+        self.max_error: float = (2 * np.pi / size) ** 2 / 8
+
+        table = np.sin(2 * np.pi * np.arange(size + 1) / size)
+        table[[0, size // 2, size]] = 0  # Zeros of the wave are exact
+        self._tables = {}
+        for dtype in (np.float64, np.float32):
+            values = table[:-1].astype(dtype)
+            slopes = np.diff(table).astype(dtype)
+            values.setflags(write=False)
+            slopes.setflags(write=False)
+            self._tables[np.dtype(dtype)] = values, slopes
+
+    def sine(self, cycles: np.ndarray, dtype=np.float64) -> np.ndarray:
+        """Calculates sin(2*pi*cycles)
+
+        Parameters
+        ----------
+        cycles : np.ndarray
+            phase of the wave [in cycles], double precision
+        dtype
+            type of the result, float64 or float32
+
+        Returns
+        -------
+        signal : np.ndarray
+            sine of the phase
+        """
+
+        return self._interpolate(np.asarray(cycles), 0, dtype)
+
+    def cosine(self, cycles: np.ndarray, dtype=np.float64) -> np.ndarray:
+        """Calculates cos(2*pi*cycles), see sine"""
+
+        return self._interpolate(np.asarray(cycles), self.size // 4, dtype)
+
+    def _interpolate(self, cycles: np.ndarray, offset: int, dtype) -> np.ndarray:
+        """Interpolates the table at the phase shifted by the offset [in samples of the table]
+
+        The phase is processed in blocks fitting in the cache, with the intermediate arrays reused between
+        the blocks, so only the result is allocated.
+        """
+
+        values, slopes = self._tables[np.dtype(dtype)]
+        result = np.empty(cycles.shape, dtype=dtype)
+        flat_cycles, flat_result = cycles.reshape(-1), result.reshape(-1)
+
+        block = max(min(BLOCK_SIZE, flat_cycles.size), 1)
+        position, whole = np.empty(block), np.empty(block)
+        index = np.empty(block, dtype=np.intp)
+        slope, fraction = np.empty(block, dtype=dtype), np.empty(block, dtype=dtype)
+        for beg_idx in range(0, flat_cycles.size, block):
+            end_idx = min(beg_idx + block, flat_cycles.size)
+            size = end_idx - beg_idx
+            position_b, whole_b, index_b = position[:size], whole[:size], index[:size]
+            slope_b, fraction_b, result_b = slope[:size], fraction[:size], flat_result[beg_idx:end_idx]
+
+            np.multiply(flat_cycles[beg_idx:end_idx], self.size, out=position_b)
+            if offset:
+                position_b += offset
+            np.floor(position_b, out=whole_b)
+            position_b -= whole_b
+            index_b[...] = whole_b
+            index_b &= self.size - 1
+
+            values.take(index_b, out=result_b)
+            slopes.take(index_b, out=slope_b)
+            np.multiply(position_b, slope_b, out=fraction_b, casting='same_kind')
+            result_b += fraction_b
+        return result
+
+
+@lru_cache(maxsize=None)
+def _wavetable(size: int) -> Wavetable:
+    return Wavetable(size)
+
+
+def wavetable(max_error=None) -> Wavetable:
+    """Function returning the shared wavetable of the given accuracy
+
+    Parameters
+    ----------
+    max_error
+        maximum absolute error of the synthesized wave, None means default_max_error
+
+    Returns
+    -------
+    table : Wavetable
+        the smallest wavetable meeting the accuracy, shared within the process
+
+    Raises
+    ------
+    ValueError
+        If the error is not positive
+    """
+
+    max_error = default_max_error if max_error is None else max_error
+    if max_error <= 0:
+        raise ValueError('Maximum error of the oscillator has to be positive')
+    size = int(2 ** max(2, np.ceil(np.log2(2 * np.pi / np.sqrt(8 * max_error)))))
+    return _wavetable(size)
+
+
+def set_default_max_error(max_error) -> NoReturn:
+    """Function setting the accuracy of the synthesized sine waves
+
+    Glyphs rendered with the previous accuracy are removed from the glyph cache and the kept time axes are
+    released.
+
+    Parameters
+    ----------
+    max_error
+        maximum absolute error of the synthesized waves
+
+    Raises
+    ------
+    ValueError
+        If the error is not positive
+    """
+
+    global default_max_error
+
+    wavetable(max_error)
+    default_max_error = max_error
+    glyph_cache.clear()
+    clear_time_axes()
+
+
+def time_axis(size: int, sampling_rate) -> np.ndarray:
+    """Function returning the time axis of the given length
+
+    Axes are prefixes of a single read-only axis per sampling rate, so strokes share them instead of building
+    their own. The axes of at most MAX_TIME_AXES sampling rates, each of at most MAX_TIME_AXIS_SIZE samples, are
+    kept, so a long-running process does not grow with the sampling rates and the lengths it has seen. The
+    values are the same as np.arange(size) / sampling_rate.
+
+    Parameters
+    ----------
+    size : int
+        number of samples
+    sampling_rate
+        self-explanatory
+
+    Returns
+    -------
+    t : np.ndarray
+        read-only times of the samples [in seconds]
+    """
+
+    if size > MAX_TIME_AXIS_SIZE:
+        axis = np.arange(size) / sampling_rate
+        axis.setflags(write=False)
+        return axis
+
+    with _time_axes_lock:
+        axis = _time_axes.get(sampling_rate)
+        if axis is None or axis.size < size:
+            # Growing geometrically, so a sequence of longer strokes does not rebuild the axis every time
+            length = min(max(size, 2 * axis.size if axis is not None else 0), MAX_TIME_AXIS_SIZE)
+            axis = np.arange(length) / sampling_rate
+            axis.setflags(write=False)
+            _time_axes[sampling_rate] = axis
+        _time_axes.move_to_end(sampling_rate)
+        while len(_time_axes) > MAX_TIME_AXES:
+            _time_axes.popitem(last=False)
+    return axis[:size]
+
+
+def clear_time_axes() -> NoReturn:
+    """Function releasing the kept time axes, the strokes rendered so far keep their own references"""
+
+    with _time_axes_lock:
+        _time_axes.clear()
@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Iterable, Iterator, NoReturn, Optional
+
+# Number of threads used when the caller does not specify it, 1 means serial rendering
+default_workers: int = 1
+
+# Number of the items submitted ahead of the consumed results per thread, enough to keep the threads busy while
+# the results are reduced, and bounding the memory to the results of the window instead of all of the items
+WINDOW_PER_WORKER = 2
+
+_executors = {}
+_executors_lock = Lock()
+
+
+def set_default_workers(workers: int) -> NoReturn:
+    """Function setting the number of threads used for rendering by default
+
+    Parameters
+    ----------
+    workers : int
+        number of threads, 1 means serial rendering
+
+    Raises
+    ------
+    ValueError
+        If the number of threads is not positive
+    """
+
+    global default_workers
+
+    if workers < 1:
+        raise ValueError('Number of rendering threads has to be positive')
+    default_workers = workers
+
+
+def map_in_order(function: Callable, items: Iterable, workers: Optional[int] = None) -> Iterator:
+    """Function applying the function to the items on the pool of threads
+
+    Rendering is NumPy work which releases the GIL, so independent strokes and letters are rendered in
+    parallel. Results are yielded in the order of the items, so reducing them gives the same result as the
+    serial rendering. Only WINDOW_PER_WORKER items per thread are submitted ahead of the consumed results, and
+    the first of them is yielded as soon as it is ready, so the results of the whole input are never held at once.
+
+    Parameters
+    ----------
+    function : Callable
+        function applied to each item
+    items : Iterable
+        items to process
+    workers : Optional[int]
+        number of threads, None means default_workers and 1 means serial processing in the calling thread
+
+    Returns
+    -------
+    results : Iterator
+        results of the function in the order of the items
+    """
+
+    workers = default_workers if workers is None else workers
+    if workers <= 1:
+        return map(function, items)
+    return _map_window(_executor(workers), function, items, WINDOW_PER_WORKER * workers)
+
+
+def _map_window(executor: Executor, function: Callable, items: Iterable, window: int) -> Iterator:
+    """Generator yielding the results of the items in order, with at most window of them submitted at once"""
+
+    futures = deque()
+    try:
+        for item in items:
+            if len(futures) >= window:
+                yield futures.popleft().result()
+            futures.append(executor.submit(function, item))
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        # The consumer stopped early or a function raised, the items which have not started are not needed
+        for future in futures:
+            future.cancel()
+
+
+def _executor(workers: int) -> ThreadPoolExecutor:
+    """Function returning the pool of threads of the given size, pools are shared within the process"""
+
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render')
+        return _executors[workers]
@@ -0,0 +1,185 @@
+import os
+import json
+from typing import NoReturn, Optional
+import numpy as np
+
+from letters.atlas import STROKE_KINDS
+from letters.oscillator import time_axis
+from letters.parallel import map_in_order
+from letters.shape import VERTICAL_DENSITY, Shape, Curve, HorizontalLine, VerticalLine
+
+PLAN_DTYPE = np.dtype([('letter', 'i4'),
+                       ('kind', 'u1'),
+                       ('beg_idx', 'i8'),
+                       ('size', 'i8'),
+                       ('width', 'f8'),
+                       ('start_f', 'f8'),
+                       ('height', 'f8'),
+                       ('descending', '?'),
+                       ('round', 'U1'),
+                       ('level', 'f8')])
+
+
+class RenderPlan:
+    """A class which represents the layout of the text as a list of the strokes to be synthesized
+
+    The plan holds no samples. Each stroke is described by its position in the signal in samples, its
+    frequencies and the level it is scaled to, so the plan can be inspected, saved, loaded and rendered
+    later - by render_plan, which allocates the samples of a stroke only while the stroke is synthesized.
+
+    Attributes
+    ----------
+    strokes : np.ndarray
+        structured array of the stroke descriptors (PLAN_DTYPE) in the order of rendering; beg_idx is the index
+        of the first sample of the stroke in the signal, size is the number of its samples which are mixed
+        (the stroke is synthesized over its whole width), letter is the position of its character in the text
+    text : str
+        the text the plan was laid out from
+    sampling_rate
+        self-explanatory
+    start_idx : int
+        index of the sample of the signal the figure of the text starts at
+    size : int
+        number of samples of the figure of the text
+    dtype : np.dtype
+        type of the samples of the rendered figure
+
+    Methods
+    -------
+    save(path: str)
+        Saves the plan as .npz file
+    load(path: str)
+        Loads the plan from .npz file
+    """
+
+    def __init__(self, strokes: np.ndarray, text: str, sampling_rate, start_idx: int, size: int, dtype=np.float64):
+        """
+        Parameters
+        ----------
+        strokes : np.ndarray
+            structured array of the stroke descriptors (PLAN_DTYPE)
+        text : str
+            the text the plan was laid out from
+        sampling_rate
+            self-explanatory
+        start_idx : int
+            index of the sample of the signal the figure of the text starts at
+        size : int
+            number of samples of the figure of the text
+        dtype
+            type of the samples of the rendered figure
+        """
+
+        self.strokes: np.ndarray = strokes
+        self.text: str = text
+        self.sampling_rate = sampling_rate
+        self.start_idx: int = start_idx
+        self.size: int = size
+        self.dtype: np.dtype = np.dtype(dtype)
+
+    def __len__(self):
+        return len(self.strokes)
+
+    def save(self, path: str) -> NoReturn:
+        """Saves the plan as .npz file
+
+        Parameters
+        ----------
+        path : str
+            path of the .npz file
+        """
+
+        header = {'text': self.text, 'sampling_rate': self.sampling_rate, 'start_idx': self.start_idx,
+                  'size': self.size, 'dtype': self.dtype.str}
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as stream:
+            np.savez(stream, strokes=self.strokes, header=np.array(json.dumps(header)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads the plan from .npz file
+
+        Parameters
+        ----------
+        path : str
+            path of the .npz file
+
+        Returns
+        -------
+        plan : RenderPlan
+            loaded plan
+        """
+
+        with np.load(path) as archive:
+            header = json.loads(str(archive['header']))
+            return cls(archive['strokes'], header['text'], header['sampling_rate'], header['start_idx'],
+                       header['size'], header['dtype'])
+
+
+def render_plan(plan: RenderPlan, out: Optional[np.ndarray] = None, workers: Optional[int] = None) -> np.ndarray:
+    """Function rendering the plan into the figure of the text
+
+    Strokes are synthesized and scaled the same way as the shapes of the text and added into the figure in the order of
+    the plan, so the figure is the same as the one rendered by Text.create_shape. Strokes are submitted to the threads
+    in a bounded window (letters.parallel.WINDOW_PER_WORKER strokes per thread) and each of them is added as soon as it
+    and the strokes before it are ready, so only the samples of the strokes of the window are allocated besides the
+    figure.
+
+    Parameters
+    ----------
+    plan : RenderPlan
+        plan of the text
+    out : Optional[np.ndarray]
+        figure of the size of the plan the strokes are added into, zeros by default
+    workers : Optional[int]
+        number of threads synthesizing the strokes, None means the default of the letters.parallel module
+
+    Returns
+    -------
+    figure : np.ndarray
+        rendered figure of the text, the index 0 is the sample start_idx of the signal
+    """
+
+    if out is None:
+        out = np.zeros(plan.size, dtype=plan.dtype)
+
+    def synthesize(stroke: np.void) -> np.ndarray:
+        return synthesize_stroke(stroke, plan.sampling_rate, plan.dtype)
+
+    for stroke, figure in zip(plan.strokes, map_in_order(synthesize, plan.strokes, workers)):
+        beg_idx = int(stroke['beg_idx']) - plan.start_idx
+        out[beg_idx:beg_idx + int(stroke['size'])] += figure[:int(stroke['size'])]
+    return out
+
+
+def synthesize_stroke(stroke: np.void, sampling_rate, dtype=np.float64) -> np.ndarray:
+    """Function synthesizing a single stroke of the plan scaled to its level
+
+    Parameters
+    ----------
+    stroke : np.void
+        stroke descriptor (PLAN_DTYPE)
+    sampling_rate
+        self-explanatory
+    dtype
+        type of the samples
+
+    Returns
+    -------
+    figure : np.ndarray
+        samples of the whole width of the stroke
+    """
+
+    width, start_f, height = float(stroke['width']), float(stroke['start_f']), float(stroke['height'])
+    t = time_axis(int(np.ceil(width * sampling_rate)), sampling_rate)
+
+    # The same synthesis and scaling as the ones of the shapes
+    kind = STROKE_KINDS[stroke['kind']]
+    if kind == 'Curve':
+        figure = Curve.synthesize(t, start_f, width, height, bool(stroke['descending']), str(stroke['round']), dtype)
+    elif kind == 'Horizontal':
+        figure = HorizontalLine.synthesize(t, start_f, dtype)
+    else:
+        figure = VerticalLine.synthesize(t, start_f, height, VERTICAL_DENSITY, dtype)
+    return Shape.scale_to_level(figure, float(stroke['level']))
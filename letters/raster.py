@@ -0,0 +1,93 @@
+from typing import Tuple
+import numpy as np
+
+from letters.atlas import STROKE_KINDS
+from letters.shape import Curve
+
+
+def stroke_path(stroke: np.void, width, height, start_f, density: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """Function sampling the path a stroke draws on the spectrogram
+
+    Parameters
+    ----------
+    stroke : np.void
+        stroke descriptor from the glyph atlas
+    width
+        width of the letter [in seconds]
+    height
+        height of the letter [in Hz]
+    start_f
+        bottom border of the letter [in Hz]
+    density : int
+        number of points sampled along each dimension of the stroke
+
+    Returns
+    -------
+    t : np.ndarray
+        times of the points relative to the beginning of the letter [in seconds]
+    f : np.ndarray
+        frequencies of the points [in Hz]
+    """
+
+    kind = STROKE_KINDS[stroke['kind']]
+    t0 = width * stroke['t']
+    t1 = width * stroke['width']
+    f0 = start_f + height * stroke['f']
+    f1 = f0 + height * stroke['height']
+    t = np.linspace(0, t1, density)
+
+    if kind == 'Vertical':
+        # Vertical strokes are narrow, a few points along the time axis are enough
+        t, f = np.meshgrid(np.linspace(0, t1, 8), np.linspace(f0, f1, density))
+        return t0 + t.ravel(), f.ravel()
+    if kind == 'Horizontal':
+        return t0 + t, np.full(density, f0)
+
+    if stroke['descending']:
+        f0, f1 = f1, f0
+    method = Curve.chirp_method(bool(stroke['descending']), str(stroke['round']))
+    if not t1:
+        f = np.linspace(f0, f1, density)
+        return np.full(density, t0), f
+    if method == 'quadratic':
+        f = f0 + (f1 - f0) * (t / t1) ** 2
+    elif method == 'logarithmic':
+        f = f0 * (f1 / f0) ** (t / t1)
+    elif method == 'hyperbolic':
+        f = f0 * f1 * t1 / ((f0 - f1) * t + f1 * t1)
+    else:
+        f = f0 + (f1 - f0) * t / t1
+    return t0 + t, f
+
+
+def rasterize_glyph(strokes: np.ndarray, width, height, start_f, t_edges: np.ndarray,
+                    f_edges: np.ndarray) -> np.ndarray:
+    """Function drawing the strokes of a glyph on the time-frequency grid
+
+    Parameters
+    ----------
+    strokes : np.ndarray
+        stroke descriptors of the glyph from the glyph atlas
+    width
+        width of the letter [in seconds]
+    height
+        height of the letter [in Hz]
+    start_f
+        bottom border of the letter [in Hz]
+    t_edges : np.ndarray
+        edges of the time cells relative to the beginning of the letter [in seconds]
+    f_edges : np.ndarray
+        edges of the frequency cells [in Hz]
+
+    Returns
+    -------
+    mask : np.ndarray
+        (frequency cells, time cells) array equal to 1 in the cells crossed by any stroke and 0 elsewhere
+    """
+
+    mask = np.zeros((len(f_edges) - 1, len(t_edges) - 1))
+    for stroke in strokes:
+        t, f = stroke_path(stroke, width, height, start_f)
+        counts, _, _ = np.histogram2d(f, t, bins=[f_edges, t_edges])
+        mask[counts > 0] = 1
+    return mask
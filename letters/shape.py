@@ -1,7 +1,18 @@
-from typing import NoReturn
-from operator import add
+from typing import NoReturn, Optional
 import numpy as np
-from scipy.signal import chirp
+
+from letters.accumulator import RenderAccumulator
+from letters.oscillator import time_axis
+from letters.synthesis import band_noise, chirp, tone
+
+# Amplitude scaling modes: the strokes match the mean amplitude of the whole signal or of the audio around them
+SCALINGS = ('global', 'local')
+
+# Time around the stroke the local level is measured in [in seconds]
+LOCAL_CONTEXT: float = 0.5
+
+# Number of sine waves spread over the height of the vertical lines
+VERTICAL_DENSITY: int = 50
 
 
 class Shape:
@@ -21,15 +32,32 @@ class Shape:
         a floating point number representing the width of the figure [in seconds]
     height
         a floating point number representing the height of the figure [in Hz]
-    _figure : np.ndarray
-        numpy array representing signal alteration which creates shapes in time and frequency domain
+    reference_level
+        mean absolute amplitude the figure is scaled to, if None it is calculated from the template
+    reference_loudness
+        loudness index the local levels are taken from, if None the one of the template
+    scaling : str
+        amplitude scaling mode, one of SCALINGS
+    dtype : np.dtype
+        type of the samples of the figure, taken from the dtype policy of the template
+    _figure : Optional[np.ndarray]
+        numpy array representing signal alteration which creates shapes in time and frequency domain, allocated
+        on the first access
 
     Methods
     -------
+    release_figure()
+        Drops the samples of the figure
+    scale_to_level(figure: np.ndarray, level)
+        Returns the figure scaled to the given mean absolute amplitude
     _combine_figures(fig: np.ndarray, start_t)
         Merges the base figure with the new one
     _scale_figure()
         Scales the amplitude of the alteration of the signal to make it dimmer at the spectrogram
+    _reference_level()
+        Returns mean absolute amplitude the figure is scaled to
+    _local_level(start_t, width)
+        Returns mean absolute amplitude of the template around the given time range
     _calculate_t_axis()
         Calculates an array of time change based on the sampling rate
     """
@@ -65,11 +93,15 @@ class Shape:
         self.start_point_t = start_t  # In sec
         self.start_point_f = start_f  # In Hz
         self.template = sound
-        self._figure: np.ndarray = np.zeros(int(np.ceil(width * sound.sampling_rate)))
+        self.reference_level = None
+        self.reference_loudness = None
+        self.scaling: str = 'global'
+        self.dtype: np.dtype = np.dtype(sound.dtype)
+        self._figure: Optional[np.ndarray] = None
 
-        if np.ceil(self.template.sampling_rate * (self.start_point_t + self.width)) > len(self.template.data):
+        if np.ceil(self.template.sampling_rate * (self.start_point_t + self.width)) > len(self.template):
             raise ValueError(f'Cannot create a symbol of given width at given starting point\n'
-                             f'Length of the file: {self.template.sampling_rate * len(self.template.data)} [s]')
+                             f'Length of the file: {self.template.sampling_rate * len(self.template)} [s]')
         assert self.width >= 0, 'Width of the shape has to be positive'
 
         if np.ceil(self.start_point_f + self.height) > self.template.sampling_rate / 2:
@@ -79,8 +111,24 @@ class Shape:
 
     @property
     def figure(self):
+        """Samples of the figure
+
+        Shapes which are rendered into the buffers of their parents or replace the figure with the synthesized
+        one never need the zeros, so the figure is allocated on the first access only.
+        """
+
+        if self._figure is None:
+            self._figure = np.zeros(self.size, dtype=self.dtype)
         return self._figure
 
+    @property
+    def size(self) -> int:
+        """Number of samples of the figure, known without allocating it"""
+
+        if self._figure is None:
+            return int(np.ceil(self.width * self.template.sampling_rate))
+        return self._figure.size
+
     @figure.setter
     def figure(self, new_fig: np.ndarray):
         if new_fig.ndim > 1:
@@ -91,9 +139,17 @@ class Shape:
     def create_shape(self) -> NoReturn:
         raise NotImplementedError
 
+    def release_figure(self) -> NoReturn:
+        """Drops the samples of the figure, e.g. after they have been added into the parent figure"""
+
+        self._figure = None
+
     def _combine_figures(self, fig: np.ndarray, start_t) -> NoReturn:
         """Combining base figure with the given one at the given starting point
 
+        The given figure is added in place into the window of the base figure, samples exceeding the end of
+        the base figure are dropped.
+
         Parameters
         ----------
         fig : np.ndarray
@@ -109,65 +165,90 @@ class Shape:
             When the beginning of the given figure is before the beginning of the base figure
         """
 
-        if fig.size > self.figure.size:
-            raise ValueError(f'Combined figure size cannot be bigger than the size of the base figure')
-        else:
-            precision = 1.e-9
+        accumulator = RenderAccumulator(self.figure, self.template.sampling_rate, self.start_point_t)
+        accumulator.add(fig, start_t)
 
-            # Calculating the beginning index
-            if start_t < self.start_point_t:
-                raise ValueError('Beginning time of the shape cannot be less than starting point of the base')
-            beg_len = int(np.floor((start_t - self.start_point_t) * self.template.sampling_rate))
+    def _scale_figure(self) -> NoReturn:
+        """Scaling figure
 
-            # Calculating the ending index
-            if self.figure.size - (beg_len + fig.size) < precision:
-                end_len = int(abs(np.floor(self.figure.size - (beg_len + fig.size))))
-            else:
-                end_len = int(np.floor(self.figure.size - (beg_len + fig.size)))
+        Scales the amplitude of the alteration of the signal to make it dimmer at the spectrogram
+        """
 
-            # Creating complement arrays
-            beg_array = np.zeros(beg_len)
-            end_array = np.zeros(end_len)
+        self.figure = self.scale_to_level(self.figure, self._reference_level())
 
-            if not beg_len and end_len:
-                # There is no beginning complement required
-                fig = np.append(fig, end_array)
+    @staticmethod
+    def scale_to_level(figure: np.ndarray, level) -> np.ndarray:
+        """Returns the figure scaled to the given mean absolute amplitude
 
-            elif beg_len and not end_len:
-                # There is no end complement required
-                fig = np.append(beg_array, fig)
+        The strokes of the shapes and the ones of letters.plan.render_plan are scaled by it, so both of them
+        render the same samples.
 
-            elif beg_len and end_len:
-                # There is a beginning and an end complement required
-                fig = np.append(beg_array, fig)
-                fig = np.append(fig, end_array)
+        Parameters
+        ----------
+        figure : np.ndarray
+            synthesized figure, a silent one is not scaled
+        level
+            mean absolute amplitude of the result
+
+        Returns
+        -------
+        figure : np.ndarray
+            scaled figure of the same type
+        """
 
-            else:
-                # print('Figure combination: Complement is not required')
-                pass
+        scale = 1  # Not scaling at all
+        divisor = np.mean(np.abs(figure))
+        if divisor:
+            scale = level / divisor
+        return figure * figure.dtype.type(scale)
 
-            self.figure = np.array(list(map(add, self.figure, fig)))
+    def _reference_level(self):
+        """Returns mean absolute amplitude the figure is scaled to
 
-    def _scale_figure(self) -> NoReturn:
-        """Scaling figure
+        Parents pin the level on their children, so the template is scanned once per parent instead of once
+        per stroke. In the local scaling mode the level is the one of the audio around the figure.
+        """
 
-        Scales the amplitude of the alteration of the signal to make it dimmer at the spectrogram
+        if self.reference_level is None:
+            if self.scaling == 'local':
+                return self._local_level(self.start_point_t, self.width)
+            return self.template.mean_amplitude()
+        return self.reference_level
+
+    def _local_level(self, start_t, width):
+        """Returns mean absolute amplitude of the template around the given time range
+
+        The range is extended by LOCAL_CONTEXT on both sides and the level is read from the loudness index,
+        so no samples are scanned.
+
+        Parameters
+        ----------
+        start_t
+            beginning of the range [in seconds]
+        width
+            width of the range [in seconds]
+
+        Returns
+        -------
+        level
+            mean absolute amplitude of the extended range
         """
 
-        scale = 1  # Not scaling at all
-        divisor = np.mean(np.abs(self.figure))
-        if divisor:
-            scale = np.mean(np.abs(self.template.data)) / divisor
-        self.figure = self.figure * scale
+        index = self.template.loudness() if self.reference_loudness is None else self.reference_loudness
+        fs = self.template.sampling_rate
+        beg_idx = int(np.floor((start_t - LOCAL_CONTEXT) * fs))
+        end_idx = int(np.ceil((start_t + width + LOCAL_CONTEXT) * fs))
+        return index.mean_amplitude(beg_idx, end_idx)
 
     def _calculate_t_axis(self):
         """Calculating time array
 
-        Calculates an array of time change based on the sampling rate
+        Calculates an array of time change based on the sampling rate. The array is a read-only view of the
+        time axis shared by all of the shapes.
         """
 
         fs = self.template.sampling_rate
-        t = np.arange(0, self.width * fs, 1) / fs
+        t = time_axis(int(np.ceil(self.width * fs)), fs)
         return t
 
 
@@ -188,6 +269,10 @@ class Curve(Shape):
     -------
     create_shape()
         changes figure from the zero array to the array with created signal
+    chirp_method(descending: bool, rnd: str)
+        Returns the method of the chirp drawing the curve of given type
+    synthesize(t: np.ndarray, start_f, width, height, descending: bool, rnd: str, dtype)
+        Returns the unscaled chirp drawing the curve
     """
 
     def __init__(self, sound, start_t, start_f, width, height, desc: bool = False, rnd: str = 'l'):
@@ -215,47 +300,98 @@ class Curve(Shape):
         self.round = rnd
         self.id_name = 'Curve'
 
+    @staticmethod
+    def chirp_method(descending: bool, rnd: str) -> str:
+        """Returns the method of the chirp drawing the curve of given type
+
+        Parameters
+        ----------
+        descending : bool
+            a bool representing a logical value of the fact of the descent of the line
+        rnd : str
+            a str representing a type of roundness
+
+        Returns
+        -------
+        method : str
+            method of the scipy.signal.chirp function
+        """
+
+        if rnd == 't' and descending:
+            return 'quadratic'
+        elif rnd == 't' and not descending:
+            return 'logarithmic'
+        elif rnd == 'b':
+            return 'hyperbolic'
+        else:
+            return 'linear'
+
     def create_shape(self) -> NoReturn:
         """Creates shape
 
         Changes figure from the zero array to the array with created signal - chirp signal.
         """
 
-        t = self._calculate_t_axis()
+        self.figure = self.synthesize(self._calculate_t_axis(), self.start_point_f, self.width, self.height,
+                                      self.descending, self.round, self.dtype)
+        self._scale_figure()
+
+    @staticmethod
+    def synthesize(t: np.ndarray, start_f, width, height, descending: bool, rnd: str, dtype=np.float64) -> np.ndarray:
+        """Returns the unscaled chirp drawing the curve
+
+        Parameters
+        ----------
+        t : np.ndarray
+            time axis of the curve [in seconds]
+        start_f
+            bottom border of the curve [in Hz]
+        width
+            width of the curve [in seconds]
+        height
+            height of the curve [in Hz]
+        descending : bool
+            a bool representing a logical value of the fact of the descent of the line
+        rnd : str
+            a str representing a type of roundness
+        dtype
+            type of the samples
+
+        Returns
+        -------
+        figure : np.ndarray
+            chirp signal
+        """
 
-        f0 = self.start_point_f
-        f1 = self.start_point_f + self.height
-        t1 = self.width
+        f0 = start_f
+        f1 = start_f + height
+        t1 = width
 
-        if self.descending:
+        if descending:
             f0 = f1
-            f1 = self.start_point_f
-
-        # Choosing type of curve
-        if self.round == 't' and self.descending:
-            method = 'quadratic'
-        elif self.round == 't' and not self.descending:
-            method = 'logarithmic'
-        elif self.round == 'b':
-            method = 'hyperbolic'
-        else:
-            method = 'linear'
+            f1 = start_f
 
         # Creating chirp signal
-        self.figure = chirp(t, f0, t1, f1, method=method)
-        self._scale_figure()
+        return chirp(t, f0, t1, f1, method=Curve.chirp_method(descending, rnd), dtype=dtype)
 
 
 class VerticalLine(Shape):
     """A class which is vertical line
 
+    Attributes
+    ----------
+    density : int
+        number of sine waves spread over the height of the line
+
     Methods
     -------
     create_shape()
         changes figure from the zero array to the array with created signal
+    synthesize(t: np.ndarray, start_f, height, density: int, dtype)
+        Returns the unscaled band of sine waves drawing the line
     """
 
-    def __init__(self, sound, start_t, start_f, width, height):
+    def __init__(self, sound, start_t, start_f, width, height, density: int = VERTICAL_DENSITY):
         """
         Parameters
         ----------
@@ -269,9 +405,12 @@ class VerticalLine(Shape):
             a floating point number representing the width of the figure [in seconds]
         height
             a floating point number representing the height of the figure [in Hz]
+        density : int
+            number of sine waves spread over the height of the line (experimental value by default)
         """
 
         super().__init__(sound, start_t, start_f, width, height)
+        self.density = density
         self.id_name = 'Vline'
 
     def create_shape(self) -> NoReturn:
@@ -280,21 +419,35 @@ class VerticalLine(Shape):
         Changes figure from the zero array to the array with created signal - sine waves with range of frequencies.
         """
 
-        t = self._calculate_t_axis()
+        self.figure = self.synthesize(self._calculate_t_axis(), self.start_point_f, self.height, self.density,
+                                      self.dtype)
+        self._scale_figure()
 
-        # Calculating ending points
-        f0 = self.start_point_f
-        f1 = self.start_point_f + self.height
+    @staticmethod
+    def synthesize(t: np.ndarray, start_f, height, density: int = VERTICAL_DENSITY, dtype=np.float64) -> np.ndarray:
+        """Returns the unscaled band of sine waves drawing the line
 
-        # Creating noise signal
-        spread = 50  # Experimental value
-        noise_signal = np.zeros(t.size)
-        frequency_range = np.arange(f0, f1, self.height/spread)
-        for f in frequency_range:
-            noise_signal = np.array(list(map(add, noise_signal, np.sin(2 * np.pi * f * t))))
+        Parameters
+        ----------
+        t : np.ndarray
+            time axis of the line [in seconds]
+        start_f
+            bottom border of the line [in Hz]
+        height
+            height of the line [in Hz]
+        density : int
+            number of sine waves spread over the height of the line
+        dtype
+            type of the samples
+
+        Returns
+        -------
+        figure : np.ndarray
+            noise signal
+        """
 
-        self.figure = noise_signal
-        self._scale_figure()
+        # Creating noise signal
+        return band_noise(t, start_f, height, density, dtype=dtype)
 
 
 class HorizontalLine(Shape):
@@ -304,6 +457,8 @@ class HorizontalLine(Shape):
     -------
     create_shape()
         changes figure from the zero array to the array with created signal
+    synthesize(t: np.ndarray, start_f, dtype)
+        Returns the unscaled sine wave drawing the line
     """
 
     def __init__(self, sound, start_t, start_f, width, height):
@@ -331,8 +486,26 @@ class HorizontalLine(Shape):
          Changes figure from the zero array to the array with created signal - single sine wave.
         """
 
-        t = self._calculate_t_axis()
-        f0 = self.start_point_f
-
-        self.figure = np.sin(2 * np.pi * f0 * t)
+        self.figure = self.synthesize(self._calculate_t_axis(), self.start_point_f, self.dtype)
         self._scale_figure()
+
+    @staticmethod
+    def synthesize(t: np.ndarray, start_f, dtype=np.float64) -> np.ndarray:
+        """Returns the unscaled sine wave drawing the line
+
+        Parameters
+        ----------
+        t : np.ndarray
+            time axis of the line [in seconds]
+        start_f
+            frequency of the line [in Hz]
+        dtype
+            type of the samples
+
+        Returns
+        -------
+        figure : np.ndarray
+            single sine wave
+        """
+
+        return tone(t, start_f, dtype=dtype)
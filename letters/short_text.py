@@ -1,7 +1,14 @@
-from typing import List, NoReturn
+from typing import List, NoReturn, Optional, Tuple
+import numpy as np
 
-from letters.shape import Shape
+from letters.accumulator import RenderAccumulator
+from letters.shape import SCALINGS, Shape
 from letters.letter import Letter
+from letters.parallel import map_in_order
+from letters.plan import PLAN_DTYPE, RenderPlan
+
+# Maximum density of the letters [per second of the width of the text]
+MAX_LETTERS_PER_SECOND: int = 6
 
 
 class Text(Shape):
@@ -17,16 +24,26 @@ class Text(Shape):
         constant value representing how much space will be taken from the space reserved for the letter [in percent]
     whole_text : str
         a string to be created on the sound file
+    _slots : List[Optional[Letter]]
+        letters of the characters of the text, None for the spaces
+    _level
+        mean absolute amplitude of the strokes of the last render, None before the first one
+    _loudness
+        loudness index the local levels of the last render are taken from
 
     Methods
     -------
-    create_shape()
+    create_shape(workers: Optional[int])
         Recalculates the letter position and creates a letter
+    update_text(text: str, workers: Optional[int])
+        Changes the text and re-renders only the changed letters
+    plan()
+        Lays out the strokes of the text without rendering them
     _recalculate_position(shape: Shape)
         Recalculates the position of the letter based on the relative position in the text
     """
 
-    def __init__(self, sound, start_t, start_f, width, height, text: str):
+    def __init__(self, sound, start_t, start_f, width, height, text: str, scaling: str = 'global'):
         """
         Parameters
         ----------
@@ -42,6 +59,9 @@ class Text(Shape):
             a floating point number representing the height of the text [in Hz]
         text : str
             a string representing a text to create
+        scaling : str
+            amplitude scaling mode, one of letters.shape.SCALINGS: 'global' matches the strokes to the mean
+            amplitude of the whole signal, 'local' to the audio around each stroke
 
         Raises
         ------
@@ -49,38 +69,212 @@ class Text(Shape):
             Letters are very densely packed - according to the max_number_of_letters value
         ValueError
             Given string is empty
+        ValueError
+            Given scaling mode is unknown
         """
 
         super().__init__(sound, start_t, start_f, width, height)
 
         self.space_usage = 80/100
-        self.max_number_of_letters: int = 6
+        self.max_number_of_letters: int = MAX_LETTERS_PER_SECOND
         self.all_letters: List[Letter] = []
         self.whole_text: str = text
+        self.scaling: str = scaling
+        self._slots: List[Optional[Letter]] = []
+        self._level = None
+        self._loudness = None
 
-        number_of_letters = len(self.whole_text)
-        if number_of_letters / width > self.max_number_of_letters:
+        if scaling not in SCALINGS:
+            raise ValueError(f'Unknown scaling mode: {scaling}. Available: {", ".join(SCALINGS)}')
+        self._create_letters(text)
+
+    def _create_letters(self, text: str) -> NoReturn:
+        """Creates the letters of all of the characters of the text
+
+        Raises
+        ------
+        ValueError
+            Letters are very densely packed - according to the max_number_of_letters value
+        ValueError
+            Given string is empty
+        """
+
+        number_of_letters = len(text)
+        if number_of_letters / self.width > self.max_number_of_letters:
             raise ValueError('Letters cannot be as densely packed')
-        if number_of_letters:
-            for i, sym in enumerate(text):
-                if sym != ' ':
-                    local_width_k = i / number_of_letters
-                    self.all_letters.append(Letter(self.template,
-                                                   local_width_k * self.width,
-                                                   0,
-                                                   self.width * self.space_usage / number_of_letters,
-                                                   self.height,
-                                                   sym))
-        else:
+        if not number_of_letters:
             raise ValueError('Cannot show empty string')
 
-    def create_shape(self) -> NoReturn:
-        """Recalculates position, creates a letter, combines new letter with whole text"""
+        self._slots = [self._create_letter(text, i) for i in range(number_of_letters)]
+        self.all_letters = [letter for letter in self._slots if letter is not None]
+
+    def _create_letter(self, text: str, slot: int) -> Optional[Letter]:
+        """Creates the letter of the character of the text at the given position, None for the space"""
+
+        if text[slot] == ' ':
+            return None
+        local_width_k = slot / len(text)
+        letter = Letter(self.template,
+                        local_width_k * self.width,
+                        0,
+                        self.width * self.space_usage / len(text),
+                        self.height,
+                        text[slot])
+        letter.scaling = self.scaling
+        return letter
 
+    def _pin_level(self, letter: Letter) -> NoReturn:
+        """Pins the level of the text, or the loudness index in the local scaling mode, on the letter"""
+
+        letter.reference_level = self._level if self.scaling == 'global' else None
+        letter.reference_loudness = self._loudness
+
+    def create_shape(self, workers: Optional[int] = None) -> NoReturn:
+        """Recalculates position, creates a letter, combines new letter with whole text
+
+        Letters are rendered in parallel and added into their windows of the text figure in the order of the
+        text, so the result does not depend on the number of threads.
+
+        Parameters
+        ----------
+        workers : Optional[int]
+            number of threads rendering the letters, None means the default of the letters.parallel module
+        """
+
+        accumulator = RenderAccumulator(self.figure, self.template.sampling_rate, self.start_point_t)
+        self._level = self._reference_level()
+        self._loudness = self.template.loudness() if self.reference_loudness is None else self.reference_loudness
         for letter in self.all_letters:
-            letter = self._recalculate_position(letter)
-            letter.create_shape()
-            self._combine_figures(letter.figure, letter.start_point_t)
+            self._recalculate_position(letter)
+            self._pin_level(letter)
+
+        glyphs = map_in_order(_render_glyph, self.all_letters, workers)
+        for letter, glyph in zip(self.all_letters, glyphs):
+            window = accumulator.window(letter.start_point_t, letter.size)
+            letter.figure = window.buffer
+            window.add(glyph, letter.start_point_t)
+
+    def update_text(self, text: str, workers: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Changes the text and re-renders only the letters which have changed
+
+        The new text is compared with the previous one character by character. Windows of the changed
+        characters are cleared and the letters in them are added again in the order of the text, so the figure
+        is the same as the one rendered from scratch, and the cost depends on the number of the changed
+        characters only. The levels of the strokes are the ones of the previous render, so mixing the text into
+        the template does not change them. A text of a different length moves all of the letters, so the whole
+        text is rendered again.
+
+        Parameters
+        ----------
+        text : str
+            new text
+        workers : Optional[int]
+            number of threads rendering the letters, None means the default of the letters.parallel module
+
+        Returns
+        -------
+        windows : List[Tuple[int, int]]
+            sorted (beginning, end) sample indices of the parts of the figure which have changed
+
+        Raises
+        ------
+        ValueError
+            If the text has not been created yet, or the new text is empty or too densely packed
+        """
+
+        if self._level is None:
+            raise ValueError('Text has to be created before it is updated')
+        self.reference_level, self.reference_loudness = self._level, self._loudness
+
+        if len(text) != len(self.whole_text):
+            self._create_letters(text)
+            self.whole_text = text
+            self.figure[...] = 0
+            self.create_shape(workers)
+            return [(0, self.size)]
+
+        changed = [slot for slot, (old, new) in enumerate(zip(self.whole_text, text)) if old != new]
+        self.whole_text = text
+        for slot in changed:
+            letter = self._create_letter(text, slot)
+            if letter is not None:
+                self._recalculate_position(letter)
+                self._pin_level(letter)
+            self._slots[slot] = letter
+        self.all_letters = [letter for letter in self._slots if letter is not None]
+
+        # Windows of the letters touching the cleared windows are cleared as well, so every letter is added
+        # either whole or not at all
+        accumulator = RenderAccumulator(self.figure, self.template.sampling_rate, self.start_point_t)
+        slot_windows = [self._slot_window(accumulator, slot) for slot in range(len(text))]
+        windows = _merge_windows([slot_windows[slot] for slot in changed])
+        while True:
+            touching = [window for window in slot_windows
+                        if any(window[0] < end and window[1] > beg for beg, end in windows)]
+            expanded = _merge_windows(windows + touching)
+            if expanded == windows:
+                break
+            windows = expanded
+
+        for beg_idx, end_idx in windows:
+            self.figure[beg_idx:end_idx] = 0
+        letters = [letter for slot, letter in enumerate(self._slots)
+                   if letter is not None and any(beg <= slot_windows[slot][0] < end for beg, end in windows)]
+        for letter, glyph in zip(letters, map_in_order(_render_glyph, letters, workers)):
+            window = accumulator.window(letter.start_point_t, letter.size)
+            letter.figure = window.buffer
+            window.add(glyph, letter.start_point_t)
+        return windows
+
+    def plan(self) -> RenderPlan:
+        """Lays out the strokes of the text without rendering them
+
+        Letters and their strokes are created, positioned and scaled by the same code as while rendering, and
+        letters.plan.render_plan synthesizes the strokes with the same functions as the
+        shapes, so it renders the same figure as create_shape. No samples are allocated.
+
+        Returns
+        -------
+        plan : RenderPlan
+            strokes of the letters in the order of the text
+        """
+
+        sampling_rate = self.template.sampling_rate
+        level = self._reference_level() if self.scaling == 'global' else None
+        start_idx = int(np.ceil(self.start_point_t * sampling_rate))
+        # Only the offsets of the windows are calculated, no figure is allocated
+        accumulator = RenderAccumulator(np.empty(0, dtype=self.dtype), sampling_rate, self.start_point_t)
+
+        rows = []
+        for slot in range(len(self.whole_text)):
+            # Letters are laid out, positioned and scaled by the same code as the rendered ones
+            letter = self._create_letter(self.whole_text, slot)
+            if letter is None:
+                continue
+            self._recalculate_position(letter)
+            letter.reference_level = level
+            letter.reference_loudness = self.reference_loudness
+            letter_idx = accumulator.sample_offset(letter.start_point_t)
+            letter_end = min(letter_idx + letter.size, self.size)
+            strokes = zip(letter.glyph_atlas.glyph(letter.symbol), letter.all_figures, letter.stroke_offsets(),
+                          letter.stroke_levels())
+            for stroke, shape, offset, stroke_level in strokes:
+                shape = letter._recalculate_position(shape)
+                stroke_idx = letter_idx + offset
+                stroke_end = min(stroke_idx + shape.size, letter_end)
+                rows.append((slot, stroke['kind'], start_idx + stroke_idx, max(stroke_end - stroke_idx, 0),
+                             shape.width, shape.start_point_f, shape.height, stroke['descending'], stroke['round'],
+                             stroke_level))
+        return RenderPlan(np.array(rows, dtype=PLAN_DTYPE), self.whole_text, sampling_rate, start_idx, self.size,
+                          self.dtype)
+
+    def _slot_window(self, accumulator: RenderAccumulator, slot: int) -> Tuple[int, int]:
+        """Returns (beginning, end) sample indices of the window of the letter at the given position"""
+
+        number_of_letters = len(self.whole_text)
+        beg_idx = accumulator.sample_offset(self.start_point_t + slot / number_of_letters * self.width)
+        size = int(np.ceil(self.width * self.space_usage / number_of_letters * self.template.sampling_rate))
+        return beg_idx, min(beg_idx + size, self.size)
 
     def _recalculate_position(self, new_shape):
         """Recalculates position of the new shape in respect to the base figure
@@ -123,3 +317,21 @@ class Text(Shape):
             raise ValueError('Cannot create the shape: placement + width exceeds the maximum size')
 
         return new_shape
+
+
+def _merge_windows(windows: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merges overlapping (beginning, end) windows into the sorted list of the disjoint ones"""
+
+    merged = []
+    for beg_idx, end_idx in sorted(windows):
+        if merged and beg_idx <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_idx))
+        else:
+            merged.append((beg_idx, end_idx))
+    return merged
+
+
+def _render_glyph(letter: Letter):
+    """Renders the glyph of the letter, strokes are rendered serially as letters already occupy the threads"""
+
+    return letter.render_glyph(workers=1)
@@ -0,0 +1,198 @@
+import numpy as np
+
+from letters import oscillator
+
+
+def sine_cycles(cycles: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """Function calculating sin(2*pi*cycles) with the shared wavetable of the oscillator module
+
+    The phase is reduced to a single cycle in double precision before the lookup, so the precision of the
+    result does not degrade with the length of the signal in any dtype.
+
+    Parameters
+    ----------
+    cycles : np.ndarray
+        phase of the signal [in cycles], double precision
+    dtype
+        type of the result
+
+    Returns
+    -------
+    signal : np.ndarray
+        sine of the phase
+    """
+
+    return oscillator.wavetable().sine(cycles, dtype)
+
+
+def cosine_cycles(cycles: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """Function calculating cos(2*pi*cycles), see sine_cycles"""
+
+    return oscillator.wavetable().cosine(cycles, dtype)
+
+
+def tone(t: np.ndarray, f, dtype=np.float64) -> np.ndarray:
+    """Function synthesizing a sine wave
+
+    Parameters
+    ----------
+    t : np.ndarray
+        time axis [in seconds], double precision
+    f
+        frequency of the wave [in Hz]
+    dtype
+        type of the result
+
+    Returns
+    -------
+    signal : np.ndarray
+        sin(2*pi*f*t)
+    """
+
+    return sine_cycles(f * t, dtype)
+
+
+def chirp(t: np.ndarray, f0, t1, f1, method: str = 'linear', dtype=np.float64) -> np.ndarray:
+    """Function synthesizing a chirp, the same as scipy.signal.chirp
+
+    The phase is integrated with the same expressions as in scipy.signal.chirp, without importing
+    scipy.signal, and the wave is looked up in the shared wavetable (see sine_cycles).
+
+    Parameters
+    ----------
+    t : np.ndarray
+        time axis [in seconds], double precision
+    f0
+        frequency at the time 0 [in Hz]
+    t1
+        time at which f1 is specified [in seconds]
+    f1
+        frequency at the time t1 [in Hz]
+    method : str
+        'linear', 'quadratic', 'logarithmic' or 'hyperbolic'
+    dtype
+        type of the result
+
+    Returns
+    -------
+    signal : np.ndarray
+        chirp signal
+    """
+
+    cycles = chirp_phase(t, f0, t1, f1, method)
+    cycles /= 2 * np.pi
+    return cosine_cycles(cycles, dtype)
+
+
+def chirp_phase(t: np.ndarray, f0, t1, f1, method: str = 'linear') -> np.ndarray:
+    """Function integrating the frequency of the chirp, evaluated the same way as in scipy.signal.chirp
+
+    Parameters
+    ----------
+    t : np.ndarray
+        time axis [in seconds]
+    f0
+        frequency at the time 0 [in Hz]
+    t1
+        time at which f1 is specified [in seconds]
+    f1
+        frequency at the time t1 [in Hz]
+    method : str
+        'linear', 'quadratic', 'logarithmic' or 'hyperbolic'
+
+    Returns
+    -------
+    phase : np.ndarray
+        phase of the chirp [in radians]
+
+    Raises
+    ------
+    ValueError
+        If the method is unknown or the frequencies are invalid for the method
+    """
+
+    t = np.asarray(t)
+    f0, t1, f1 = float(f0), float(t1), float(f1)
+    if method == 'linear':
+        beta = (f1 - f0) / t1
+        return 2 * np.pi * (f0 * t + 0.5 * beta * t * t)
+    if method == 'quadratic':
+        beta = (f1 - f0) / (t1 ** 2)
+        return 2 * np.pi * (f0 * t + beta * t ** 3 / 3)
+    if method == 'logarithmic':
+        if f0 * f1 <= 0:
+            raise ValueError('For a logarithmic chirp, f0 and f1 must be nonzero and have the same sign.')
+        if f0 == f1:
+            return 2 * np.pi * f0 * t
+        beta = t1 / np.log(f1 / f0)
+        return 2 * np.pi * beta * f0 * (np.power(f1 / f0, t / t1) - 1.0)
+    if method == 'hyperbolic':
+        if f0 == 0 or f1 == 0:
+            raise ValueError('For a hyperbolic chirp, f0 and f1 must be nonzero.')
+        if f0 == f1:
+            return 2 * np.pi * f0 * t
+        singular_point = -f1 * t1 / (f0 - f1)
+        return 2 * np.pi * (-singular_point * f0) * np.log(np.abs(1 - t / singular_point))
+    raise ValueError(f"Method must be 'linear', 'quadratic', 'logarithmic' or 'hyperbolic', but a value of "
+                     f"{method} was given.")
+
+
+def band_noise(t: np.ndarray, f0, bandwidth, density: int, dtype=np.float64) -> np.ndarray:
+    """Function synthesizing a band of equally spaced sine waves
+
+    The band is the sum of sine waves at frequencies f0, f0 + step, ..., where step = bandwidth / density, the
+    same bank of oscillators as in np.arange(f0, f0 + bandwidth, step). Instead of summing the oscillators one by
+    one, the closed form of the sum is used:
+
+        sum_k sin(2*pi*(f0 + k*step)*t) = sin(2*pi*fc*t) * sin(pi*n*step*t) / sin(pi*step*t)
+
+    where n is the number of oscillators and fc is the center frequency of the bank, so the cost does not depend
+    on the density of the band. In double precision the result differs from the oscillators added one by one by
+    up to about 5e-6 absolute, i.e. 1e-7 of the peak of the sum (about 50 for the default density).
+
+    Parameters
+    ----------
+    t : np.ndarray
+        time axis [in seconds], double precision
+    f0
+        the lowest frequency of the band [in Hz]
+    bandwidth
+        width of the band [in Hz]
+    density : int
+        number of oscillators per band (spacing of the oscillators is bandwidth / density)
+    dtype
+        type of the result
+
+    Returns
+    -------
+    signal : np.ndarray
+        sum of the oscillators
+
+    Raises
+    ------
+    ValueError
+        If the density is not positive
+    """
+
+    if density <= 0:
+        raise ValueError('Density of the band has to be positive')
+    if bandwidth <= 0:
+        return tone(t, f0, dtype)
+
+    step = bandwidth / density
+    count = int(np.ceil(bandwidth / step))  # The same number of oscillators as np.arange would give
+    center = f0 + (count - 1) * step / 2
+
+    # At the multiples of 1/step the ratio goes to count * (-1)^(m * (count - 1)), the singular points are found
+    # from the phase, as the ratio of the interpolated waves is inaccurate close to them
+    periods = step * t
+    nearest = np.round(periods)
+    singular = np.abs(periods - nearest) < 1.e-4 / count
+    envelope = count * np.where(nearest * (count - 1) % 2, -1., 1.).astype(dtype)
+
+    periods /= 2
+    numerator = sine_cycles(count * periods, dtype)
+    denominator = sine_cycles(periods, dtype)
+    np.divide(numerator, denominator, out=envelope, where=~singular)
+    envelope *= sine_cycles(center * t, dtype)
+    return envelope
@@ -0,0 +1,229 @@
+import os
+import glob
+import hashlib
+import warnings
+from typing import Callable, NoReturn, Optional, Tuple
+import numpy as np
+
+# Environment variable with the directory of the cache, the command line option overrides it
+CACHE_ENV = 'HIDE_IN_AUDIO_CACHE'
+
+# Maximum total size of the cached samples [in bytes]
+DEFAULT_CACHE_SIZE: int = 2 * 1024 ** 3
+
+# Number of bytes of the file hashed at once
+HASH_CHUNK_SIZE: int = 1024 ** 2
+
+# Maximum number of the remembered hashes of the files
+MAX_HASHES: int = 10000
+
+# Changing the version invalidates all of the entries, e.g. when the decoding changes
+CACHE_VERSION: int = 1
+
+# Directory of the cache, None disables it
+cache_directory: Optional[str] = os.environ.get(CACHE_ENV) or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'hide_in_audio')
+max_cache_size: int = DEFAULT_CACHE_SIZE
+
+_warned = False
+
+
+def configure(directory: Optional[str], max_size: int = DEFAULT_CACHE_SIZE) -> NoReturn:
+    """Function setting the directory and the size of the cache
+
+    Parameters
+    ----------
+    directory : Optional[str]
+        directory of the cache, None disables the cache
+    max_size : int
+        maximum total size of the cached samples [in bytes]
+
+    Raises
+    ------
+    ValueError
+        If the size of the cache is negative
+    """
+
+    global cache_directory, max_cache_size
+
+    if max_size < 0:
+        raise ValueError('Size of the cache cannot be negative')
+    cache_directory = directory
+    max_cache_size = max_size
+
+
+def cached_read(path: str, parameters: tuple, read: Callable[[], Tuple[np.ndarray, int]]) -> Tuple[np.ndarray, int]:
+    """Function returning the decoded samples of the file from the cache or decoding and caching them
+
+    Entries are keyed by the hash of the content of the file (so a renamed or copied file hits the same entry
+    and a modified one misses it) and by the decoding parameters. The samples are stored as .npy files and
+    mapped in the copy-on-write mode, so a hit neither decodes nor reads the samples into the memory: pages are
+    read when they are used and copied only when they are modified. Entries are evicted in the order of their
+    last use when their total size exceeds the limit. Any error of the cache falls back to decoding.
+
+    Parameters
+    ----------
+    path : str
+        a path to the audio file
+    parameters : tuple
+        decoding parameters (target sampling rate, resampling method, range, channel mode) with stable repr
+    read : Callable[[], Tuple[np.ndarray, int]]
+        function decoding the samples and returning them with their sampling rate
+
+    Returns
+    -------
+    samples : np.ndarray
+        decoded samples
+    sampling_frq
+        self-explanatory
+    """
+
+    if cache_directory is None:
+        return read()
+
+    try:
+        name = hashlib.blake2b(repr((CACHE_VERSION, content_hash(path), parameters)).encode(),
+                               digest_size=16).hexdigest()
+        hit = _load(name)
+    except OSError as exc:
+        _warn(exc)
+        return read()
+    if hit is not None:
+        return hit
+
+    samples, sampling_frq = read()
+    try:
+        _store(name, samples, sampling_frq)
+    except OSError as exc:
+        _warn(exc)
+    return samples, sampling_frq
+
+
+def content_hash(path: str) -> str:
+    """Function returning the hash of the content of the file
+
+    The hash is remembered in the cache for the path, size, modification time and inode of the file, so an
+    unchanged file is hashed only once.
+
+    Parameters
+    ----------
+    path : str
+        a path to the file
+
+    Returns
+    -------
+    digest : str
+        hexadecimal BLAKE2b digest of the content
+    """
+
+    stat = os.stat(path)
+    identity = f'{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{stat.st_ino}'
+    memo_path = os.path.join(cache_directory, 'hashes', hashlib.blake2b(identity.encode(), digest_size=16).hexdigest())
+    try:
+        with open(memo_path) as memo:
+            digest = memo.read().strip()
+        if digest:
+            return digest
+    except FileNotFoundError:
+        pass
+
+    hasher = hashlib.blake2b()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+    _write_atomically(memo_path, lambda stream: stream.write(digest.encode()))
+    _prune(os.path.join(cache_directory, 'hashes', '*'), count=MAX_HASHES)
+    return digest
+
+
+def clear() -> NoReturn:
+    """Function removing all of the entries and the remembered hashes from the cache"""
+
+    if cache_directory is None:
+        return
+    for path in glob.glob(os.path.join(cache_directory, '*.npy')) + glob.glob(
+            os.path.join(cache_directory, 'hashes', '*')):
+        _remove(path)
+
+
+def _load(name: str) -> Optional[Tuple[np.ndarray, int]]:
+    """Mapping the entry of the name, None if there is none"""
+
+    for path in glob.glob(os.path.join(cache_directory, f'{name}_*.npy')):
+        sampling_frq = int(os.path.basename(path)[len(name) + 1:-len('.npy')])
+        try:
+            samples = np.load(path, mmap_mode='c')
+        except ValueError:
+            # Damaged entry
+            _remove(path)
+            continue
+        # Marking the entry as recently used
+        os.utime(path)
+        return np.asarray(samples), sampling_frq
+    return None
+
+
+def _store(name: str, samples: np.ndarray, sampling_frq) -> NoReturn:
+    """Writing the entry and evicting the least recently used ones above the size of the cache"""
+
+    if samples.size == 0 or samples.nbytes > max_cache_size or int(sampling_frq) != sampling_frq:
+        return
+    os.makedirs(cache_directory, exist_ok=True)
+    _write_atomically(os.path.join(cache_directory, f'{name}_{int(sampling_frq)}.npy'),
+                      lambda stream: np.save(stream, samples))
+    _prune(os.path.join(cache_directory, '*.npy'), size=max_cache_size)
+
+
+def _prune(pattern: str, size: Optional[int] = None, count: Optional[int] = None) -> NoReturn:
+    """Removing the least recently used files matching the pattern above the total size or the number"""
+
+    files = []
+    for path in glob.glob(pattern):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Removed by another process
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort(reverse=True)
+
+    total = 0
+    for number, (_, file_size, path) in enumerate(files):
+        total += file_size
+        if (size is not None and total > size) or (count is not None and number >= count):
+            _remove(path)
+
+
+def _write_atomically(path: str, write: Callable) -> NoReturn:
+    """Writing the file through a temporary file, so the readers never see a partial file"""
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as stream:
+            write(stream)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+
+def _remove(path: str) -> NoReturn:
+    """Removing the file, other processes may have removed it already"""
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _warn(exc: OSError) -> NoReturn:
+    """Warning once that the cache does not work"""
+
+    global _warned
+
+    if not _warned:
+        warnings.warn(f'Decoded audio cache in {cache_directory} is not used: {exc}')
+        _warned = True
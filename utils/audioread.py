@@ -1,19 +1,42 @@
-from typing import NoReturn
+import math
+import warnings
+from typing import NoReturn, Optional
 
 import numpy as np
-import librosa
-import matplotlib.pyplot as plt
+import soundfile as sf
 
+from utils import audiocache
 
-def read_file(path_to_file: str, time: float):
+RESAMPLE_QUALITIES = ('polyphase', 'fft', 'soxr_hq', 'soxr_vhq', 'kaiser_best', 'kaiser_fast')
+
+
+def read_file(path_to_file: str, time: float, sr: Optional[int] = None, resample_quality: str = 'polyphase',
+              offset: float = 0, mono: bool = True):
     """Function used to read data from the audio file
 
+    Only the requested range of the file is decoded. WAV files are memory-mapped, other formats supported by
+    soundfile are read from the seeked position, and librosa is used only for the formats soundfile cannot
+    decode. The signal keeps its native sampling rate unless the target rate is given. Multichannel files
+    are downmixed to mono unless the channel layout is to be kept.
+
+    Decoded (and resampled) samples of the other formats and of the resampled files are kept in the on-disk
+    cache (see utils.audiocache), so reading the same file again maps the cached samples instead of decoding
+    them. WAV files read at the native sampling rate are mapped directly and are not cached.
+
     Parameters
     ----------
     path_to_file : str
         a path to the file from which to read the data
     time : float
-        time to slice loaded file
+        time to slice loaded file, negative value means the entire file
+    sr : Optional[int]
+        target sampling rate, None keeps the native sampling rate
+    resample_quality : str
+        resampling method used when the target sampling rate differs from the native one (RESAMPLE_QUALITIES)
+    offset : float
+        time at which reading starts [in seconds]
+    mono : bool
+        if True the channels are downmixed to mono, otherwise the (frames, channels) array is returned
 
     Returns
     -------
@@ -21,20 +44,206 @@ def read_file(path_to_file: str, time: float):
         samples of audio data
     sampling_frq
         self-explanatory
-    """
 
-    samples, sampling_frq = librosa.load(path_to_file)
+    Raises
+    ------
+    ValueError
+        Signal is not long enough for the given maximum time value
+    """
 
     if time < 0:
         print('Max time not given (or negative). Loading entire audio file.')
+
+    def decode():
+        samples, sampling_frq = _read_range(path_to_file, offset, time, mono)
+        if sr is not None and sr != sampling_frq:
+            samples = resample(samples, sampling_frq, sr, resample_quality)
+            sampling_frq = sr
+        return samples, sampling_frq
+
+    if sr is None and path_to_file.lower().endswith('.wav'):
+        return decode()
+    parameters = (sr, resample_quality if sr is not None else None, offset, time, mono)
+    return audiocache.cached_read(path_to_file, parameters, decode)
+
+
+def read_raw(path_to_file: str, sampling_frq: int, time: float, dtype: str = 'int16', channels: int = 1,
+             offset: float = 0, mono: bool = True):
+    """Function used to read data from the headerless (RAW) audio file
+
+    The file is memory-mapped, so only the requested range is read from the disk.
+
+    Parameters
+    ----------
+    path_to_file : str
+        a path to the file from which to read the data
+    sampling_frq : int
+        sampling rate of the file
+    time : float
+        time to slice loaded file, negative value means the entire file
+    dtype : str
+        type of the samples stored in the file
+    channels : int
+        number of interleaved channels
+    offset : float
+        time at which reading starts [in seconds]
+    mono : bool
+        if True the channels are downmixed to mono, otherwise the (frames, channels) array is returned
+
+    Returns
+    -------
+    samples
+        samples of audio data
+    sampling_frq
+        self-explanatory
+    """
+
+    mapped = np.memmap(path_to_file, dtype=dtype, mode='r')
+    mapped = mapped[:mapped.size - mapped.size % channels].reshape(-1, channels)
+    return _to_float(_slice_frames(mapped, sampling_frq, offset, time), mono), sampling_frq
+
+
+def resample(samples: np.ndarray, orig_sr: int, target_sr: int, quality: str = 'polyphase') -> np.ndarray:
+    """Function used to change the sampling rate of the signal
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        samples of audio data, mono or (frames, channels)
+    orig_sr : int
+        sampling rate of the samples
+    target_sr : int
+        required sampling rate
+    quality : str
+        resampling method: 'polyphase' (scipy, fast), 'fft' (scipy) or any of librosa's resampling types
+
+    Returns
+    -------
+    samples : np.ndarray
+        resampled samples
+
+    Raises
+    ------
+    ValueError
+        If the resampling method is unknown
+    """
+
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f'Unknown resampling quality: {quality}. Available: {", ".join(RESAMPLE_QUALITIES)}')
+
+    if quality == 'polyphase':
+        import scipy.signal
+        divisor = math.gcd(int(orig_sr), int(target_sr))
+        resampled = scipy.signal.resample_poly(samples, int(target_sr) // divisor, int(orig_sr) // divisor, axis=0)
+    elif quality == 'fft':
+        import scipy.signal
+        resampled = scipy.signal.resample(samples, int(np.ceil(len(samples) * target_sr / orig_sr)), axis=0)
     else:
-        max_samples = int(sampling_frq * time)
-        if len(samples) >= max_samples:
-            # The signal is cropped to the range of [0: given_time]
-            samples = samples[0:max_samples]
-        else:
+        import librosa
+        # librosa resamples along the last axis
+        resampled = librosa.resample(samples.T, orig_sr=orig_sr, target_sr=target_sr, res_type=quality).T
+    return resampled.astype(np.float32, copy=False)
+
+
+def _read_range(path_to_file: str, offset: float, time: float, mono: bool = True):
+    """Function reading the requested range of the file at the native sampling rate
+
+    Parameters
+    ----------
+    path_to_file : str
+        a path to the file from which to read the data
+    offset : float
+        time at which reading starts [in seconds]
+    time : float
+        length of the range, negative value means the rest of the file [in seconds]
+    mono : bool
+        if True the channels are downmixed to mono
+
+    Returns
+    -------
+    samples
+        mono or (frames, channels) samples of audio data
+    sampling_frq
+        self-explanatory
+    """
+
+    if path_to_file.lower().endswith('.wav'):
+        import scipy.io.wavfile
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                sampling_frq, mapped = scipy.io.wavfile.read(path_to_file, mmap=True)
+            if mapped.ndim == 1:
+                mapped = mapped[:, None]
+            return _to_float(_slice_frames(mapped, sampling_frq, offset, time), mono), sampling_frq
+        except ValueError:
+            # Formats which cannot be memory-mapped, e.g. 24-bit PCM
+            pass
+
+    try:
+        info = sf.info(path_to_file)
+    except RuntimeError:
+        # Format not supported by soundfile
+        import librosa
+        duration = None if time < 0 else time
+        samples, sampling_frq = librosa.load(path_to_file, sr=None, mono=mono, offset=offset, duration=duration)
+        if not mono:
+            # librosa returns (channels, frames) array
+            samples = np.ascontiguousarray(np.atleast_2d(samples).T)
+        if duration is not None and len(samples) < int(sampling_frq * time):
             raise ValueError('Signal is not long enough for the given maximum time value')
-    return samples, sampling_frq
+        return samples, sampling_frq
+
+    start, frames = _frame_range(info.frames, info.samplerate, offset, time)
+    samples, sampling_frq = sf.read(path_to_file, frames=frames, start=start, dtype='float32', always_2d=True)
+    return _to_float(samples, mono), sampling_frq
+
+
+def _frame_range(number_of_frames: int, sampling_frq, offset: float, time: float):
+    """Function calculating the first frame and the number of frames of the requested range
+
+    Raises
+    ------
+    ValueError
+        Signal is not long enough for the given maximum time value
+    """
+
+    start = int(sampling_frq * offset)
+    if time < 0:
+        return start, max(number_of_frames - start, 0)
+
+    max_samples = int(sampling_frq * time)
+    if number_of_frames - start < max_samples:
+        raise ValueError('Signal is not long enough for the given maximum time value')
+    return start, max_samples
+
+
+def _slice_frames(frames: np.ndarray, sampling_frq, offset: float, time: float) -> np.ndarray:
+    """Function slicing the requested range of the (frames, channels) array"""
+
+    start, count = _frame_range(len(frames), sampling_frq, offset, time)
+    return frames[start:start + count]
+
+
+def _to_float(frames: np.ndarray, mono: bool = True) -> np.ndarray:
+    """Function converting (frames, channels) array of any sample type to float32 samples
+
+    Only the given frames are converted, so for memory-mapped input it reads just the requested range. If mono
+    is True the channels are downmixed to mono samples, otherwise the (frames, channels) layout is kept.
+    """
+
+    if frames.dtype.kind in 'iu':
+        info = np.iinfo(frames.dtype)
+        scale = 2. ** (info.bits - 1)
+        shift = scale if frames.dtype.kind == 'u' else 0
+        frames = frames.astype(np.float32)
+        frames -= np.float32(shift)
+        frames /= np.float32(scale)
+    if not mono:
+        return np.array(frames, dtype=np.float32)
+    if frames.shape[1] == 1:
+        return np.array(frames[:, 0], dtype=np.float32)
+    return frames.mean(axis=1, dtype=np.float32)
 
 
 def plot_sound(amplitudes: np.ndarray, sampling_frequency: float) -> NoReturn:
@@ -59,6 +268,7 @@ def plot_sound(amplitudes: np.ndarray, sampling_frequency: float) -> NoReturn:
 
     assert n == len(time_domain), 'Size of the time domain array does not match the number of samples'
 
+    import matplotlib.pyplot as plt
     plt.plot(time_domain, amplitudes)
     plt.title('Given audio signal in time domain')
     plt.xlabel('Time [s]')
@@ -0,0 +1,276 @@
+import os
+import glob
+import time
+import queue
+import threading
+from typing import NoReturn, Optional
+import numpy as np
+import soundfile as sf
+
+from utils import instrumentation
+
+# Subtypes of the samples in the output file, FLAC supports only PCM_16 and PCM_24
+SUBTYPES = ('PCM_16', 'PCM_24', 'PCM_32', 'FLOAT', 'DOUBLE')
+
+# Output formats of the extensions which are not the names of the formats, the extension of any other format of
+# sf.available_formats() is its name (e.g. .wav, .flac, .aiff, .au, .caf, .w64)
+FORMAT_EXTENSIONS = {'.aif': 'AIFF'}
+
+# Number of frames encoded at once, bounds the converted copy of the samples kept by the encoder
+WRITE_BLOCK_SIZE: int = 65536
+
+# Number of blocks waiting for the encoder before the writing thread is blocked
+QUEUE_BLOCKS: int = 8
+
+
+def output_format(path: str, subtype: str = 'PCM_24') -> str:
+    """Function returning the format of the output file of the given path
+
+    Parameters
+    ----------
+    path : str
+        a path to the output file, its extension is the name of one of the formats of sf.available_formats()
+        or one of FORMAT_EXTENSIONS
+    subtype : str
+        subtype of the samples, one of SUBTYPES
+
+    Returns
+    -------
+    format : str
+        soundfile format of the file
+
+    Raises
+    ------
+    ValueError
+        If the extension or the subtype is not supported, or the format does not support the subtype
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    file_format = FORMAT_EXTENSIONS.get(extension, extension[1:].upper())
+    formats = sf.available_formats()
+    if file_format not in formats:
+        raise ValueError(f'Unsupported extension of the output file {extension or "(none)"}, use the name of one '
+                         f'of the formats: {", ".join(name.lower() for name in formats)}')
+    if subtype not in SUBTYPES:
+        raise ValueError(f'Unknown subtype {subtype}, use one of {", ".join(SUBTYPES)}')
+    if not sf.check_format(file_format, subtype):
+        raise ValueError(f'{file_format} files do not support the {subtype} subtype')
+    return file_format
+
+
+class AudioWriter:
+    """A class which encodes the samples into the audio file on a background thread
+
+    Written samples are split into blocks of WRITE_BLOCK_SIZE frames and queued for the encoding thread, so
+    the caller continues (rendering, mixing) while the previous samples are encoded. Each block is converted
+    to the subtype of the file separately, so encoding never needs a converted copy of the whole signal. The
+    queue is bounded: the caller waits when the encoder falls behind.
+
+    The file is written to a temporary path next to the output path and renamed to it when the writer is
+    closed, so the output path holds either the previous file or the complete new one. When the writing
+    fails, the temporary file is removed. Temporary files of the output path left by killed processes (the
+    process of their name is not running) are removed when the next writer of the path is created.
+
+    The written arrays are encoded later, so they must not be modified until the writer is closed.
+
+    Attributes
+    ----------
+    path : str
+        a path to the output file
+    sampling_rate
+        self-explanatory
+    channels : int
+        number of channels of the file
+    subtype : str
+        subtype of the samples, one of SUBTYPES
+    format : str
+        format of the file selected by the extension of the path
+    block_size : int
+        number of frames encoded at once
+    frames : int
+        number of frames encoded so far
+    encode_time : float
+        time spent by the encoding thread on encoding [in seconds]
+
+    Methods
+    -------
+    write(samples: np.ndarray)
+        Queues the samples for encoding
+    close()
+        Waits for the encoding of the queued samples and renames the file to the output path
+    abort()
+        Stops the encoding and removes the temporary file
+    throughput()
+        Returns the encoded frames per second of the encoding time
+    """
+
+    def __init__(self, path: str, sampling_rate, channels: int = 1, subtype: str = 'PCM_24',
+                 block_size: int = WRITE_BLOCK_SIZE, queue_blocks: int = QUEUE_BLOCKS):
+        """
+        Parameters
+        ----------
+        path : str
+            a path to the output file, its extension selects the format (see output_format)
+        sampling_rate
+            self-explanatory
+        channels : int
+            number of channels of the file
+        subtype : str
+            subtype of the samples, one of SUBTYPES
+        block_size : int
+            number of frames encoded at once
+        queue_blocks : int
+            maximum number of the blocks waiting for the encoder
+
+        Raises
+        ------
+        ValueError
+            If the format of the path does not support the subtype or the block size is not positive
+        """
+
+        if block_size < 1:
+            raise ValueError('Size of the block has to be positive')
+
+        self.path: str = path
+        self.sampling_rate = sampling_rate
+        self.channels: int = channels
+        self.subtype: str = subtype
+        self.format: str = output_format(path, subtype)
+        self.block_size: int = block_size
+        self.frames: int = 0
+        self.encode_time: float = 0.
+
+        _remove_stale_files(path)
+        self._tmp_path: str = f'{path}.{os.getpid()}.tmp'
+        self._file = sf.SoundFile(self._tmp_path, 'w', int(sampling_rate), channels, subtype, format=self.format)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_blocks)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._encode, name='encoder', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, samples: np.ndarray) -> NoReturn:
+        """Queues the samples for encoding
+
+        Parameters
+        ----------
+        samples : np.ndarray
+            consecutive part of the signal, mono or (samples, channels) array; it is not copied
+
+        Raises
+        ------
+        ValueError
+            If the writer is closed
+        """
+
+        if self._closed:
+            raise ValueError('Writer is closed')
+        for beg_idx in range(0, len(samples), self.block_size):
+            self._put(samples[beg_idx:beg_idx + self.block_size])
+
+    def close(self) -> NoReturn:
+        """Waits for the encoding of the queued samples and renames the file to the output path
+
+        Raises
+        ------
+        Exception
+            The error of the encoding thread, the temporary file is removed then
+        """
+
+        if self._closed:
+            return
+        self._finish()
+        if self._error is not None:
+            os.remove(self._tmp_path)
+            raise self._error
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> NoReturn:
+        """Stops the encoding and removes the temporary file"""
+
+        if self._closed:
+            return
+        self._error = self._error or RuntimeError('Writing aborted')
+        self._finish()
+        os.remove(self._tmp_path)
+
+    def throughput(self) -> float:
+        """Returns the encoded frames per second of the encoding time"""
+
+        return self.frames / self.encode_time if self.encode_time else 0.
+
+    def _put(self, block: Optional[np.ndarray]) -> NoReturn:
+        """Queues the block, waits while the queue is full and raises the error of the encoding thread"""
+
+        while True:
+            if self._error is not None:
+                self.abort()
+                raise self._error
+            try:
+                self._queue.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise RuntimeError('Encoding thread has stopped')
+
+    def _finish(self) -> NoReturn:
+        """Stops the encoding thread and closes the file"""
+
+        self._closed = True
+        if self._thread.is_alive():
+            while True:
+                try:
+                    self._queue.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    if not self._thread.is_alive():
+                        break
+            self._thread.join()
+        self._file.close()
+
+    def _encode(self) -> NoReturn:
+        """Encoding the queued blocks until the end marker, after an error the blocks are only dropped"""
+
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                with instrumentation.stage('encode_block', samples=len(block)):
+                    beginning = time.perf_counter()
+                    self._file.write(block)
+                    self.encode_time += time.perf_counter() - beginning
+                self.frames += len(block)
+            except BaseException as exc:
+                self._error = exc
+
+
+def _remove_stale_files(path: str) -> NoReturn:
+    """Removing the temporary files of the output path left by the processes which are not running"""
+
+    for tmp_path in glob.glob(f'{glob.escape(path)}.*.tmp'):
+        pid = tmp_path[len(path) + 1:-len('.tmp')]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                # Removed by another writer
+                pass
+        except OSError:
+            # Running process of another user
+            pass
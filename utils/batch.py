@@ -0,0 +1,332 @@
+import os
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, NoReturn, Optional
+
+from utils import audioread
+from visualization.single_signal import Signal
+from letters.short_text import Text
+from letters.flow import FlowedText
+from letters.decoder import Decoder
+
+# Parameters of a job which can be omitted in the manifest, they fall back to the command line values
+JOB_PARAMETERS = ('start_time', 'start_frq', 'width', 'height', 'max_time', 'sr', 'resample_quality', 'force',
+                  'verify', 'dtype', 'scaling', 'multichannel', 'channels', 'gains', 'flow', 'bands',
+                  'letters_per_second', 'subtype')
+FLOAT_PARAMETERS = ('start_time', 'start_frq', 'width', 'height', 'max_time', 'letters_per_second')
+# Parameters given as lists, in the CSV manifest they are separated with spaces
+LIST_PARAMETERS = {'channels': int, 'gains': float}
+
+# Number of shared pools the jobs are submitted to when the worker processes die, then each job gets its own
+SHARED_POOL_ATTEMPTS: int = 2
+
+
+def read_manifest(path: str, defaults: dict) -> List[dict]:
+    """Function reading the jobs from the manifest
+
+    The manifest is either a CSV file with a header or a file of JSON lines. Each job requires the input,
+    text and output fields, the id and the parameters from JOB_PARAMETERS are optional.
+
+    Parameters
+    ----------
+    path : str
+        a path to the manifest (.csv, .jsonl or .json)
+    defaults : dict
+        values of the optional parameters used when the job does not specify them
+
+    Returns
+    -------
+    jobs : List[dict]
+        list of the jobs in the order of the manifest
+
+    Raises
+    ------
+    ValueError
+        If any job misses the required field or the ids of the jobs are not unique
+    """
+
+    with open(path, 'r', newline='') as stream:
+        if path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(stream))
+        else:
+            rows = [json.loads(line) for line in stream if line.strip()]
+
+    jobs = [parse_job(row, defaults, number) for number, row in enumerate(rows)]
+    if len({job['id'] for job in jobs}) != len(jobs):
+        raise ValueError('Ids of the jobs in the manifest have to be unique')
+    return jobs
+
+
+def parse_job(row: dict, defaults: dict, number: int) -> dict:
+    """Function creating the job from a single row of the manifest
+
+    Parameters
+    ----------
+    row : dict
+        fields of the job, the values may be strings (CSV) or JSON values
+    defaults : dict
+        values of the optional parameters used when the row does not specify them
+    number : int
+        number of the row, it is the id of the job unless the row specifies it
+
+    Returns
+    -------
+    job : dict
+        job with all of the parameters from JOB_PARAMETERS
+
+    Raises
+    ------
+    ValueError
+        If the row misses the required field or any parameter has invalid value
+    """
+
+    row = {key.strip(): value for key, value in row.items() if value not in (None, '')}
+    for field in ('input', 'text', 'output'):
+        if field not in row:
+            raise ValueError(f'Job {number} of the manifest does not specify the {field}')
+
+    job = {key: defaults.get(key) for key in JOB_PARAMETERS}
+    job.update(row)
+    job['id'] = str(row.get('id', number))
+    for key in FLOAT_PARAMETERS:
+        job[key] = float(job[key])
+    for key in ('sr', 'bands'):
+        if job[key] is not None:
+            job[key] = int(job[key])
+    for key in ('force', 'verify', 'multichannel', 'flow'):
+        if isinstance(job[key], str):
+            job[key] = job[key].strip().lower() in ('1', 'true', 'yes')
+    for key, item_type in LIST_PARAMETERS.items():
+        if isinstance(job[key], str):
+            job[key] = job[key].split()
+        if job[key] is not None:
+            job[key] = [item_type(item) for item in job[key]]
+    return job
+
+
+def run_job(job: dict) -> dict:
+    """Function hiding the text of a single job
+
+    Any error is caught and reported in the returned record, so a failing job does not affect the others.
+    With verification enabled, the text is decoded back from the mixed signal and the job fails when it
+    does not match. The flowed text is verified line by line.
+
+    Parameters
+    ----------
+    job : dict
+        job read from the manifest
+
+    Returns
+    -------
+    record : dict
+        id, status ('ok' or 'failed'), error message, timings of the stages [in seconds], the result of the
+        verification and the encoded frames per second
+    """
+
+    record = {'id': job['id'], 'input': job['input'], 'output': job['output'], 'status': 'ok', 'error': None,
+              'timings': {}}
+    timings = record['timings']
+    beginning = time.perf_counter()
+    try:
+        if os.path.exists(job['output']) and not job['force']:
+            raise FileExistsError(f'File of the path {job["output"]} already exists. Use --force to overwrite it.')
+
+        stage = time.perf_counter()
+        samples, sampling_rate = audioread.read_file(job['input'], job['max_time'], job['sr'],
+                                                     job['resample_quality'], mono=not job['multichannel'])
+        sig = Signal(samples, sampling_rate, job['dtype'])
+        timings['load'] = time.perf_counter() - stage
+
+        if job['flow']:
+            stage = time.perf_counter()
+            flowed = FlowedText(sig, job['start_time'], job['start_frq'], job['width'], job['height'], job['text'],
+                                job['bands'], job['letters_per_second'], scaling=job['scaling'])
+            flowed.apply(sig, channels=job['channels'], gains=job['gains'])
+            timings['render'] = time.perf_counter() - stage
+            lines = flowed.lines
+        else:
+            stage = time.perf_counter()
+            text = Text(sig, job['start_time'], job['start_frq'], job['width'], job['height'], job['text'],
+                        job['scaling'])
+            text.create_shape()
+            timings['render'] = time.perf_counter() - stage
+
+            stage = time.perf_counter()
+            sig.apply_shape(text, channels=job['channels'], gains=job['gains'])
+            timings['mix'] = time.perf_counter() - stage
+            lines = [(job['start_time'], job['start_frq'], job['width'], job['text'])]
+
+        if job['verify']:
+            stage = time.perf_counter()
+            decoded, confidences = [], []
+            for start_t, start_f, width, line in lines:
+                decoder = Decoder(sig, start_t, start_f, width, job['height'])
+                characters = decoder.decode(len(line))
+                decoded.append(''.join(character for character, _ in characters))
+                confidences.extend(confidence for _, confidence in characters)
+            record['decoded'] = ' '.join(decoded)
+            record['confidence'] = min(confidences)
+            timings['verify'] = time.perf_counter() - stage
+            if decoded != [expected for *_, expected in lines]:
+                raise ValueError(f'Verification failed, decoded text: {record["decoded"]}')
+
+        stage = time.perf_counter()
+        writer = sig.save_signal(job['output'], job['subtype'] or 'PCM_24')
+        timings['save'] = time.perf_counter() - stage
+        record['encode_throughput'] = writer.throughput()
+    except Exception as exc:
+        record['status'] = 'failed'
+        record['error'] = f'{type(exc).__name__}: {exc}'
+    record['total'] = time.perf_counter() - beginning
+    return record
+
+
+def completed_jobs(summary_path: str) -> set:
+    """Function returning ids of the jobs which succeeded in the previous run
+
+    Parameters
+    ----------
+    summary_path : str
+        a path to the summary of the previous run
+
+    Returns
+    -------
+    ids : set
+        ids of the jobs which do not have to be run again
+    """
+
+    return {record['id'] for record in _summary_records(summary_path)
+            if record.get('status') == 'ok' and os.path.exists(record.get('output', ''))}
+
+
+def started_jobs(summary_path: str) -> set:
+    """Function returning the jobs whose outputs were claimed by the previous run
+
+    A job claims its output when it is started and the output does not exist yet, so the file found at the
+    output path on resume was written by the batch (the job may have been interrupted after saving but before
+    its record was written) and not by the user.
+
+    Parameters
+    ----------
+    summary_path : str
+        a path to the summary of the previous run
+
+    Returns
+    -------
+    jobs : set
+        (id, output) pairs of the started jobs
+    """
+
+    return {(record['id'], record.get('output')) for record in _summary_records(summary_path)
+            if record.get('status') == 'started'}
+
+
+def _summary_records(summary_path: str) -> List[dict]:
+    """Function reading the records of the summary, lines truncated by the interrupted run are skipped"""
+
+    records = []
+    if os.path.exists(summary_path):
+        with open(summary_path, 'r') as stream:
+            for line in stream:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+
+def run_batch(jobs: List[dict], summary_path: str, workers: Optional[int] = None) -> dict:
+    """Function running the jobs on the pool of processes
+
+    Records of the finished jobs are appended to the summary (JSON lines) as soon as they are ready, so an
+    interrupted run can be resumed - jobs which already succeeded are skipped. Before the jobs are run, the
+    ones whose outputs do not exist are recorded as started; on resume they overwrite their outputs, which
+    were written by the interrupted run, without --force.
+
+    Parameters
+    ----------
+    jobs : List[dict]
+        jobs read from the manifest
+    summary_path : str
+        a path to the summary of the run
+    workers : Optional[int]
+        number of processes, 1 runs the jobs in the current process, None uses all of the processors
+
+    Returns
+    -------
+    totals : dict
+        numbers of the succeeded, failed and skipped jobs and the wall time of the run [in seconds]
+    """
+
+    done = completed_jobs(summary_path)
+    started = started_jobs(summary_path)
+    pending = [dict(job, force=True) if (job['id'], job['output']) in started else job
+               for job in jobs if job['id'] not in done]
+    totals = {'ok': 0, 'failed': 0, 'skipped': len(jobs) - len(pending)}
+    beginning = time.perf_counter()
+
+    with open(summary_path, 'a') as summary:
+        for job in pending:
+            if (job['id'], job['output']) not in started and not os.path.exists(job['output']):
+                summary.write(json.dumps({'id': job['id'], 'output': job['output'], 'status': 'started'}) + '\n')
+        summary.flush()
+
+        for record in _run_jobs(pending, workers):
+            totals[record['status']] += 1
+            summary.write(json.dumps(record) + '\n')
+            summary.flush()
+            if record['status'] == 'failed':
+                print(f'Job {record["id"]} failed: {record["error"]}')
+
+    totals['time'] = time.perf_counter() - beginning
+    return totals
+
+
+def _run_jobs(jobs: List[dict], workers: Optional[int]):
+    """Generator yielding records of the jobs in the order of their completion
+
+    When a worker process dies (e.g. it is killed by the system), the pool fails all of its unfinished jobs
+    without telling which of them killed the worker. They are submitted again to a fresh pool, and after
+    SHARED_POOL_ATTEMPTS pools each of them runs in a pool of its own, so only the job which kills its worker
+    is recorded as failed.
+    """
+
+    if workers == 1:
+        for job in jobs:
+            yield run_job(job)
+        return
+
+    remaining = list(jobs)
+    attempt = 0
+    while remaining:
+        isolated = attempt >= SHARED_POOL_ATTEMPTS
+        unfinished = []
+        for group in ([job] for job in remaining) if isolated else [remaining]:
+            with ProcessPoolExecutor(max_workers=1 if isolated else workers) as executor:
+                futures = {executor.submit(run_job, job): job for job in group}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        yield future.result()
+                        continue
+                    except BrokenProcessPool as exc:
+                        if not isolated:
+                            unfinished.append(job)
+                            continue
+                        error = exc
+                    except Exception as exc:
+                        error = exc
+                    yield {'id': job['id'], 'input': job['input'], 'output': job['output'], 'status': 'failed',
+                           'error': f'{type(error).__name__}: {error}', 'timings': {}, 'total': None}
+        remaining = unfinished
+        attempt += 1
+
+
+def print_totals(totals: dict) -> NoReturn:
+    """Function printing the totals of the batch run"""
+
+    print(f'Batch finished in {totals["time"]:.2f} s: {totals["ok"]} succeeded, {totals["failed"]} failed, '
+          f'{totals["skipped"]} skipped (already done).')
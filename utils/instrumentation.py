@@ -0,0 +1,219 @@
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, NoReturn, Optional
+
+# Shared context returned by stage() when the instrumentation is disabled
+_DISABLED = nullcontext()
+
+_profiler = None
+
+
+class Profiler:
+    """A class which collects timings and memory usage of the stages of the processing
+
+    Stages are identified by their paths (names of the enclosing stages joined with '/'), measurements of the
+    stages with the same path are aggregated. Stages entered in worker threads start their own paths.
+
+    Attributes
+    ----------
+    records : Dict[str, dict]
+        aggregated measurements of each stage: count, wall and CPU time, peak allocations and sample count
+    hooks : List[Callable[[dict], None]]
+        functions called with the measurement of every finished stage
+    trace_memory : bool
+        whether peak allocations are traced with tracemalloc (only for the stages of the main thread)
+
+    Methods
+    -------
+    stage(name: str, samples: int)
+        Context manager measuring the stage
+    add_samples(samples: int)
+        Adds the number of samples to the innermost stage of the calling thread
+    report()
+        Returns the aggregated measurements
+    """
+
+    def __init__(self, trace_memory: bool = True, hooks: Optional[List[Callable[[dict], None]]] = None):
+        """
+        Parameters
+        ----------
+        trace_memory : bool
+            whether peak allocations are traced with tracemalloc
+        hooks : Optional[List[Callable[[dict], None]]]
+            functions called with the measurement of every finished stage
+        """
+
+        self.records: Dict[str, dict] = {}
+        self.hooks: List[Callable[[dict], None]] = list(hooks or [])
+        self.trace_memory: bool = trace_memory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    @contextmanager
+    def stage(self, name: str, samples: int = 0):
+        """Context manager measuring the stage
+
+        Parameters
+        ----------
+        name : str
+            name of the stage
+        samples : int
+            number of samples processed by the stage
+        """
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        path = '/'.join([frame['path'] for frame in stack[-1:]] + [name])
+        trace = self.trace_memory and threading.current_thread() is threading.main_thread()
+
+        frame = {'path': path, 'peak': 0, 'current': 0, 'samples': samples}
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['current'] = frame['peak'] = current
+        stack.append(frame)
+
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stack.pop()
+            peak_bytes = 0
+            if trace:
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - frame['current']
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            self._record({'stage': path, 'wall_s': wall, 'cpu_s': cpu, 'peak_bytes': peak_bytes,
+                          'samples': frame['samples']})
+
+    def add_samples(self, samples: int) -> NoReturn:
+        """Adds the number of samples to the innermost stage of the calling thread"""
+
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1]['samples'] += samples
+
+    def report(self) -> dict:
+        """Returns the aggregated measurements
+
+        Returns
+        -------
+        report : dict
+            measurements of the stages in the order they were first finished
+        """
+
+        with self._lock:
+            return {'stages': [{'stage': path, **record} for path, record in self.records.items()]}
+
+    def close(self) -> NoReturn:
+        """Stops tracing the memory if it was started by the profiler"""
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _record(self, measurement: dict) -> NoReturn:
+        """Adds the measurement to the aggregated records and passes it to the hooks"""
+
+        with self._lock:
+            record = self.records.setdefault(measurement['stage'], {'count': 0, 'wall_s': 0., 'cpu_s': 0.,
+                                                                    'peak_bytes': 0, 'samples': 0})
+            record['count'] += 1
+            record['wall_s'] += measurement['wall_s']
+            record['cpu_s'] += measurement['cpu_s']
+            record['peak_bytes'] = max(record['peak_bytes'], measurement['peak_bytes'])
+            record['samples'] += measurement['samples']
+        for hook in self.hooks:
+            hook(measurement)
+
+
+def enable(trace_memory: bool = True, hooks: Optional[List[Callable[[dict], None]]] = None) -> Profiler:
+    """Function enabling the instrumentation of the process
+
+    Parameters
+    ----------
+    trace_memory : bool
+        whether peak allocations are traced with tracemalloc
+    hooks : Optional[List[Callable[[dict], None]]]
+        functions called with the measurement of every finished stage
+
+    Returns
+    -------
+    profiler : Profiler
+        profiler collecting the measurements
+    """
+
+    global _profiler
+
+    disable()
+    _profiler = Profiler(trace_memory, hooks)
+    return _profiler
+
+
+def disable() -> Optional[Profiler]:
+    """Function disabling the instrumentation, returns the profiler which collected the measurements"""
+
+    global _profiler
+
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.close()
+    return profiler
+
+
+def stage(name: str, samples: int = 0):
+    """Function returning the context manager measuring the stage
+
+    When the instrumentation is disabled a shared no-op context is returned, so instrumented code costs only
+    a function call.
+
+    Parameters
+    ----------
+    name : str
+        name of the stage
+    samples : int
+        number of samples processed by the stage
+    """
+
+    if _profiler is None:
+        return _DISABLED
+    return _profiler.stage(name, samples)
+
+
+def add_samples(samples: int) -> NoReturn:
+    """Function adding the number of samples to the innermost stage, when the number is known only at its end"""
+
+    if _profiler is not None:
+        _profiler.add_samples(samples)
+
+
+def write_report(profiler: Profiler, path: str) -> NoReturn:
+    """Function writing the report of the profiler as JSON
+
+    Parameters
+    ----------
+    profiler : Profiler
+        profiler which collected the measurements
+    path : str
+        a path to the JSON file, '-' prints the report
+    """
+
+    report = json.dumps(profiler.report(), indent=2)
+    if path == '-':
+        print(report)
+    else:
+        with open(path, 'w') as stream:
+            stream.write(report)
@@ -0,0 +1,157 @@
+from typing import Iterable, Optional, Tuple
+import numpy as np
+
+# Number of samples (frames) summarized by a single entry of the index
+BLOCK_SIZE: int = 1024
+
+# Number of blocks reduced at once while building the index, bounds the temporary arrays
+BLOCKS_PER_SLAB: int = 256
+
+
+class LoudnessIndex:
+    """A class which represents cumulative loudness of the signal at block granularity
+
+    The signal is scanned once and the sums of |x| and x^2 of each block of samples (of all of the channels)
+    are kept as cumulative sums, so the mean absolute amplitude and the RMS of the whole signal or of any
+    window are calculated from two entries, without scanning the samples again. Windows are extended to the
+    borders of the blocks they touch; the whole signal is covered exactly.
+
+    Attributes
+    ----------
+    block_size : int
+        number of samples of a block
+    channels : int
+        number of channels of the signal
+    length : int
+        number of samples of the signal
+    _abs_sums : np.ndarray
+        cumulative sums of |x| at the borders of the blocks
+    _square_sums : np.ndarray
+        cumulative sums of x^2 at the borders of the blocks
+
+    Methods
+    -------
+    from_segments(segments: Iterable[np.ndarray], channels: int, block_size: int)
+        Builds the index from consecutive parts of the signal
+    mean_amplitude(beg_idx: int, end_idx: Optional[int])
+        Returns mean absolute amplitude of the window
+    rms(beg_idx: int, end_idx: Optional[int])
+        Returns root mean square of the window
+    """
+
+    def __init__(self, abs_sums: np.ndarray, square_sums: np.ndarray, length: int, channels: int = 1,
+                 block_size: int = BLOCK_SIZE):
+        """
+        Parameters
+        ----------
+        abs_sums : np.ndarray
+            sums of |x| of the consecutive blocks
+        square_sums : np.ndarray
+            sums of x^2 of the consecutive blocks
+        length : int
+            number of samples of the signal, only the last block may be shorter than the block size
+        channels : int
+            number of channels of the signal
+        block_size : int
+            number of samples of a block
+        """
+
+        self.block_size: int = block_size
+        self.channels: int = channels
+        self.length: int = length
+        self._abs_sums: np.ndarray = np.concatenate(([0.], np.cumsum(abs_sums, dtype=np.float64)))
+        self._square_sums: np.ndarray = np.concatenate(([0.], np.cumsum(square_sums, dtype=np.float64)))
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[np.ndarray], channels: int = 1, block_size: int = BLOCK_SIZE):
+        """Builds the index from consecutive parts of the signal
+
+        Parts do not have to be aligned to the blocks. They are reduced in slabs of blocks, so the temporary
+        arrays do not depend on the size of the parts.
+
+        Parameters
+        ----------
+        segments : Iterable[np.ndarray]
+            consecutive parts of the signal, mono or (samples, channels) arrays
+        channels : int
+            number of channels of the signal
+        block_size : int
+            number of samples of a block
+
+        Returns
+        -------
+        index : LoudnessIndex
+            index of the whole signal
+        """
+
+        abs_sums, square_sums = [], []
+        length = 0
+        carry = None
+        for segment in segments:
+            length += len(segment)
+            if carry is not None:
+                # Completing the block started by the previous part
+                missing = block_size - len(carry)
+                carry = np.concatenate((carry, segment[:missing]))
+                segment = segment[missing:]
+                if len(carry) < block_size:
+                    continue
+                _reduce(carry, block_size, abs_sums, square_sums)
+                carry = None
+
+            full = len(segment) - len(segment) % block_size
+            slab = BLOCKS_PER_SLAB * block_size
+            for beg_idx in range(0, full, slab):
+                _reduce(segment[beg_idx:min(beg_idx + slab, full)], block_size, abs_sums, square_sums)
+            if full < len(segment):
+                carry = np.array(segment[full:])
+
+        if carry is not None:
+            _reduce(carry, len(carry), abs_sums, square_sums)
+        if not abs_sums:
+            abs_sums, square_sums = [np.zeros(0)], [np.zeros(0)]
+        return cls(np.concatenate(abs_sums), np.concatenate(square_sums), length, channels, block_size)
+
+    def mean_amplitude(self, beg_idx: int = 0, end_idx: Optional[int] = None) -> float:
+        """Returns mean absolute amplitude of the window
+
+        Parameters
+        ----------
+        beg_idx : int
+            index of the first sample of the window
+        end_idx : Optional[int]
+            index after the last sample of the window, None means the end of the signal
+
+        Returns
+        -------
+        level : float
+            mean absolute value of the samples of the blocks covering the window, 0 for the empty window
+        """
+
+        first, last, count = self._blocks(beg_idx, end_idx)
+        return float(self._abs_sums[last] - self._abs_sums[first]) / count if count else 0.
+
+    def rms(self, beg_idx: int = 0, end_idx: Optional[int] = None) -> float:
+        """Returns root mean square of the window, see mean_amplitude"""
+
+        first, last, count = self._blocks(beg_idx, end_idx)
+        return float(np.sqrt(max(self._square_sums[last] - self._square_sums[first], 0.) / count)) if count else 0.
+
+    def _blocks(self, beg_idx: int, end_idx: Optional[int]) -> Tuple[int, int, int]:
+        """Returns the range of the blocks covering the window and the number of their values"""
+
+        end_idx = self.length if end_idx is None else min(end_idx, self.length)
+        beg_idx = max(beg_idx, 0)
+        if end_idx <= beg_idx:
+            return 0, 0, 0
+        first, last = beg_idx // self.block_size, -(-end_idx // self.block_size)
+        count = (min(last * self.block_size, self.length) - first * self.block_size) * self.channels
+        return first, last, count
+
+
+def _reduce(samples: np.ndarray, block_size: int, abs_sums: list, square_sums: list) -> None:
+    """Appends the sums of |x| and x^2 of the whole blocks of the samples to the lists"""
+
+    blocks = np.reshape(samples, (len(samples) // block_size, -1))
+    abs_sums.append(np.sum(np.abs(blocks), axis=1, dtype=np.float64))
+    square_sums.append(np.einsum('ij,ij->i', blocks, blocks, dtype=np.float64))
@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import asyncio
+import itertools
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, List, NoReturn, Optional
+
+from utils import batch
+
+# Number of finished jobs whose status is kept for the status requests
+HISTORY_SIZE: int = 10000
+
+# Number of pools a job is submitted to when the worker processes die, then it is recorded as failed
+POOL_ATTEMPTS: int = 2
+
+# Operations of the protocol, a message without the op field is a submitted job
+OPERATIONS = ('submit', 'status', 'cancel', 'jobs', 'shutdown')
+
+Send = Callable[[dict], Awaitable[None]]
+
+
+def warm_up(redirect_prints: bool = True) -> NoReturn:
+    """Function preparing the process for the jobs
+
+    The atlas of the dictionary and the wavetable are loaded before the first job, so no job pays for them.
+
+    Parameters
+    ----------
+    redirect_prints : bool
+        if True the prints go to the standard error, worker processes report through the protocol only
+    """
+
+    from letters.atlas import load_atlas
+    from letters import oscillator
+
+    if redirect_prints:
+        sys.stdout = sys.stderr
+    load_atlas()
+    oscillator.wavetable()
+
+
+class EmbedServer:
+    """A class which represents long-running server hiding the texts of the submitted jobs
+
+    Messages are JSON lines read from a Unix domain socket or from the standard input. Jobs have the fields
+    of the batch manifest and are run with batch.run_job on the pool of workers which stay warm between the
+    jobs (loaded atlas, wavetables and glyph caches). The queue of the jobs is bounded: when it is full, the
+    server stops reading the connection which submits the job until a worker takes one, so the clients are
+    slowed down instead of growing the memory of the server. When a worker process dies (e.g. it is killed by
+    the system), the broken pool is replaced by a fresh warm one and its running jobs are submitted again, up to
+    POOL_ATTEMPTS pools per job.
+
+    Requests (the op field) and their responses:
+
+    * submit (or no op) - {"op": "submit", "job": {...}} queues the job, the response contains its id and the
+      done message with the record of batch.run_job is sent to the same connection when the job finishes
+    * status - {"op": "status", "id": ...} returns the status of the job (queued, running, ok, failed or
+      cancelled) and its record when it has finished
+    * cancel - {"op": "cancel", "id": ...} cancels the queued job, running jobs are not interrupted
+    * jobs - returns the statuses of all of the known jobs
+    * shutdown - stops the server after the running jobs
+
+    Attributes
+    ----------
+    defaults : dict
+        values of the optional parameters of the jobs, see batch.JOB_PARAMETERS
+    workers : Optional[int]
+        number of processes running the jobs, 1 runs them in a thread of the server, None uses all processors
+    queue_size : int
+        maximum number of the queued jobs
+    _jobs : OrderedDict
+        statuses of the jobs by their ids, the oldest first
+    _listeners : dict
+        functions sending the done message to the connection which submitted the job
+
+    Methods
+    -------
+    serve_unix(path: str)
+        Serving the clients connected to the Unix domain socket
+    serve_stdio()
+        Serving the messages of the standard input, the responses are written to the standard output
+    handle_message(message: dict, send)
+        Handling a single request
+    """
+
+    def __init__(self, defaults: dict, workers: Optional[int] = None, queue_size: int = 64):
+        """
+        Parameters
+        ----------
+        defaults : dict
+            values of the optional parameters of the jobs
+        workers : Optional[int]
+            number of processes running the jobs, 1 runs them in a thread of the server, None uses all processors
+        queue_size : int
+            maximum number of the queued jobs
+
+        Raises
+        ------
+        ValueError
+            If the size of the queue is not positive
+        """
+
+        if queue_size < 1:
+            raise ValueError('Size of the queue has to be positive')
+
+        self.defaults: dict = defaults
+        self.workers: Optional[int] = workers
+        self.queue_size: int = queue_size
+        self._jobs: OrderedDict = OrderedDict()
+        self._listeners: dict = {}
+        self._numbers = itertools.count()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[Executor] = None
+        self._pool_size: int = 1
+        self._tasks: List[asyncio.Task] = []
+        self._closed: Optional[asyncio.Event] = None
+
+    async def serve_unix(self, path: str) -> NoReturn:
+        """Serving the clients connected to the Unix domain socket at the given path until the shutdown"""
+
+        if os.path.exists(path):
+            os.remove(path)
+        await self._start()
+        try:
+            server = await asyncio.start_unix_server(self._handle_connection, path)
+            async with server:
+                print(f'Serving on {path} ...', file=sys.stderr)
+                await self._closed.wait()
+        finally:
+            await self._stop()
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def serve_stdio(self) -> NoReturn:
+        """Serving the messages of the standard input until its end or the shutdown
+
+        The responses are written to the standard output, so the prints of the jobs are moved to the standard
+        error. At the end of the input the server waits for the queued jobs before it stops.
+        """
+
+        output, sys.stdout = sys.stdout, sys.stderr
+        loop = asyncio.get_running_loop()
+
+        async def send(message: dict):
+            output.write(json.dumps(message) + '\n')
+            output.flush()
+
+        await self._start()
+        try:
+            while not self._closed.is_set():
+                line = await loop.run_in_executor(None, sys.stdin.readline)
+                if not line:
+                    await self._queue.join()
+                    break
+                await self._handle_line(line, send)
+        finally:
+            await self._stop()
+            sys.stdout = output
+
+    async def handle_message(self, message: dict, send: Optional[Send] = None) -> dict:
+        """Handling a single request
+
+        Parameters
+        ----------
+        message : dict
+            request of the client
+        send
+            coroutine function sending the done message of the submitted job to the client
+
+        Returns
+        -------
+        response : dict
+            response to the request, it contains the error field when the request is invalid
+        """
+
+        operation = message.get('op', 'submit')
+        try:
+            if operation not in OPERATIONS:
+                raise ValueError(f'Unknown operation {operation}, use one of {", ".join(OPERATIONS)}')
+            if operation == 'submit':
+                return await self._submit(message.get('job', {key: value for key, value in message.items()
+                                                              if key != 'op'}), send)
+            if operation == 'jobs':
+                return {'op': operation, 'jobs': [self._status(job_id) for job_id in self._jobs]}
+            if operation == 'shutdown':
+                self._closed.set()
+                return {'op': operation}
+
+            job_id = str(message.get('id'))
+            if job_id not in self._jobs:
+                raise KeyError(f'Unknown job {job_id}')
+            if operation == 'cancel' and self._jobs[job_id]['status'] == 'queued':
+                self._jobs[job_id]['status'] = 'cancelled'
+                await self._notify(job_id)
+            return {'op': operation, **self._status(job_id)}
+        except Exception as exc:
+            return {'op': operation, 'error': f'{type(exc).__name__}: {exc}'}
+
+    async def _submit(self, row: dict, send: Optional[Send]) -> dict:
+        """Queueing the job, waits while the queue is full"""
+
+        number = next(self._numbers)
+        job = batch.parse_job(row, self.defaults, number)
+        if job['id'] in self._jobs and self._jobs[job['id']]['status'] in ('queued', 'running'):
+            raise ValueError(f'Job {job["id"]} is already queued')
+
+        self._jobs[job['id']] = {'id': job['id'], 'status': 'queued', 'job': job, 'record': None}
+        self._jobs.move_to_end(job['id'])
+        if send is not None:
+            self._listeners[job['id']] = send
+        self._forget()
+        await self._queue.put(job['id'])
+        return {'op': 'submit', **self._status(job['id'])}
+
+    async def _worker(self) -> NoReturn:
+        """Running the queued jobs one by one on the pool"""
+
+        while True:
+            job_id = await self._queue.get()
+            try:
+                state = self._jobs.get(job_id)
+                if state is None or state['status'] != 'queued':
+                    continue
+                state['status'] = 'running'
+                record = await self._run(state['job'])
+                state['status'], state['record'] = record['status'], record
+                await self._notify(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: dict) -> dict:
+        """Running the job on the pool and returning its record
+
+        A dead worker process breaks the whole pool, which fails all of its running jobs without telling which of
+        them killed the worker, so the job is submitted again to a fresh pool. After POOL_ATTEMPTS pools only this
+        job is recorded as failed, the pool is still replaced for the following jobs.
+        """
+
+        loop = asyncio.get_running_loop()
+        for _ in range(POOL_ATTEMPTS):
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(executor, batch.run_job, job)
+            except BrokenProcessPool as exc:
+                self._replace_pool(executor)
+                error = exc
+            except Exception as exc:
+                error = exc
+                break
+        return {'id': job['id'], 'input': job['input'], 'output': job['output'], 'status': 'failed',
+                'error': f'{type(error).__name__}: {error}', 'timings': {}, 'total': None}
+
+    def _replace_pool(self, broken: Executor) -> NoReturn:
+        """Replacing the broken pool by a fresh one, the workers sharing the pool replace it only once"""
+
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = ProcessPoolExecutor(max_workers=self._pool_size, initializer=warm_up)
+
+    async def _notify(self, job_id: str) -> NoReturn:
+        """Sending the done message to the connection which submitted the job"""
+
+        send = self._listeners.pop(job_id, None)
+        if send is None:
+            return
+        try:
+            await send({'op': 'done', **self._status(job_id)})
+        except (ConnectionError, RuntimeError):
+            # The client has disconnected, the status can still be requested
+            pass
+
+    def _status(self, job_id: str) -> dict:
+        """Public status of the job"""
+
+        state = self._jobs[job_id]
+        return {'id': job_id, 'status': state['status'], 'record': state['record']}
+
+    def _forget(self) -> NoReturn:
+        """Removing the oldest finished jobs above the size of the history"""
+
+        finished = [job_id for job_id, state in self._jobs.items() if state['status'] not in ('queued', 'running')]
+        for job_id in finished[:max(len(self._jobs) - HISTORY_SIZE, 0)]:
+            del self._jobs[job_id]
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> NoReturn:
+        """Serving a single client of the socket"""
+
+        lock = asyncio.Lock()
+
+        async def send(message: dict):
+            async with lock:
+                writer.write((json.dumps(message) + '\n').encode())
+                await writer.drain()
+
+        try:
+            while not self._closed.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                await self._handle_line(line.decode(), send)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_line(self, line: str, send: Send) -> NoReturn:
+        """Handling a single line of the input"""
+
+        if not line.strip():
+            return
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError('Message has to be a JSON object')
+        except ValueError as exc:
+            await send({'error': f'{type(exc).__name__}: {exc}'})
+            return
+        await send(await self.handle_message(message, send))
+
+    async def _start(self) -> NoReturn:
+        """Creating the queue, the pool and the workers"""
+
+        workers = self._pool_size = self.workers or os.cpu_count() or 1
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._closed = asyncio.Event()
+        if workers == 1:
+            warm_up(redirect_prints=False)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job')
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    async def _stop(self) -> NoReturn:
+        """Stopping the workers, the running jobs are finished"""
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def serve(path: str, defaults: dict, workers: Optional[int] = None, queue_size: int = 64) -> NoReturn:
+    """Function running the server until the shutdown
+
+    Parameters
+    ----------
+    path : str
+        a path to the Unix domain socket, - serves the standard input and output
+    defaults : dict
+        values of the optional parameters of the jobs
+    workers : Optional[int]
+        number of processes running the jobs, 1 runs them in a thread of the server, None uses all processors
+    queue_size : int
+        maximum number of the queued jobs
+    """
+
+    server = EmbedServer(defaults, workers, queue_size)
+    asyncio.run(server.serve_stdio() if path == '-' else server.serve_unix(path))
+
+
+async def submit_jobs(path: str, jobs: List[dict]) -> List[dict]:
+    """Function submitting the jobs to the server and waiting for all of them
+
+    Parameters
+    ----------
+    path : str
+        a path to the Unix domain socket of the server
+    jobs : List[dict]
+        jobs with the fields of the batch manifest
+
+    Returns
+    -------
+    records : List[dict]
+        done messages of the jobs in the order of their completion
+
+    Raises
+    ------
+    ValueError
+        If the server rejects any of the jobs
+    """
+
+    reader, writer = await asyncio.open_unix_connection(path)
+
+    async def write():
+        # Drained after each job, so the client follows the backpressure of the server
+        for job in jobs:
+            writer.write((json.dumps({'op': 'submit', 'job': job}) + '\n').encode())
+            await writer.drain()
+
+    async def read() -> List[dict]:
+        records = []
+        while len(records) < len(jobs):
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError('Server has closed the connection')
+            message = json.loads(line)
+            if 'error' in message:
+                raise ValueError(f'Job rejected by the server: {message["error"]}')
+            if message.get('op') == 'done':
+                records.append(message)
+        return records
+
+    try:
+        return (await asyncio.gather(write(), read()))[1]
+    finally:
+        writer.close()
@@ -0,0 +1,206 @@
+import os
+from typing import Iterable, NoReturn, Optional, Sequence
+import numpy as np
+import soundfile as sf
+
+from visualization.single_signal import Signal
+from utils.audiowrite import AudioWriter
+from utils.loudness import LoudnessIndex
+from letters.shape import Shape
+from letters.short_text import Text
+from letters.flow import DEFAULT_LETTERS_PER_SECOND, FlowedText
+
+
+class StreamedSignal(Signal):
+    """A class which represents a signal that is not loaded into the memory
+
+    The file is scanned block by block once, to find its length and to build its loudness index, which is
+    everything shapes need from their template. Samples of the signal are never kept.
+
+    Attributes
+    ----------
+    path : str
+        a path to the audio file
+    block_size : int
+        number of frames read at once
+    mono : bool
+        if True the blocks are downmixed to mono, otherwise they keep the channels of the file
+    _length : int
+        number of the samples of the signal
+
+    Methods
+    -------
+    blocks()
+        Yielding consecutive blocks of the signal
+    loudness()
+        Returns the loudness index built while scanning the file
+    """
+
+    def __init__(self, path: str, time: float = -1, block_size: int = 65536, mono: bool = True):
+        """
+        Parameters
+        ----------
+        path : str
+            a path to the audio file
+        time : float
+            time to slice the file to, negative value means the entire file
+        block_size : int
+            number of frames read at once
+        mono : bool
+            if True the channels are downmixed to mono
+
+        Raises
+        ------
+        ValueError
+            Signal is not long enough for the given maximum time value
+        """
+
+        info = sf.info(path)
+        super().__init__(np.zeros(0, dtype=np.float32), info.samplerate)
+
+        self.path: str = path
+        self.block_size: int = block_size
+        self.mono: bool = mono
+        self._channels: int = 1 if mono else info.channels
+        self._length: int = info.frames
+        if time >= 0:
+            max_samples = int(info.samplerate * time)
+            if info.frames < max_samples:
+                raise ValueError('Signal is not long enough for the given maximum time value')
+            self._length = max_samples
+
+        self._loudness = LoudnessIndex.from_segments(self.blocks(), self._channels)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def channels(self) -> int:
+        return self._channels
+
+    def loudness(self) -> LoudnessIndex:
+        """Returns the loudness index built while scanning the file"""
+
+        return self._loudness
+
+    def blocks(self):
+        """Yielding consecutive blocks of the signal
+
+        Yields
+        ------
+        block : np.ndarray
+            block of at most block_size samples, mono or (samples, channels) array
+        """
+
+        with sf.SoundFile(self.path) as stream:
+            for block in stream.blocks(blocksize=self.block_size, frames=self._length, dtype='float32',
+                                       always_2d=True):
+                yield block.mean(axis=1) if self.mono else block
+
+
+def embed_stream(input_path: str, output_path: str, start_t, start_f, width, height, text: str,
+                 time: float = -1, block_size: int = 65536, scaling: str = 'global',
+                 mono: bool = True, channels: Optional[Sequence[int]] = None,
+                 gains: Optional[Sequence[float]] = None, flow: bool = False, bands: int = 1,
+                 letters_per_second: float = DEFAULT_LETTERS_PER_SECOND, subtype: str = 'PCM_24') -> AudioWriter:
+    """Function hiding the text in the audio file without loading it into the memory
+
+    The input file is copied to the output file block by block and the rendered text is mixed only into the
+    blocks which overlap it, so the memory usage is bounded by the block size and the size of the text. A flowed
+    text is rendered line by line when the blocks reach it, so only the lines of the current page are kept.
+    Unlike read_file, the file keeps its native sampling rate. Multichannel files are downmixed to mono unless
+    the channel layout is to be kept. Blocks are encoded on a background thread while the next ones are read
+    and mixed, and the output file appears only when it is complete.
+
+    Parameters
+    ----------
+    input_path : str
+        a path to the input audio file
+    output_path : str
+        a path to the output audio file
+    start_t
+        beginning of the text [in seconds]
+    start_f
+        bottom border of the text [in Hz]
+    width
+        width of the text (of a line of the flowed text) [in seconds]
+    height
+        height of the text (of a line of the flowed text) [in Hz]
+    text : str
+        a string to be hidden
+    time : float
+        time to slice the file to, negative value means the entire file
+    block_size : int
+        number of frames processed at once
+    scaling : str
+        amplitude scaling mode of the text, one of letters.shape.SCALINGS
+    mono : bool
+        if True the channels are downmixed to mono
+    channels : Sequence[int], optional
+        indices of the channels the text is mixed into, all of the channels by default
+    gains : Sequence[float], optional
+        gains of the text in the selected channels, 1 by default
+    flow : bool
+        if True the text is flowed over the whole file (see letters.flow.FlowedText)
+    bands : int
+        number of the lines of a page of the flowed text
+    letters_per_second : float
+        density of the letters of the flowed text
+    subtype : str
+        subtype of the samples in the output file, one of utils.audiowrite.SUBTYPES
+
+    Returns
+    -------
+    writer : AudioWriter
+        closed writer with the number of the encoded frames and the encoding time
+
+    Raises
+    ------
+    ValueError
+        If the output path is the same as the input path, the channels or the gains are invalid, or the format
+        of the output path does not support the subtype
+    """
+
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise ValueError('Cannot stream the file into itself')
+
+    template = StreamedSignal(input_path, time, block_size, mono)
+    mix = template.channel_gains(channels, gains)
+    if flow:
+        shapes = FlowedText(template, start_t, start_f, width, height, text, bands, letters_per_second,
+                            scaling=scaling).texts()
+    else:
+        shapes = [Text(template, start_t, start_f, width, height, text, scaling)]
+
+    with AudioWriter(output_path, template.sampling_rate, template.channels, subtype) as output:
+        _write_mixed(template, shapes, output, mix)
+    return output
+
+
+def _write_mixed(template: StreamedSignal, shapes: Iterable[Shape], output: AudioWriter, mix: list) -> NoReturn:
+    """Writing the blocks of the template with the shapes mixed into them
+
+    Shapes have to be ordered by their beginning. Each of them is rendered when the first block overlapping it
+    is read and dropped after the last one.
+    """
+
+    shapes = iter(shapes)
+    upcoming = next(shapes, None)
+    active = []
+    position = 0
+    for block in template.blocks():
+        end = position + len(block)
+        while upcoming is not None and template.shape_window(upcoming)[0] < end:
+            upcoming.create_shape()
+            beg_idx, size = template.shape_window(upcoming)
+            active.append((beg_idx, beg_idx + size, upcoming))
+            upcoming = next(shapes, None)
+
+        for beg_idx, end_idx, shape in active:
+            first, last = max(beg_idx, position), min(end_idx, end)
+            if first < last:
+                template.mix_figure(block[first - position:last - position],
+                                    shape.figure[first - beg_idx:last - beg_idx], mix)
+        active = [item for item in active if item[1] > end]
+        output.write(block)
+        position = end
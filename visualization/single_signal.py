@@ -1,9 +1,9 @@
-from typing import NoReturn
-from operator import add
+from typing import Iterator, List, NoReturn, Optional, Sequence, Tuple
 import numpy as np
-import soundfile as sf
 
 from letters.shape import Shape
+from utils.audiowrite import AudioWriter
+from utils.loudness import LoudnessIndex
 
 
 class Signal:
@@ -12,19 +12,39 @@ class Signal:
     Attributes
     ----------
     _data : np.ndarray
-        samples containing values of amplitudes at certain time points
+        samples containing values of amplitudes at certain time points, mono or (samples, channels) array
     _sampling_rate : float
         self-explanatory
+    _dtype : np.dtype
+        type of the samples the shapes are rendered in (dtype policy)
+    _patches : List[Tuple[int, np.ndarray]]
+        sorted list of mixed segments (starting index, samples) applied in the copy-on-write mode
+    _loudness : Optional[LoudnessIndex]
+        loudness index of the current samples, built on the first loudness query
 
     Methods
     -------
-    save_signal(path: str)
+    save_signal(path: str, subtype: str)
         Saving singnal at given path
-    apply_shape(shape: Shape)
+    apply_shape(shape: Shape, copy: bool, channels: Sequence[int], gains: Sequence[float])
         Applying shape features to the signal
+    remix_shape(shape: Shape, windows: List[Tuple[int, int]], channels: Sequence[int], gains: Sequence[float])
+        Mixing the changed windows of the applied shape again
+    mean_amplitude()
+        Calculating mean absolute amplitude of the signal
+    loudness()
+        Returning the loudness index of the signal
+    segments()
+        Yielding consecutive parts of the signal with the copy-on-write patches applied
+    channel_gains(channels: Sequence[int], gains: Sequence[float])
+        Pairing the selected channels with their gains
+    mix_figure(target: np.ndarray, figure: np.ndarray, mix: List[Tuple[int, float]])
+        Adding the figure into the selected channels of the target in place
+    shape_window(shape: Shape)
+        Calculating the part of the signal covered by the shape
     """
 
-    def __init__(self, samples, sr):
+    def __init__(self, samples, sr, dtype=None):
         """
         Parameters
         ----------
@@ -32,18 +52,49 @@ class Signal:
             samples returned from function reading data from audio file
         sr
             sampling rate
+        dtype
+            type of the samples the shapes are rendered in, the samples are converted to it; if None the samples
+            are kept as they are and the shapes are rendered in double precision
         """
 
+        self._dtype: np.dtype = np.dtype(np.float64 if dtype is None else dtype)
+        if dtype is not None:
+            samples = np.asarray(samples, dtype=self._dtype)
         self._data: np.ndarray = samples
         self._sampling_rate: float = sr
+        self._patches: List[Tuple[int, np.ndarray]] = []
+        self._mixed: Optional[np.ndarray] = None
+        self._loudness: Optional[LoudnessIndex] = None
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def channels(self) -> int:
+        """Number of channels of the signal"""
+
+        return 1 if self._data.ndim == 1 else self._data.shape[1]
 
     @property
     def data(self):
-        return self._data
+        """Samples of the signal
+
+        In the copy-on-write mode the mixed signal has to be assembled from the original samples and the
+        patches, so the first access after applying a shape creates a full copy of the signal.
+        """
+
+        if not self._patches:
+            return self._data
+        if self._mixed is None:
+            self._mixed = np.concatenate(list(self.segments()))
+        return self._mixed
 
     @data.setter
     def data(self, data):
         self._data = data
+        self._patches = []
+        self._mixed = None
+        self._loudness = None
 
     @property
     def sampling_rate(self):
@@ -53,30 +104,263 @@ class Signal:
     def sampling_rate(self, sr):
         self._sampling_rate = sr
 
-    def save_signal(self, path: str) -> NoReturn:
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    def save_signal(self, path: str, subtype: str = 'PCM_24') -> AudioWriter:
         """Function saving created signal to given path
 
+        Segments of the signal are encoded block by block on a background thread and the file replaces the
+        given path only when it is complete (see utils.audiowrite.AudioWriter).
+
         Parameters
         ----------
         path : str
-            path to save created signal to
+            path to save created signal to, its extension selects the format (see utils.audiowrite.output_format)
+        subtype : str
+            subtype of the samples in the file, one of utils.audiowrite.SUBTYPES
+
+        Returns
+        -------
+        writer : AudioWriter
+            closed writer with the number of the encoded frames and the encoding time
+        """
+
+        with AudioWriter(path, self.sampling_rate, self.channels, subtype) as writer:
+            for segment in self.segments():
+                writer.write(segment)
+        return writer
+
+    def mean_amplitude(self):
+        """Calculating mean absolute amplitude of the signal
+
+        The value is taken from the loudness index, so the samples are scanned once until they change.
+
+        Returns
+        -------
+        level
+            mean absolute value of the samples of all of the channels
         """
 
-        sf.write(path, self.data, int(self.sampling_rate), subtype='PCM_24')
+        return self.loudness().mean_amplitude()
+
+    def loudness(self) -> LoudnessIndex:
+        """Returning the loudness index of the signal
 
-    def apply_shape(self, shape: Shape) -> NoReturn:
+        The index is built from the segments of the signal on the first call, so the copy-on-write patches are
+        never assembled into a full copy. Applying a shape or replacing the samples invalidates it.
+
+        Returns
+        -------
+        index : LoudnessIndex
+            loudness index of the current samples
+        """
+
+        if self._loudness is None:
+            self._loudness = LoudnessIndex.from_segments(self.segments(), self.channels)
+        return self._loudness
+
+    def segments(self) -> Iterator[np.ndarray]:
+        """Yielding consecutive parts of the signal
+
+        Untouched parts are yielded as views of the original samples and the mixed parts as the patches,
+        so iterating over the signal never copies untouched samples.
+
+        Yields
+        ------
+        segment : np.ndarray
+            consecutive part of the signal
+        """
+
+        position = 0
+        for beg_idx, patch in self._patches:
+            if beg_idx > position:
+                yield self._data[position:beg_idx]
+            yield patch
+            position = beg_idx + len(patch)
+        if position < len(self._data) or not self._patches:
+            yield self._data[position:]
+
+    def apply_shape(self, shape: Shape, copy: bool = False, channels: Optional[Sequence[int]] = None,
+                    gains: Optional[Sequence[float]] = None) -> NoReturn:
         """Applying shape to the signal
 
+        By default the shape is added in place into the view of the samples covered by it. In the copy-on-write
+        mode the original samples are kept intact and only the covered part is copied into a patch. In both
+        modes the samples outside of the shape are never copied. The figure of the shape is rendered once and
+        mixed into each of the selected channels with its gain.
+
+        The samples keep their type in place: the figure is added in the precision of the samples, so float32
+        samples (as read by utils.audioread) stay float32 and the mixed samples are rounded to it, which differs
+        by about 1e-7 of their magnitude from mixing in double precision (the list-based mixing used before
+        always returned float64). Signals created with dtype=np.float64 are mixed in double precision. In the
+        copy-on-write mode the patches have the type of np.result_type of the samples and the figure.
+
+        Parameters
+        ----------
+        shape : Shape
+            shape to be applied to the signal
+        copy : bool
+            if True, the original samples are not modified (copy-on-write mode)
+        channels : Sequence[int], optional
+            indices of the channels the shape is mixed into, all of the channels by default
+        gains : Sequence[float], optional
+            gains of the shape in the selected channels, 1 by default
+
+        Raises
+        ------
+        ValueError
+            If the samples are read-only and the shape is to be applied in place, or the channels or the gains
+            are invalid
+        """
+
+        mix = self.channel_gains(channels, gains)
+        beg_idx, size = self.shape_window(shape)
+        if size <= 0:
+            return
+
+        if not copy and not self._patches:
+            if not self._data.flags.writeable:
+                raise ValueError('Cannot apply the shape in place to read-only samples. Use copy=True')
+            self.mix_figure(self._data[beg_idx:beg_idx + size], shape.figure[:size], mix)
+            self._loudness = None
+            return
+
+        end_idx = beg_idx + size
+        overlapping = [(idx, patch) for idx, patch in self._patches if idx < end_idx and idx + len(patch) > beg_idx]
+        if overlapping:
+            # Merging overlapping patches into the single one covering all of them
+            beg_idx = min(beg_idx, overlapping[0][0])
+            end_idx = max(end_idx, overlapping[-1][0] + len(overlapping[-1][1]))
+        patch = np.array(self._data[beg_idx:end_idx], dtype=np.result_type(self._data, shape.figure))
+        for idx, old_patch in overlapping:
+            patch[idx - beg_idx:idx - beg_idx + len(old_patch)] = old_patch
+        offset = self.shape_window(shape)[0] - beg_idx
+        self.mix_figure(patch[offset:offset + size], shape.figure[:size], mix)
+
+        merged = [idx for idx, _ in overlapping]
+        self._patches = sorted([item for item in self._patches if item[0] not in merged] + [(beg_idx, patch)],
+                               key=lambda item: item[0])
+        self._mixed = None
+        self._loudness = None
+
+    def remix_shape(self, shape: Shape, windows: List[Tuple[int, int]], channels: Optional[Sequence[int]] = None,
+                    gains: Optional[Sequence[float]] = None) -> NoReturn:
+        """Mixing the changed windows of the shape applied in the copy-on-write mode again
+
+        The windows of the patch are restored from the original samples and the shape is added into them, so
+        the result is the same as applying the changed shape to the original signal (see Text.update_text).
+        The patches are expected to carry this shape only, other shapes mixed into the windows are lost.
+
+        Parameters
+        ----------
+        shape : Shape
+            changed shape, applied before with copy=True
+        windows : List[Tuple[int, int]]
+            (beginning, end) sample indices of the changed parts of the figure of the shape
+        channels : Sequence[int], optional
+            indices of the channels the shape is mixed into, all of the channels by default
+        gains : Sequence[float], optional
+            gains of the shape in the selected channels, 1 by default
+
+        Raises
+        ------
+        ValueError
+            If the shape has not been applied in the copy-on-write mode, or the channels or the gains are invalid
+        """
+
+        mix = self.channel_gains(channels, gains)
+        shape_beg, size = self.shape_window(shape)
+        for beg, end in windows:
+            beg_idx, end_idx = shape_beg + beg, shape_beg + min(end, size)
+            if end_idx <= beg_idx:
+                continue
+            patch_beg, patch = next(((idx, patch) for idx, patch in self._patches
+                                     if idx <= beg_idx and idx + len(patch) >= end_idx), (None, None))
+            if patch is None:
+                raise ValueError('Shape has to be applied with copy=True before it is mixed again')
+            target = patch[beg_idx - patch_beg:end_idx - patch_beg]
+            target[...] = self._data[beg_idx:end_idx]
+            self.mix_figure(target, shape.figure[beg:end_idx - shape_beg], mix)
+        self._mixed = None
+        self._loudness = None
+
+    def channel_gains(self, channels: Optional[Sequence[int]], gains: Optional[Sequence[float]]) \
+            -> List[Tuple[int, float]]:
+        """Pairing the selected channels with their gains
+
+        Parameters
+        ----------
+        channels : Sequence[int], optional
+            indices of the channels, all of the channels if None
+        gains : Sequence[float], optional
+            gains of the selected channels, 1 if None
+
+        Returns
+        -------
+        mix : List[Tuple[int, float]]
+            (channel, gain) pairs
+
+        Raises
+        ------
+        ValueError
+            If any channel does not exist or the numbers of the channels and the gains differ
+        """
+
+        channels = list(range(self.channels)) if channels is None else [int(channel) for channel in channels]
+        if any(channel < 0 or channel >= self.channels for channel in channels):
+            raise ValueError(f'Channels have to be in the range [0, {self.channels - 1}]')
+        gains = [1.] * len(channels) if gains is None else [float(gain) for gain in gains]
+        if len(gains) != len(channels):
+            raise ValueError('Number of the gains has to be equal to the number of the channels')
+        return list(zip(channels, gains))
+
+    @staticmethod
+    def mix_figure(target: np.ndarray, figure: np.ndarray, mix: List[Tuple[int, float]]) -> NoReturn:
+        """Adding the figure into the selected channels of the target in place
+
+        Each channel is a strided view of the target, so mixing needs at most a single scaled copy of the
+        figure instead of a copy of all of the channels.
+
+        Parameters
+        ----------
+        target : np.ndarray
+            part of the samples of the signal, mono or (samples, channels) array
+        figure : np.ndarray
+            samples of the figure of the same length as the target
+        mix : List[Tuple[int, float]]
+            (channel, gain) pairs returned by channel_gains
+        """
+
+        scaled = None
+        for channel, gain in mix:
+            column = target if target.ndim == 1 else target[:, channel]
+            if gain == 1:
+                column += figure
+                continue
+            if scaled is None:
+                scaled = np.empty_like(figure)
+            np.multiply(figure, figure.dtype.type(gain), out=scaled)
+            column += scaled
+
+    def shape_window(self, shape: Shape) -> Tuple[int, int]:
+        """Calculating the part of the signal covered by the shape
+
         Parameters
         ----------
         shape : Shape
             shape to be applied to the signal
+
+        Returns
+        -------
+        beg_idx : int
+            index of the first sample covered by the shape
+        size : int
+            number of samples covered by the shape
         """
 
         beg_idx = int(np.ceil(shape.start_point_t * self._sampling_rate))
         end_idx = int(np.ceil((shape.start_point_t + shape.width) * self._sampling_rate)) - 1
-
-        # Slicing whole signal into three parts and applying signal to the second part
-        self.data = np.array(list(self.data[:beg_idx])
-                             + list(map(add, self.data[beg_idx:end_idx], shape.figure))
-                             + list(self.data[end_idx:]))
+        end_idx = min(end_idx, len(self))
+        return beg_idx, max(min(end_idx - beg_idx, shape.size), 0)
@@ -1,7 +1,6 @@
-from typing import NoReturn
+from typing import NoReturn, Optional
 import numpy as np
-import scipy.signal
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 
 from utils import calculations
 from visualization.single_signal import Signal
@@ -20,6 +19,14 @@ class Spectrogram:
         frequency axis returned from spectrogram calculations
     spectrogram
         an array containing values returned from the spectrogram calculations
+    maximum
+        maximum value of the spectrogram, calculated incrementally with the spectrogram
+    dtype
+        type of the values of the spectrogram (float32 halves the memory usage)
+    memory_budget : int
+        maximum size of the intermediate arrays used to calculate a single chunk of the spectrogram [in bytes]
+    out_path : Optional[str]
+        a path to the .npy file the spectrogram is memory-mapped to, if None it is kept in the memory
 
     Methods
     -------
@@ -31,38 +38,97 @@ class Spectrogram:
         plotting spectrogram and labeling axes
     """
 
-    def __init__(self, sound):
+    def __init__(self, sound, dtype=None, memory_budget: int = 64 * 1024 * 1024, out_path: Optional[str] = None):
         """
         Parameters
         ----------
         sound:
             Signal class object representing created signal
+        dtype
+            type of the values of the spectrogram, by default float32 for float32 signals and float64 otherwise
+        memory_budget : int
+            maximum size of the intermediate arrays used to calculate a single chunk of the spectrogram [in bytes]
+        out_path : Optional[str]
+            a path to the .npy file the spectrogram is memory-mapped to, if None it is kept in the memory
         """
 
         self.signal: Signal = sound
         self.taxis = None
         self.frqaxis = None
         self.spectrogram = None
+        self.maximum = None
+        self.dtype = np.dtype(dtype) if dtype is not None else np.result_type(sound.data.dtype, np.float32)
+        self.memory_budget: int = memory_budget
+        self.out_path: Optional[str] = out_path
 
     def calculate_spectrogram(self) -> NoReturn:
-        """Calculating spectrogram"""
+        """Calculating spectrogram
+
+        The spectrogram is calculated in chunks of frames, so the intermediate arrays never exceed the memory
+        budget. The values are the same as the ones returned by scipy.signal.spectrogram with the same
+        parameters (Hamming window, constant detrending, power spectral density). Multichannel signals are
+        downmixed to mono chunk by chunk.
+        """
 
         window_size = np.ceil(10*self.signal.sampling_rate/1000)  # 10 ms window
         step_size = np.ceil(3*self.signal.sampling_rate/1000)  # 3 ms step
         n_per_segment = calculations.nextpow2(window_size)
-
-        self.frqaxis, self.taxis, self.spectrogram = scipy.signal.spectrogram(x=self.signal.data,
-                                                                              fs=self.signal.sampling_rate,
-                                                                              nperseg=n_per_segment,
-                                                                              noverlap=window_size-step_size,
-                                                                              window='hamming')
+        n_overlap = int(window_size - step_size)
+
+        samples = self.signal.data
+        n_per_segment = min(n_per_segment, len(samples))
+        hop = n_per_segment - n_overlap
+        n_frames = (len(samples) - n_per_segment) // hop + 1
+        n_frequencies = n_per_segment // 2 + 1
+
+        import scipy.signal
+        window = scipy.signal.get_window('hamming', n_per_segment).astype(self.dtype)
+        scale = 1 / (self.signal.sampling_rate * np.sum(window.astype(np.float64) ** 2))
+
+        self.frqaxis = np.fft.rfftfreq(n_per_segment, 1 / self.signal.sampling_rate)
+        self.taxis = (n_per_segment / 2 + hop * np.arange(n_frames)) / self.signal.sampling_rate
+        if self.out_path is None:
+            self.spectrogram = np.empty((n_frequencies, n_frames), dtype=self.dtype)
+        else:
+            self.spectrogram = np.lib.format.open_memmap(self.out_path, mode='w+', dtype=self.dtype,
+                                                         shape=(n_frequencies, n_frames))
+
+        # Frames, their spectra (complex) and powers of a single chunk have to fit in the budget
+        frame_bytes = (2 * n_per_segment + 3 * n_frequencies) * 2 * self.dtype.itemsize
+        frames_per_chunk = max(1, self.memory_budget // frame_bytes)
+
+        self.maximum = 0
+        for first in range(0, n_frames, frames_per_chunk):
+            last = min(first + frames_per_chunk, n_frames)
+            chunk = samples[first * hop:(last - 1) * hop + n_per_segment]
+            if chunk.ndim > 1:
+                chunk = chunk.mean(axis=1, dtype=self.dtype)
+            chunk = np.asarray(chunk, dtype=self.dtype)
+            frames = sliding_window_view(chunk, n_per_segment)[::hop]
+            frames = (frames - frames.mean(axis=1, keepdims=True)) * window
+
+            spectrum = np.fft.rfft(frames, axis=1)
+            power = (spectrum.real ** 2 + spectrum.imag ** 2) * self.dtype.type(scale)
+            if n_per_segment % 2:
+                power[:, 1:] *= 2
+            else:
+                power[:, 1:-1] *= 2
+
+            self.spectrogram[:, first:last] = power.T
+            self.maximum = max(self.maximum, power.max())
 
     def normalize_spectrogram(self):
-        """Normalizing spectrogram"""
+        """Normalizing spectrogram
+
+        The spectrogram is divided in place by the maximum found while calculating it.
+        """
 
-        divisor = np.max(self.spectrogram)
+        if self.maximum is None:
+            self.maximum = np.max(self.spectrogram)
+        divisor = self.maximum
         if divisor:
-            self.spectrogram = self.spectrogram / divisor
+            self.spectrogram /= self.dtype.type(divisor)
+            self.maximum = 1
         else:
             print('Maximum value of the spectrogram is equal to 0. Cannot normalize')
 
@@ -71,6 +137,7 @@ class Spectrogram:
 
         assert self.spectrogram is not None, 'You need to create spectrogram first before plotting'
 
+        import matplotlib.pyplot as plt
         plt.pcolormesh(self.taxis, self.frqaxis, self.spectrogram, shading='nearest')
         plt.title('Given audio signal in frequency and time domain')
         plt.xlabel('Time [s]')